@@ -93,6 +93,7 @@ elif OPENEDX_RELEASE == 'HAWTHORN':
 else:
     INSTALLED_APPS.append('lms.djangoapps.certificates')
     INSTALLED_APPS.append('lms.djangoapps.courseware')
+    INSTALLED_APPS.append('lms.djangoapps.grades')
 
 
 TEMPLATES = [
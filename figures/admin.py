@@ -106,13 +106,23 @@ class EnrollmentDataAdmin(UserRelatedMixin, admin.ModelAdmin):
         'is_completed')
 
 
+@admin.register(figures.models.EnrollmentDataHighWaterMark)
+class EnrollmentDataHighWaterMarkAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the EnrollmentDataHighWaterMark model
+
+    Delete a site's record to make the next incremental refresh a full update
+    """
+    list_display = ('id', 'site', 'refreshed_at', 'modified')
+
+
 @admin.register(figures.models.LearnerCourseGradeMetrics)
 class LearnerCourseGradeMetricsAdmin(UserRelatedMixin, admin.ModelAdmin):
     """Defines the admin interface for the LearnerCourseGradeMetrics model
     """
     list_display = ('id', 'date_for', 'site', 'user_link', 'course_id',
                     'progress_percent', 'points_possible', 'points_earned',
-                    'sections_worked', 'sections_possible')
+                    'sections_worked', 'sections_possible', 'is_completed',
+                    'date_completed')
     list_filter = (
         ('site', RelatedOnlyDropdownFilter),
         ('course_id', AllValuesDropdownFilter),
@@ -120,6 +130,16 @@ class LearnerCourseGradeMetricsAdmin(UserRelatedMixin, admin.ModelAdmin):
     read_only_fields = ('user', 'user_link')
 
 
+@admin.register(figures.models.CourseCompletionCount)
+class CourseCompletionCountAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the CourseCompletionCount model
+    """
+    list_display = ('id', 'site', 'course_id', 'completed_count', 'modified')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+
+
 @admin.register(figures.models.PipelineError)
 class PipelineErrorAdmin(admin.ModelAdmin):
     """Defines the admin interface for the PipelineError model
@@ -142,3 +162,15 @@ class CourseMauMetricsAdmin(admin.ModelAdmin):
         ('site', RelatedOnlyDropdownFilter),
         ('course_id', AllValuesDropdownFilter),
         'date_for')
+
+
+@admin.register(figures.models.ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the ReportJob model
+    """
+    list_display = ('id', 'created', 'site', 'report_type', 'file_format',
+                    'status', 'records_done', 'records_total', 'requested_by')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        'report_type',
+        'status')
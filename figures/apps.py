@@ -58,3 +58,7 @@ class FiguresConfig(AppConfig):
                 }
             },
         }
+
+    def ready(self):
+        from figures.signals import connect_receivers
+        connect_receivers()
@@ -11,30 +11,56 @@ from dateutil.relativedelta import relativedelta
 from django.utils.timezone import utc
 
 from figures.compat import CourseNotFound
+from figures.helpers import as_course_key
 from figures.sites import (
     get_course_enrollments_for_site,
+    get_course_keys_for_site,
     get_student_modules_for_site
 )
-from figures.pipeline.site_monthly_metrics import fill_month
-from figures.models import EnrollmentData
+from figures.pipeline.site_monthly_metrics import (
+    fill_month,
+    raw_sql_mau_counts_by_month,
+)
+from figures.models import (
+    CourseCompletionCount,
+    EnrollmentData,
+    EnrollmentDataHighWaterMark,
+    LearnerCourseGradeMetrics,
+    SiteMonthlyMetrics,
+)
+
+
+# Number of learners per course we update in one batch in the incremental
+# EnrollmentData refresh
+ENROLLMENT_DATA_BATCH_SIZE = 500
 
 
-def backfill_monthly_metrics_for_site(site, overwrite=False, use_raw_sql=False):
+def backfill_monthly_metrics_for_site(site, overwrite=False, use_raw_sql=False,
+                                      single_scan=False):
     """Backfill specified months' historical site metrics for the specified site
+
+    By default each month is counted with its own query. With `single_scan`,
+    one grouped query counts every month and the records are written in bulk.
+    See `figures.pipeline.site_monthly_metrics.raw_sql_mau_counts_by_month`
     """
     site_sm = get_student_modules_for_site(site)
-    if not site_sm:
+    first_sm = site_sm.order_by('created').first()
+    if not first_sm:
         return None
 
-    first_created = site_sm.order_by('created').first().created
+    first_created = first_sm.created
 
     start_month = datetime(year=first_created.year,
                            month=first_created.month,
                            day=1,
                            tzinfo=utc)
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
+    months = list(rrule(freq=MONTHLY, dtstart=start_month, until=last_month))
+    if single_scan:
+        return _backfill_monthly_metrics_single_scan(site, months, overwrite)
+
     backfilled = []
-    for dt in rrule(freq=MONTHLY, dtstart=start_month, until=last_month):
+    for dt in months:
         obj, created = fill_month(site=site,
                                   month_for=dt,
                                   student_modules=site_sm,
@@ -45,6 +71,20 @@ def backfill_monthly_metrics_for_site(site, overwrite=False, use_raw_sql=False):
     return backfilled
 
 
+def _backfill_monthly_metrics_single_scan(site, months, overwrite):
+    if not months:
+        return []
+    end = months[-1] + relativedelta(months=1)
+    counts = raw_sql_mau_counts_by_month(course_ids=get_course_keys_for_site(site),
+                                         end=end)
+    results = SiteMonthlyMetrics.add_months(
+        site=site,
+        active_user_counts={dt.date(): counts.get(dt.date(), 0) for dt in months},
+        overwrite=overwrite)
+    return [dict(obj=obj, created=created, dt=dt)
+            for (obj, created), dt in zip(results, months)]
+
+
 def backfill_enrollment_data_for_site(site):
     """Convenience function to fill EnrollmentData records
 
@@ -85,3 +125,105 @@ def backfill_enrollment_data_for_site(site):
                                      ce_id=rec.id))
 
     return dict(results=enrollment_data, errors=errors)
+
+
+def changed_enrollments_for_site(site, since):
+    """Returns the enrollments on the site that may have changed since `since`
+
+    An enrollment may have changed if any of these were created or modified
+    after `since`:
+
+    * the CourseEnrollment record (only 'created' is available to check)
+    * a StudentModule record for the learner in the course
+    * a LearnerCourseGradeMetrics record for the learner in the course
+
+    Returns a dict of course id strings, each mapped to a set of user ids
+    """
+    changed = {}
+    sources = [
+        get_course_enrollments_for_site(site).filter(
+            created__gt=since).values_list('course_id', 'user_id'),
+        get_student_modules_for_site(site).filter(
+            modified__gt=since).values_list('course_id', 'student_id').distinct(),
+        LearnerCourseGradeMetrics.objects.filter(
+            site=site, modified__gt=since).values_list('course_id', 'user_id').distinct(),
+    ]
+    for source in sources:
+        for course_id, user_id in source.order_by():
+            changed.setdefault(str(course_id), set()).add(user_id)
+    return changed
+
+
+def update_enrollment_data_for_site(site, since):
+    """Updates EnrollmentData records for enrollments changed since `since`
+
+    This is the incremental counterpart to `backfill_enrollment_data_for_site`.
+    Records are updated per course in batches of `ENROLLMENT_DATA_BATCH_SIZE`
+    learners. See `EnrollmentDataManager.bulk_set_enrollment_data`
+
+    Returns the same structure as `backfill_enrollment_data_for_site`
+    """
+    enrollment_data = []
+    errors = []
+    site_course_enrollments = get_course_enrollments_for_site(site)
+    for course_id, user_ids in changed_enrollments_for_site(site, since).items():
+        user_ids = sorted(user_ids)
+        try:
+            for i in range(0, len(user_ids), ENROLLMENT_DATA_BATCH_SIZE):
+                course_enrollments = site_course_enrollments.filter(
+                    course_id=as_course_key(course_id),
+                    user_id__in=user_ids[i:i + ENROLLMENT_DATA_BATCH_SIZE]
+                ).select_related('user')
+                enrollment_data.extend(EnrollmentData.objects.bulk_set_enrollment_data(
+                    site=site,
+                    course_id=course_id,
+                    course_enrollments=course_enrollments))
+        except CourseNotFound:
+            errors.append('CourseNotFound for course "{course}". '.format(course=course_id))
+
+    return dict(results=enrollment_data, errors=errors)
+
+
+def refresh_enrollment_data_for_site(site):
+    """Incrementally refresh EnrollmentData records for the site
+
+    Uses the site's `EnrollmentDataHighWaterMark` to only update enrollments
+    that changed since the last refresh. If the site has not been refreshed
+    before, we do the full `backfill_enrollment_data_for_site` sweep
+
+    Enrollments deactivated without any other change are not detected, as
+    CourseEnrollment does not track when it was modified. Run the full sweep
+    periodically to reconcile these
+
+    The mark only moves forward when every enrollment was updated. If any
+    failed, the next refresh covers the same changes again, so the failed
+    enrollments are retried
+
+    Returns the same structure as `backfill_enrollment_data_for_site`
+    """
+    started = datetime.utcnow().replace(tzinfo=utc)
+    mark = EnrollmentDataHighWaterMark.objects.filter(site=site).first()
+    if mark:
+        results = update_enrollment_data_for_site(site, since=mark.refreshed_at)
+    else:
+        results = backfill_enrollment_data_for_site(site)
+    if not results['errors']:
+        EnrollmentDataHighWaterMark.objects.update_or_create(
+            site=site, defaults=dict(refreshed_at=started))
+    return results
+
+
+def backfill_completions_for_site(site):
+    """Rebuilds the completion fields and counts for the site
+
+    Sets `is_completed` and `date_completed` on the site's
+    LearnerCourseGradeMetrics records, then recounts the completions of each
+    course. Returns the number of completed enrollments and the
+    CourseCompletionCount records
+    """
+    completed = LearnerCourseGradeMetrics.objects.set_completion_flags(site=site)
+    course_ids = LearnerCourseGradeMetrics.objects.filter(site=site).order_by().values_list(
+        'course_id', flat=True).distinct()
+    course_counts = [CourseCompletionCount.objects.update_count(site=site, course_id=course_id)
+                     for course_id in course_ids]
+    return dict(completed=completed, course_counts=course_counts)
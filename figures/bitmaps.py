@@ -0,0 +1,160 @@
+"""Compressed bitmaps of user ids for exact, mergeable distinct counts
+
+Figures stores a bitmap of the active user ids with each daily metrics
+record. The users active over any date range are the union of the daily
+bitmaps, and the users active in two courses are the intersection of the
+course bitmaps, so these counts do not need to scan StudentModule again.
+
+The layout follows roaring bitmaps. User ids are split into a 16 bit high key
+and a 16 bit low value. Each key has a container holding its low values as a
+Python int bit set, which makes unions and intersections fast integer
+operations. When saved, a container with few values is written as a sorted
+array of its values and a dense container is written as its 8 KB bit set
+"""
+from __future__ import absolute_import
+import base64
+import binascii
+from collections import defaultdict
+import struct
+import zlib
+
+
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+CONTAINER_BYTES = CONTAINER_SIZE // 8
+
+# Containers with more values than this are smaller saved as a bit set
+ARRAY_CONTAINER_MAX = 4096
+
+ARRAY_CONTAINER = 0
+BITSET_CONTAINER = 1
+
+CONTAINER_HEADER = struct.Struct('>IBI')
+
+
+def _container_to_bytes(bits):
+    """Returns the container's bit set as big endian bytes
+    """
+    return binascii.unhexlify('{:0{}x}'.format(bits, CONTAINER_BYTES * 2))
+
+
+def _container_from_bytes(data):
+    return int(binascii.hexlify(data), 16)
+
+
+def _container_from_values(values):
+    data = bytearray(CONTAINER_BYTES)
+    for value in values:
+        data[CONTAINER_BYTES - 1 - (value >> 3)] |= 1 << (value & 7)
+    return _container_from_bytes(bytes(data))
+
+
+def _container_values(bits):
+    """Yields the low values set in the container in ascending order
+    """
+    data = bytearray(_container_to_bytes(bits))
+    for index in range(CONTAINER_BYTES):
+        byte = data[CONTAINER_BYTES - 1 - index]
+        if byte:
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield (index << 3) + bit
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+class UserBitmap(object):
+    """Set of user ids stored as a compressed bitmap
+
+    Example:
+
+        active_users = UserBitmap.from_string(stored_bitmap)
+        active_users |= UserBitmap.from_ids(todays_user_ids)
+        active_user_count = len(active_users)
+    """
+
+    def __init__(self, containers=None):
+        # Maps the high key to the container bit set. Empty containers are
+        # not kept
+        self.containers = dict((key, bits) for key, bits in (containers or {}).items()
+                               if bits)
+
+    @classmethod
+    def from_ids(cls, user_ids):
+        values_by_key = defaultdict(list)
+        for user_id in user_ids:
+            user_id = int(user_id)
+            values_by_key[user_id >> CONTAINER_BITS].append(user_id & (CONTAINER_SIZE - 1))
+        return cls(dict((key, _container_from_values(values))
+                        for key, values in values_by_key.items()))
+
+    @classmethod
+    def from_string(cls, value):
+        """Loads a bitmap saved with `to_string`
+        """
+        data = zlib.decompress(base64.b64decode(value))
+        containers = {}
+        offset = 0
+        while offset < len(data):
+            key, container_type, length = CONTAINER_HEADER.unpack_from(data, offset)
+            offset += CONTAINER_HEADER.size
+            if container_type == ARRAY_CONTAINER:
+                values = struct.unpack_from('>{}H'.format(length), data, offset)
+                containers[key] = _container_from_values(values)
+                offset += 2 * length
+            else:
+                containers[key] = _container_from_bytes(data[offset:offset + length])
+                offset += length
+        return cls(containers)
+
+    @classmethod
+    def union_all(cls, bitmaps):
+        containers = {}
+        for bitmap in bitmaps:
+            for key, bits in bitmap.containers.items():
+                containers[key] = containers.get(key, 0) | bits
+        return cls(containers)
+
+    def to_string(self):
+        """Returns the bitmap as compact ASCII text for storage
+        """
+        parts = []
+        for key in sorted(self.containers):
+            bits = self.containers[key]
+            count = _popcount(bits)
+            if count <= ARRAY_CONTAINER_MAX:
+                parts.append(CONTAINER_HEADER.pack(key, ARRAY_CONTAINER, count))
+                parts.append(struct.pack('>{}H'.format(count), *_container_values(bits)))
+            else:
+                parts.append(CONTAINER_HEADER.pack(key, BITSET_CONTAINER, CONTAINER_BYTES))
+                parts.append(_container_to_bytes(bits))
+        return base64.b64encode(zlib.compress(b''.join(parts))).decode('ascii')
+
+    def __or__(self, other):
+        return self.union_all([self, other])
+
+    def __and__(self, other):
+        return UserBitmap(dict((key, bits & other.containers[key])
+                               for key, bits in self.containers.items()
+                               if key in other.containers))
+
+    def __len__(self):
+        return sum(_popcount(bits) for bits in self.containers.values())
+
+    def __iter__(self):
+        for key in sorted(self.containers):
+            for value in _container_values(self.containers[key]):
+                yield (key << CONTAINER_BITS) + value
+
+    def __contains__(self, user_id):
+        user_id = int(user_id)
+        bits = self.containers.get(user_id >> CONTAINER_BITS, 0)
+        return bool(bits & (1 << (user_id & (CONTAINER_SIZE - 1))))
+
+    def __eq__(self, other):
+        return isinstance(other, UserBitmap) and self.containers == other.containers
+
+    def __ne__(self, other):
+        return not self == other
@@ -0,0 +1,134 @@
+"""Response caching for the Figures API
+
+Most of the data the Figures API serves comes from the models the pipeline
+fills, so it only changes when the pipeline runs for a site. Each site has a
+"data generation" counter. The pipeline bumps it when it finishes updating the
+site's data. Cached responses are keyed on the generation, so bumping it makes
+every cached response for the site stale at once, without guessing a timeout.
+
+Response caching is off by default. Set the `RESPONSE_CACHE_ENABLED` Figures
+setting to True to enable it
+"""
+from __future__ import absolute_import
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+import django.contrib.sites.shortcuts
+from rest_framework import status
+from rest_framework.response import Response
+
+
+DATA_GENERATION_KEY = 'figures.data_generation.{site_id}'
+
+RESPONSE_CACHE_KEY = 'figures.response.{site_id}.{generation}.{path_hash}'
+
+# Responses become stale when the data generation changes. The timeout only
+# keeps responses for old generations from taking up cache space
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24 * 2
+
+
+def response_cache_enabled():
+    return bool(settings.ENV_TOKENS['FIGURES'].get('RESPONSE_CACHE_ENABLED', False))
+
+
+def response_cache_timeout():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'RESPONSE_CACHE_TIMEOUT', RESPONSE_CACHE_TIMEOUT))
+
+
+def get_data_generation(site_id):
+    """Returns the site's current data generation
+
+    A new counter starts at the current time. If the cache evicts the counter,
+    the new one is past every generation the old counter used, so responses
+    cached for those generations are not served again
+    """
+    key = DATA_GENERATION_KEY.format(site_id=site_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time()), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_data_generation(site_id):
+    """Starts a new data generation for the site
+
+    The pipeline calls this after it updates the site's data
+    """
+    try:
+        return cache.incr(DATA_GENERATION_KEY.format(site_id=site_id))
+    except ValueError:
+        # The counter does not exist. A new counter is a new generation
+        return get_data_generation(site_id)
+
+
+def response_cache_key(site, request):
+    path_hash = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return RESPONSE_CACHE_KEY.format(site_id=site.id,
+                                     generation=get_data_generation(site.id),
+                                     path_hash=path_hash)
+
+
+def cache_response(view_method):
+    """Decorator to cache the response data of a Figures API view method
+
+    The key includes the site, the request path with the query string and the
+    site's data generation. Only successful responses are cached. Permissions
+    are checked before the view method is called, so every caller is still
+    authorized
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not response_cache_enabled():
+            return view_method(self, request, *args, **kwargs)
+        site = django.contrib.sites.shortcuts.get_current_site(request)
+        key = response_cache_key(site, request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, response_cache_timeout())
+        return response
+    return wrapper
+
+
+class CachedResponseMixin(object):
+    """Caches the `list` and `retrieve` responses of a viewset
+
+    Views that define their own handlers use the `cache_response` decorator
+    """
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super(CachedResponseMixin, self).list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super(CachedResponseMixin, self).retrieve(request, *args, **kwargs)
+
+
+class DataGenerationMixin(object):
+    """Bumps the site's data generation when a writable viewset changes data
+
+    Writes through the API change the data the same way a pipeline run does,
+    so cached responses for the site must not be served after them
+    """
+    def bump_data_generation(self):
+        site = django.contrib.sites.shortcuts.get_current_site(self.request)
+        bump_data_generation(site.id)
+
+    def perform_create(self, serializer):
+        super(DataGenerationMixin, self).perform_create(serializer)
+        self.bump_data_generation()
+
+    def perform_update(self, serializer):
+        super(DataGenerationMixin, self).perform_update(serializer)
+        self.bump_data_generation()
+
+    def perform_destroy(self, instance):
+        super(DataGenerationMixin, self).perform_destroy(instance)
+        self.bump_data_generation()
@@ -73,6 +73,32 @@ else:  # Assume Hawthorn or greater
     from opaque_keys.edx.django.models import CourseKeyField  # noqa pylint: disable=unused-import,import-error
 
 
+# Persisted subsection grades let Figures read a learner's scores without
+# calling CourseGradeFactory. We fall back to CourseGradeFactory when the model
+# is not available
+try:
+    from lms.djangoapps.grades.models import PersistentSubsectionGrade  # noqa pylint: disable=unused-import,import-error
+except ImportError:
+    PersistentSubsectionGrade = None
+
+# Used to listen for course publish events
+try:
+    from xmodule.modulestore.django import SignalHandler  # noqa pylint: disable=unused-import,import-error
+except ImportError:
+    SignalHandler = None
+
+# Used for live capture of enrollment and grade changes
+try:
+    from student.signals import ENROLL_STATUS_CHANGE  # noqa pylint: disable=unused-import,import-error
+except ImportError:
+    ENROLL_STATUS_CHANGE = None
+
+try:
+    from openedx.core.djangoapps.signals.signals import COURSE_GRADE_CHANGED  # noqa pylint: disable=unused-import,import-error
+except ImportError:
+    COURSE_GRADE_CHANGED = None
+
+
 # preemptive addition. Added it here to avoid adding to figures.models
 # In fact, we should probably do a refactoring that makes all Figures import it
 # from here
@@ -107,13 +133,21 @@ def course_grade_from_course_id(learner, course_id):
     TODO: Consider optional kwarg param or Figures setting to log performance.
           Bonus points: Make id a decorator
     """
+    return course_grade(learner, course_from_course_id(course_id))
+
+
+def course_from_course_id(course_id):
+    """Returns the edx-platform course descriptor, set up for grading
+
+    Raises `CourseNotFound` if the course is not in modulestore
+    """
     try:
         course = get_course_by_id(course_key=as_course_key(course_id))
     except Http404:
         raise CourseNotFound('{}'.format(str(course_id)))
     course._field_data_cache = {}  # pylint: disable=protected-access
     course.set_grading_policy(course.grading_policy)
-    return course_grade(learner, course)
+    return course
 
 
 def chapter_grade_values(chapter_grades):
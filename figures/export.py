@@ -0,0 +1,160 @@
+"""Streaming exports of Figures API data
+
+The export endpoints write every row of a filtered queryset as CSV or as
+NDJSON (one JSON document per line) in a single streaming response. Records
+are read in primary key ordered chunks and serialized one chunk at a time, so
+memory use stays flat no matter how many learners the site has.
+
+The chunk size is set with the `EXPORT_CHUNK_SIZE` Figures setting
+"""
+from __future__ import absolute_import
+import csv
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+import six
+
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_FORMAT = 'csv'
+NDJSON_FORMAT = 'ndjson'
+
+EXPORT_CONTENT_TYPES = {
+    CSV_FORMAT: 'text/csv',
+    NDJSON_FORMAT: 'application/x-ndjson',
+}
+
+EXPORT_FORMATS = tuple(EXPORT_CONTENT_TYPES.keys())
+
+LEARNER_CSV_FIELDS = [
+    'id', 'username', 'email', 'fullname', 'is_active', 'date_joined',
+    'enrollment.id', 'enrollment.course_id', 'enrollment.date_enrolled',
+    'enrollment.is_enrolled', 'enrollment.is_completed',
+    'enrollment.progress_percent',
+]
+
+ENROLLMENT_METRICS_CSV_FIELDS = [
+    'id', 'user.id', 'user.username', 'user.fullname', 'course_id',
+    'date_for', 'completed', 'points_earned', 'points_possible',
+    'sections_worked', 'sections_possible', 'progress_percent',
+]
+
+
+def export_chunk_size():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'EXPORT_CHUNK_SIZE', EXPORT_CHUNK_SIZE))
+
+
+def queryset_chunks(queryset, chunk_size):
+    """Yields lists of the queryset's records in primary key order
+
+    Each chunk is its own query, starting after the last primary key of the
+    previous chunk. Unlike `QuerySet.iterator()`, this keeps `prefetch_related`
+    working and does not hold a database cursor open for the whole export
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def serialized_records(queryset, serializer_class, context=None, chunk_size=None):
+    """Yields the serialized data of each record in the queryset
+
+    Records are serialized a chunk at a time, so list serializers that prefetch
+    related data do so once per chunk
+    """
+    chunk_size = chunk_size or export_chunk_size()
+    for chunk in queryset_chunks(queryset, chunk_size):
+        for data in serializer_class(chunk, many=True, context=context).data:
+            yield data
+
+
+def flatten(data, prefix=''):
+    """Flattens nested dicts into one dict with dotted keys
+    """
+    flat = {}
+    for key, value in data.items():
+        key = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix=key + '.'))
+        else:
+            flat[key] = value
+    return flat
+
+
+def learner_csv_records(records):
+    """Yields one flat record for each learner enrollment
+
+    Learners without enrollment data get one record with empty enrollment
+    columns
+    """
+    for record in records:
+        enrollments = record.pop('enrollmentdata_set', None) or [{}]
+        for enrollment in enrollments:
+            enrollment.pop('progress_details', None)
+            row = dict(record, enrollment=enrollment)
+            yield flatten(row)
+
+
+class Echo(object):
+    """File-like object that returns what is written to it
+
+    Lets `csv.writer` produce one line at a time for a streaming response
+    """
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def csv_lines(records, fieldnames):
+    """Yields the CSV header line, then one line for each flat record
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fieldnames)
+    for record in records:
+        yield writer.writerow([_csv_value(record.get(name)) for name in fieldnames])
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=JSONEncoder) + '\n'
+
+
+def export_lines(records, export_format, csv_fields):
+    """Returns an iterator of the records' lines in the export format
+
+    For CSV, nested records are flattened and `csv_fields` sets the columns
+    """
+    if export_format == CSV_FORMAT:
+        return csv_lines((flatten(record) for record in records), csv_fields)
+    return ndjson_lines(records)
+
+
+def export_response(records, export_format, filename, csv_fields):
+    """Returns a streaming response that writes the records in the format
+
+    `records` is an iterable of serialized records. See `export_lines`
+    """
+    response = StreamingHttpResponse(export_lines(records, export_format, csv_fields),
+                                     content_type=EXPORT_CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+        filename, export_format)
+    return response
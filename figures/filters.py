@@ -21,7 +21,6 @@ TODO: Rename classes so they eiher all end with "Filter" or "FilterSet" then
 from __future__ import absolute_import
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
-from django.db.models import F
 
 import django_filters
 
@@ -283,8 +282,7 @@ class EnrollmentMetricsFilter(CourseEnrollmentFilter):
         The "value" parameter is either `True` or `False`
         """
         if value is True:
-            return queryset.filter(sections_possible__gt=0,
-                                   sections_worked=F('sections_possible'))
+            return queryset.filter(is_completed=True)
         else:
             return queryset
 
@@ -293,8 +291,7 @@ class EnrollmentMetricsFilter(CourseEnrollmentFilter):
         The "value" parameter is either `True` or `False`
         """
         if value is True:
-            # This is a hack until we add `completed` field to LCGM
-            return queryset.filter(sections_worked__lt=F('sections_possible'))
+            return queryset.filter(is_completed=False, sections_possible__gt=0)
         else:
             return queryset
 
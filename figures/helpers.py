@@ -188,6 +188,36 @@ def prev_day(val):
     return days_from(val, -1)
 
 
+def day_window(start_date, end_date=None):
+    """Returns the half open `[start, end)` datetime range for whole days
+
+    The range starts at midnight UTC of `start_date` and ends at midnight
+    after `end_date`. When `end_date` is not given, the range is the single
+    day `start_date`
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    return as_datetime(start_date), as_datetime(next_day(end_date))
+
+
+def month_window(year, month):
+    """Returns the half open `[start, end)` datetime range for the month
+    """
+    first_day = datetime.date(year=year, month=month, day=1)
+    return as_datetime(first_day), as_datetime(first_day + relativedelta(months=1))
+
+
+def window_filter(field_name, window):
+    """Returns filter arguments to match a datetime field to a window
+
+    Use this instead of `<field>__year`, `<field>__month` and `<field>__day`
+    lookups. Those lookups compile to date part functions on the column, so
+    the database cannot use an index on the field. A range comparison can
+    """
+    start, end = window
+    return {field_name + '__gte': start, field_name + '__lt': end}
+
+
 def days_in_month(month_for):
     _, num_days_in_month = calendar.monthrange(month_for.year, month_for.month)
     return num_days_in_month
@@ -0,0 +1,31 @@
+"""This Django management command backfills Figures completion data
+
+Sets the `is_completed` and `date_completed` fields of LearnerCourseGradeMetrics
+records and recounts each course's CourseCompletionCount for every site unless
+the '--site' option is used. Then it will update just that site
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+from textwrap import dedent
+
+from figures.management.base import BaseBackfillCommand
+from figures.tasks import backfill_completions
+
+
+class Command(BaseBackfillCommand):
+    """Backfill Figures completion fields and counts.
+    """
+    help = dedent(__doc__).strip()
+
+    def handle(self, *args, **options):
+        print('BEGIN: Backfill Figures completions')
+
+        for site_id in self.get_site_ids(options['site']):
+            print('Updating completions for site {}'.format(site_id))
+            if options['no_delay']:
+                backfill_completions(site_id=site_id)
+            else:
+                backfill_completions.delay(site_id=site_id)  # pragma: no cover
+
+        print('DONE: Backfill Figures completions')
@@ -14,7 +14,7 @@ from dateutil.rrule import rrule, DAILY
 from figures.management.base import BaseBackfillCommand
 from figures.tasks import (
     populate_daily_metrics,
-    experimental_populate_daily_metrics
+    populate_daily_metrics_distributed
 )
 
 
@@ -28,12 +28,17 @@ class Command(BaseBackfillCommand):
     help = dedent(__doc__).strip()
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '--distributed',
+            action='store_true',
+            default=False,
+            help='Run as per site and per course Celery tasks'
+        )
         parser.add_argument(
             '--experimental',
             action='store_true',
             default=False,
-            help=('Run with Celery workflows (Warning: This is still under'
-                  ' development and likely to get stuck/hung jobs')
+            help='Deprecated. Same as --distributed'
         )
         super(Command, self).add_arguments(parser)
 
@@ -45,7 +50,7 @@ class Command(BaseBackfillCommand):
         date_start = self.get_date(options['date_start'])
         date_end = self.get_date(options['date_end'])
 
-        experimental = options['experimental']
+        distributed = options['distributed'] or options['experimental']
 
         print('BEGIN RANGE: Backfilling Figures daily metrics for dates {} to {}'.format(
             date_start, date_end
@@ -65,9 +70,8 @@ class Command(BaseBackfillCommand):
                 force_update=options['overwrite']
             )
 
-            if experimental:
-                metrics_func = experimental_populate_daily_metrics
-                del kwargs['site_id']  # not implemented for experimental
+            if distributed:
+                metrics_func = populate_daily_metrics_distributed
             else:
                 metrics_func = populate_daily_metrics
             # try:
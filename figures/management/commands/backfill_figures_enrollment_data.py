@@ -2,6 +2,8 @@
 
 Running this will trigger figures.tasks.update_enrollment_data for every site
 unless the '--site' option is used. Then it will update just that site
+
+Use '--incremental' to only update enrollments changed since the last refresh
 """
 from __future__ import print_function
 from __future__ import absolute_import
@@ -17,14 +19,25 @@ class Command(BaseBackfillCommand):
     """
     help = dedent(__doc__).strip()
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            default=False,
+            help=('Only update enrollments changed since the last refresh. '
+                  'Does a full update for sites not refreshed before'))
+        super(Command, self).add_arguments(parser)
+
     def handle(self, *args, **options):
         print('BEGIN: Backfill Figures EnrollmentData')
 
         for site_id in self.get_site_ids(options['site']):
             print('Updating EnrollmentData for site {}'.format(site_id))
             if options['no_delay']:
-                update_enrollment_data(site_id=site_id)
+                update_enrollment_data(site_id=site_id,
+                                       incremental=options['incremental'])
             else:
-                update_enrollment_data.delay(site_id=site_id)  # pragma: no cover
+                update_enrollment_data.delay(site_id=site_id,
+                                             incremental=options['incremental'])  # pragma: no cover
 
         print('DONE: Backfill Figures EnrollmentData')
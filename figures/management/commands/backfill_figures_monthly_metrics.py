@@ -10,17 +10,19 @@ from textwrap import dedent
 from django.contrib.sites.models import Site
 
 from figures.backfill import backfill_monthly_metrics_for_site
+from figures.caching import bump_data_generation
 from figures.management.base import BaseBackfillCommand
 
 
-def backfill_site(site, overwrite, use_raw_sql):
+def backfill_site(site, overwrite, use_raw_sql, single_scan=False):
 
     print('Backfilling monthly metrics for site id={} domain={}'.format(
         site.id,
         site.domain))
     backfilled = backfill_monthly_metrics_for_site(site=site,
                                                    overwrite=overwrite,
-                                                   use_raw_sql=use_raw_sql)
+                                                   use_raw_sql=use_raw_sql,
+                                                   single_scan=single_scan)
     if backfilled:
         for rec in backfilled:
             obj = rec['obj']
@@ -30,6 +32,8 @@ def backfill_site(site, overwrite, use_raw_sql):
                 obj.active_user_count))
     else:
         print('No student modules for site "{}"'.format(site.domain))
+    # Cached history values for the backfilled months are stale
+    bump_data_generation(site.id)
 
 
 class Command(BaseBackfillCommand):
@@ -42,8 +46,15 @@ class Command(BaseBackfillCommand):
         '''
         parser.add_argument(
             '--use_raw_sql',
-            help=('Use raw SQL for query performance with large number of StudentModules, '
-                  'where supported.'),
+            help=('Count each month\'s active users with a single raw SQL statement. '
+                  'Faster for sites with a large number of StudentModules.'),
+            default=False,
+            action="store_true"
+        )
+        parser.add_argument(
+            '--single_scan',
+            help=('Count all months with one grouped query per site and write '
+                  'the monthly records in bulk.'),
             default=False,
             action="store_true"
         )
@@ -54,6 +65,9 @@ class Command(BaseBackfillCommand):
 
         for site_id in self.get_site_ids(options['site']):
             site = Site.objects.get(id=site_id)
-            backfill_site(site, overwrite=options['overwrite'], use_raw_sql=options['use_raw_sql'])
+            backfill_site(site,
+                          overwrite=options['overwrite'],
+                          use_raw_sql=options['use_raw_sql'],
+                          single_scan=options['single_scan'])
 
         print('END: Backfill Figures Metrics')
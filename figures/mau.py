@@ -4,11 +4,27 @@ This module provides MAU metrics retrieval functionality
 
 from __future__ import absolute_import
 from datetime import datetime, timedelta
-from django.utils.timezone import utc
 
-from figures.compat import RELEASE_LINE
+from django.conf import settings
+from django.db.models import Count
+from django.utils.timezone import utc
 
-from figures.models import CourseMauMetrics, SiteMauMetrics
+from figures.bitmaps import UserBitmap
+from figures.helpers import (
+    as_date,
+    as_datetime,
+    day_window,
+    month_window,
+    next_day,
+    window_filter,
+)
+from figures.hll import HyperLogLog
+from figures.models import (
+    CourseDailyMetrics,
+    CourseMauMetrics,
+    SiteDailyMetrics,
+    SiteMauMetrics,
+)
 from figures.sites import (
     get_course_keys_for_site,
     get_student_modules_for_site,
@@ -25,11 +41,177 @@ def get_mau_from_student_modules(student_modules, year, month):
     the specified month
 
     """
-    qs = student_modules.filter(modified__year=year,
-                                modified__month=month)
+    qs = student_modules.filter(**window_filter('modified', month_window(year, month)))
     return qs.values_list('student__id', flat=True).distinct()
 
 
+def get_course_mau_counts(student_modules, year, month):
+    """Returns the MAU of each course in the StudentModule queryset for the month
+
+    Runs one query grouped by course id instead of a query per course.
+    Returns a dict that maps course id strings to counts. Courses without
+    activity in the month are not in the dict
+    """
+    qs = student_modules.filter(
+        **window_filter('modified', month_window(year, month))).values(
+        'course_id').annotate(mau=Count('student_id', distinct=True)).order_by()
+    return {str(rec['course_id']): rec['mau'] for rec in qs}
+
+
+MAU_COUNT_EXACT = 'exact'
+MAU_COUNT_APPROXIMATE = 'approximate'
+
+
+def mau_count_mode():
+    """Returns how the live MAU endpoints count active users
+
+    'exact' takes the union of the daily user bitmaps stored with the daily
+    metrics, or counts distinct users in StudentModule for the month when a
+    bitmap is missing. 'approximate' merges the daily HyperLogLog sketches
+    instead. Both only read StudentModule for today. See `figures.bitmaps`
+    and `figures.hll`
+    """
+    return settings.ENV_TOKENS['FIGURES'].get('MAU_COUNT_MODE', MAU_COUNT_EXACT)
+
+
+def day_has_closed(date_for):
+    """Returns True if the day is over, so its activity can no longer change
+
+    The daily metrics pipeline only stores the active user bitmaps and
+    sketches of days that have closed. Records saved without them get them on
+    the next run, for the previous day. A stored bitmap or sketch always covers
+    the whole day
+    """
+    return as_datetime(next_day(as_date(date_for))) <= datetime.utcnow().replace(tzinfo=utc)
+
+
+def stored_daily_values(daily_metrics, field_name, start_date, end_date, num_series=1):
+    """Returns the field values of the daily metrics records in the date range
+
+    `daily_metrics` is a CourseDailyMetrics or SiteDailyMetrics queryset for
+    `num_series` courses or sites. Returns None if any day in the range has no
+    record or the record has no value for the field. A day without activity
+    has an empty value, which is not missing
+    """
+    if end_date < start_date:
+        return []
+    values = list(daily_metrics.filter(
+        date_for__gte=start_date,
+        date_for__lte=end_date).values_list(field_name, flat=True))
+    if len(values) != ((end_date - start_date).days + 1) * num_series or None in values:
+        return None
+    return values
+
+
+def merge_stored_sketches(daily_metrics, sketch_field, start_date, end_date):
+    """Returns the merged sketch of the daily metrics records in the date range
+
+    Returns None if a sketch is missing, or if the sketches were built with
+    different precisions. See `stored_daily_values`
+    """
+    sketches = stored_daily_values(daily_metrics, sketch_field, start_date, end_date)
+    if sketches is None:
+        return None
+    if not sketches:
+        return HyperLogLog()
+    merged = HyperLogLog.from_string(sketches[0])
+    try:
+        for sketch in sketches[1:]:
+            merged.merge(HyperLogLog.from_string(sketch))
+    except ValueError:
+        return None
+    return merged
+
+
+def stored_active_users(daily_metrics, bitmap_field, start_date, end_date, num_series=1):
+    """Returns the union of the daily user bitmaps in the date range
+
+    Returns None if a bitmap is missing. See `stored_daily_values`
+    """
+    bitmaps = stored_daily_values(daily_metrics, bitmap_field, start_date, end_date,
+                                  num_series=num_series)
+    if bitmaps is None:
+        return None
+    return UserBitmap.union_all(UserBitmap.from_string(bitmap) for bitmap in bitmaps)
+
+
+def course_active_users(site, course_id, start_date, end_date):
+    """Returns the bitmap of the learners active in the course in the date range
+
+    The overlap of two courses' learners is the intersection of their
+    bitmaps. Returns None if a day's bitmap is missing
+    """
+    return stored_active_users(
+        daily_metrics=CourseDailyMetrics.objects.filter(site=site,
+                                                        course_id=str(course_id)),
+        bitmap_field='active_learners_bitmap',
+        start_date=start_date,
+        end_date=end_date)
+
+
+def active_user_ids_for_day(student_modules, date_for):
+    return student_modules.filter(
+        **window_filter('modified', day_window(date_for))).values_list(
+        'student__id', flat=True).distinct()
+
+
+def month_to_date_active_users(daily_metrics, bitmap_field, date_for, todays_user_ids):
+    """Returns the bitmap of the users active in the month up to `date_for`
+
+    Takes the union of the stored bitmaps from the first of the month through
+    the day before `date_for` and the ids of the users active on `date_for`.
+    Returns None when a stored bitmap is missing, so callers can fall back to
+    querying StudentModule
+    """
+    active_users = stored_active_users(daily_metrics=daily_metrics,
+                                       bitmap_field=bitmap_field,
+                                       start_date=date_for.replace(day=1),
+                                       end_date=date_for - timedelta(days=1))
+    if active_users is None:
+        return None
+    return active_users | UserBitmap.from_ids(todays_user_ids)
+
+
+def approximate_mau_count(daily_metrics, sketch_field, date_for, todays_user_ids):
+    """Returns the approximate active users in the month up to `date_for`
+
+    Merges the stored sketches from the first of the month through the day
+    before `date_for` with a sketch of the users active on `date_for`. Returns
+    None when a stored sketch is missing
+    """
+    sketch = merge_stored_sketches(daily_metrics=daily_metrics,
+                                   sketch_field=sketch_field,
+                                   start_date=date_for.replace(day=1),
+                                   end_date=date_for - timedelta(days=1))
+    if sketch is None:
+        return None
+    sketch.update(todays_user_ids)
+    return sketch.count()
+
+
+def live_mau_count(student_modules, daily_metrics, sketch_field, bitmap_field, today):
+    """Returns the month to date MAU in the configured count mode
+    """
+    date_for = today.date()
+    todays_user_ids = list(active_user_ids_for_day(student_modules, date_for))
+    if mau_count_mode() == MAU_COUNT_APPROXIMATE:
+        count = approximate_mau_count(daily_metrics=daily_metrics,
+                                      sketch_field=sketch_field,
+                                      date_for=date_for,
+                                      todays_user_ids=todays_user_ids)
+        if count is not None:
+            return count
+    active_users = month_to_date_active_users(daily_metrics=daily_metrics,
+                                              bitmap_field=bitmap_field,
+                                              date_for=date_for,
+                                              todays_user_ids=todays_user_ids)
+    if active_users is not None:
+        return len(active_users)
+    return get_mau_from_student_modules(student_modules=student_modules,
+                                        year=today.year,
+                                        month=today.month).count()
+
+
 def get_mau_from_site_course(site, course_id, year, month):
     """Convenience function to get the distinct active users for a given course
     in a site
@@ -49,11 +231,13 @@ def retrieve_live_site_mau_data(site):
     """
     student_modules = get_student_modules_for_site(site)
     today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    count = live_mau_count(student_modules=student_modules,
+                           daily_metrics=SiteDailyMetrics.objects.filter(site=site),
+                           sketch_field='active_users_sketch',
+                           bitmap_field='active_users_bitmap',
+                           today=today)
     return dict(
-        count=users.count(),
+        count=count,
         month_for=today.date(),
         domain=site.domain,
     )
@@ -66,11 +250,15 @@ def retrieve_live_course_mau_data(site, course_id):
     """
     student_modules = get_student_modules_for_course_in_site(site, course_id)
     today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    count = live_mau_count(
+        student_modules=student_modules,
+        daily_metrics=CourseDailyMetrics.objects.filter(site=site,
+                                                        course_id=str(course_id)),
+        sketch_field='active_learners_sketch',
+        bitmap_field='active_learners_bitmap',
+        today=today)
     return dict(
-        count=users.count(),
+        count=count,
         month_for=today.date(),
         course_id=str(course_id),
         domain=site.domain,
@@ -92,34 +280,9 @@ def mau_1g_for_month_as_of_day(sm_queryset, date_for):
     Returns a queryset of distinct user ids
     """
 
-    # TODO: Remove this `if` branch after dropping Ginkgo support.
-    if RELEASE_LINE == 'ginkgo':
-        # Django 1.8 appears not to support 'lte' on the 'day' of a datetime
-        # Therefore we have to get records within a range
-        start_date = datetime(year=date_for.year,
-                              month=date_for.month,
-                              day=1).replace(tzinfo=utc)
-        # We do this in case 'date_for' is at the end of the month and get
-        # the 'day_after' as midnight of the next day so we can use '__lt'. If
-        # we simply used '__lte', then we exclude any events that happened on
-        # the 'date_for' in hours after the 'date_for' hours.
-
-        # temporary var as we don't know
-        day_after_temp = date_for + timedelta(days=1)
-        day_after = datetime(year=day_after_temp.year,
-                             month=day_after_temp.month,
-                             day=day_after_temp.day).replace(tzinfo=utc)
-
-        # We don't use 'dict(modified__range=[start_date, date_for])' because
-        # doing "__lt" for 0:00 hour tne next day means we don't have to worry
-        # about fractions of a second on the last second of the last day
-        filter_args = dict(modified__gte=start_date, modified__lt=day_after)
-    else:
-        filter_args = dict(modified__year=date_for.year,
-                           modified__month=date_for.month,
-                           modified__day__lte=date_for.day)
-
-    month_sm = sm_queryset.filter(**filter_args)
+    # From midnight on the first day of the month up to midnight after date_for
+    window = day_window(date_for.replace(day=1), date_for)
+    month_sm = sm_queryset.filter(**window_filter('modified', window))
     return month_sm.values('student__id').distinct()
 
 
@@ -138,6 +301,27 @@ def site_mau_1g_for_month_as_of_day(site, date_for):
                                       date_for=date_for)
 
 
+def site_mau_count_for_month_as_of_day(site, date_for, todays_user_ids=None):
+    """Returns the site's MAU count as of "date_for" in the month
+
+    Uses the stored daily user bitmaps, falling back to
+    `site_mau_1g_for_month_as_of_day` when a day's bitmap is missing.
+    `todays_user_ids` are the ids of the users active on "date_for", if the
+    caller already has them
+    """
+    if todays_user_ids is None:
+        todays_user_ids = active_user_ids_for_day(get_student_modules_for_site(site),
+                                                  date_for)
+    active_users = month_to_date_active_users(
+        daily_metrics=SiteDailyMetrics.objects.filter(site=site),
+        bitmap_field='active_users_bitmap',
+        date_for=date_for,
+        todays_user_ids=todays_user_ids)
+    if active_users is not None:
+        return len(active_users)
+    return site_mau_1g_for_month_as_of_day(site, date_for).count()
+
+
 def store_mau_metrics(site, overwrite=False):
     """
     Save "snapshot" of MAU metrics
@@ -155,21 +339,15 @@ def store_mau_metrics(site, overwrite=False):
                                                          date_for=today.date(),
                                                          data=dict(mau=site_mau.count()),
                                                          overwrite=overwrite)
-    course_mau_objects = []
-    for course_key in get_course_keys_for_site(site):
-        course_student_modules = student_modules.filter(course_id=course_key)
-        course_mau = get_mau_from_student_modules(
-            student_modules=course_student_modules,
-            year=today.year,
-            month=today.month)
-        course_mau_obj, _created = CourseMauMetrics.save_metrics(
-                site=site,
-                course_id=str(course_key),
-                date_for=today.date(),
-                data=dict(mau=course_mau.count()),
-                overwrite=overwrite)
-
-        course_mau_objects.append(course_mau_obj)
+    mau_by_course = get_course_mau_counts(student_modules=student_modules,
+                                          year=today.year,
+                                          month=today.month)
+    course_mau_objects = CourseMauMetrics.bulk_save_metrics(
+        site=site,
+        date_for=today.date(),
+        mau_by_course={str(course_key): mau_by_course.get(str(course_key), 0)
+                       for course_key in get_course_keys_for_site(site)},
+        overwrite=overwrite)
 
     return dict(smo=site_mau_obj,
                 cmos=course_mau_objects)
@@ -26,9 +26,12 @@ import datetime
 from decimal import Decimal
 import math
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Avg, Max, Sum
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Sum
 
+from figures.caching import get_data_generation
 from figures.compat import (
     GeneratedCertificate,
     chapter_grade_values,
@@ -40,13 +43,17 @@ from figures.helpers import (
     as_course_key,
     as_date,
     as_datetime,
+    day_window,
     days_in_month,
+    month_window,
     next_day,
     prev_day,
     previous_months_iterator,
     first_last_days_for_month,
+    window_filter,
 )
-from figures.mau import get_mau_from_site_course
+from figures.bitmaps import UserBitmap
+from figures.mau import get_mau_from_site_course, stored_active_users
 from figures.models import (
     CourseDailyMetrics,
     SiteDailyMetrics,
@@ -239,15 +246,17 @@ def get_site_mau_history_metrics(site, months_back):
     """Quick adaptation of `get_monthly_history_metric` for site MAU
 
     The `months_back` gets the previous N months back not including current
-    month because we do not capture the current month until it is over. Meaning
-    we wait until the next month to create a `SiteMonthlyMetrics` record for
-    that month's data
+    month. The current month comes from the latest SiteDailyMetrics MAU. The
+    daily rollup also keeps a `SiteMonthlyMetrics` record for the current
+    month, so it is left out of the stored months
     """
     history = []
 
-    # We will not have the current month's data because metrics are calculated
-    # after the month is over
-    for rec in SiteMonthlyMetrics.objects.filter(site=site).order_by('-month_for')[:months_back]:
+    current_month = datetime.datetime.utcnow().date()
+    month_start = datetime.date(year=current_month.year, month=current_month.month, day=1)
+    for rec in SiteMonthlyMetrics.objects.filter(
+            site=site,
+            month_for__lt=month_start).order_by('-month_for')[:months_back]:
         period = '{year}/{month}'.format(year=rec.month_for.year,
                                          month=str(rec.month_for.month).zfill(2))
         history.append(dict(period=period, value=rec.active_user_count))
@@ -260,36 +269,75 @@ def get_site_mau_history_metrics(site, months_back):
         # reverse the list because it is currently in reverser chronological order
         history.reverse()
 
-    current_month = datetime.datetime.utcnow().date()
     period = '{year}/{month}'.format(year=current_month.year,
                                      month=str(current_month.month).zfill(2))
     history.append(dict(period=period, value=current_month_active))
     return dict(current_month=current_month_active, history=history)
 
 
+def _active_user_ids(site, window, course_ids=None):
+    """Returns the distinct ids of the site's users with StudentModule records
+    modified in the datetime window
+    """
+    user_ids = figures.sites.get_user_ids_for_site(site)
+    filter_args = window_filter('modified', window)
+    filter_args['student_id__in'] = user_ids
+    if course_ids:
+        filter_args['course_id__in'] = [as_course_key(course_id) for course_id in course_ids]
+
+    return StudentModule.objects.filter(
+        **filter_args).values_list('student__id', flat=True).distinct()
+
+
+def get_stored_active_users_for_time_period(site, start_date, end_date, course_ids=None):
+    """Returns the bitmap of the users active in the time period
+
+    Days before today come from the daily user bitmaps of the site, or of the
+    courses when `course_ids` is given. Today comes from StudentModule, since
+    today's metrics are not stored yet. Returns None if a day's bitmap is
+    missing
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date)
+    today = datetime.datetime.utcnow().date()
+    if course_ids:
+        course_ids = set(str(course_id) for course_id in course_ids)
+        daily_metrics = CourseDailyMetrics.objects.filter(site=site,
+                                                          course_id__in=course_ids)
+        bitmap_field = 'active_learners_bitmap'
+    else:
+        daily_metrics = SiteDailyMetrics.objects.filter(site=site)
+        bitmap_field = 'active_users_bitmap'
+    active_users = stored_active_users(daily_metrics=daily_metrics,
+                                       bitmap_field=bitmap_field,
+                                       start_date=start_date,
+                                       end_date=min(end_date, prev_day(today)),
+                                       num_series=len(course_ids) if course_ids else 1)
+    if active_users is not None and start_date <= today <= end_date:
+        active_users |= UserBitmap.from_ids(
+            _active_user_ids(site, day_window(today), course_ids))
+    return active_users
+
+
 def get_active_users_for_time_period(site, start_date, end_date, course_ids=None):
     """
     Returns the number of users active in the time period.
 
-    This is determined by finding the unique user ids for StudentModule records
-    modified in a time period
+    This is the size of the union of the stored daily user bitmaps. When a
+    day's bitmap is missing, this is determined by finding the unique user ids
+    for StudentModule records modified in the time period
 
     We don't do this only because it raises timezone warnings
         modified__range=(as_date(start_date), as_date(end_date)),
     """
-    # Get list of learners for the site
-
-    user_ids = figures.sites.get_user_ids_for_site(site)
-    filter_args = dict(
-        modified__gt=as_datetime(prev_day(start_date)),
-        modified__lt=as_datetime(next_day(end_date)),
-        student_id__in=user_ids,
-    )
-    if course_ids:
-        filter_args['course_ids__in'] = course_ids
-
-    return StudentModule.objects.filter(
-        **filter_args).values('student__id').distinct().count()
+    active_users = get_stored_active_users_for_time_period(site=site,
+                                                           start_date=start_date,
+                                                           end_date=end_date,
+                                                           course_ids=course_ids)
+    if active_users is not None:
+        return len(active_users)
+    return _active_user_ids(site, day_window(start_date, end_date),
+                            course_ids).count()
 
 
 def get_total_site_users_for_time_period(site, start_date, end_date, **_kwargs):
@@ -545,6 +593,80 @@ def get_course_mau_history_metrics(site, course_id, date_for, months_back):
     return dict(current_month=current_month, history=history)
 
 
+def _max_value(values):
+    values = [val for val in values if val is not None]
+    return max(values) if values else None
+
+
+def _rounded_average(values):
+    values = [Decimal(val) for val in values if val is not None]
+    if not values:
+        return 0.0
+    return float((sum(values) / len(values)).quantize(Decimal('.00')))
+
+
+def _ceil_average(values):
+    values = [val for val in values if val is not None]
+    if not values:
+        return 0
+    return int(math.ceil(sum(values) / float(len(values))))
+
+
+# Time period functions that aggregate a single daily metrics field. For these,
+# `get_daily_metrics_history` retrieves the history in one query. Each maps to
+# the model, field, the function to aggregate a month's values and the value
+# for a month without records
+DAILY_METRICS_HISTORY = {
+    get_total_site_users_for_time_period: (
+        SiteDailyMetrics, 'total_user_count', _max_value, 0),
+    get_total_enrollments_for_time_period: (
+        SiteDailyMetrics, 'total_enrollment_count', _max_value, 0),
+    get_total_site_courses_for_time_period: (
+        SiteDailyMetrics, 'course_count', _max_value, 0),
+    get_course_enrolled_users_for_time_period: (
+        CourseDailyMetrics, 'enrollment_count', _max_value, 0),
+    get_course_average_progress_for_time_period: (
+        CourseDailyMetrics, 'average_progress', _rounded_average, 0.0),
+    get_course_average_days_to_complete_for_time_period: (
+        CourseDailyMetrics, 'average_days_to_complete', _ceil_average, 0),
+    get_course_num_learners_completed_for_time_period: (
+        CourseDailyMetrics, 'num_learners_completed', _max_value, 0),
+}
+
+
+def get_daily_metrics_history(func, site, date_for, months_back, **filter_args):
+    """Single pass version of `get_monthly_history_metric`
+
+    `func` must be one of the functions in `DAILY_METRICS_HISTORY`. Instead of
+    calling `func` for each month, we retrieve the daily values for the whole
+    period in one query and aggregate each month in Python. There is at most
+    one daily metrics record per day, so this is a small number of rows
+
+    Pass `course_id` in `filter_args` for the course metrics functions
+    """
+    model, field, aggregate, empty_value = DAILY_METRICS_HISTORY[func]
+    months = list(previous_months_iterator(month_for=as_date(date_for),
+                                           months_back=months_back))
+    start_date = datetime.date(months[0][0], months[0][1], 1)
+    end_date = datetime.date(*months[-1])
+    rows = model.objects.filter(site=site,
+                                date_for__gt=prev_day(start_date),
+                                date_for__lt=next_day(end_date),
+                                **filter_args).values_list('date_for', field)
+    monthly_values = {}
+    for day, value in rows:
+        monthly_values.setdefault((day.year, day.month), []).append(value)
+
+    history = []
+    for month in months:
+        values = monthly_values.get((month[0], month[1]))
+        history.append(dict(period=period_str(month),
+                            value=aggregate(values) if values else empty_value))
+    return dict(
+        current_month=history[-1]['value'],
+        history=history,)
+
+
 def get_monthly_history_metric(func, site, date_for, months_back,
                                include_current_in_history=True):  # pylint: disable=unused-argument
     """Convenience method to retrieve current and historic data
@@ -570,6 +692,12 @@ def get_monthly_history_metric(func, site, date_for, months_back,
     for the data and ``value`` containing the numeric value of the data
 
     """
+    if func in DAILY_METRICS_HISTORY:
+        return get_daily_metrics_history(func=func,
+                                         site=site,
+                                         date_for=date_for,
+                                         months_back=months_back)
+
     date_for = as_date(date_for)
     history = []
 
@@ -593,6 +721,96 @@ def get_monthly_history_metric(func, site, date_for, months_back,
         history=history,)
 
 
+HISTORY_CACHE_KEY = ('figures.history.{site_id}.{generation}.{course_id}.{metric}'
+                     '.{year}.{month}')
+
+# Values for closed months only change when the pipeline or a backfill rewrites
+# the site's data, which starts a new data generation. The timeout only keeps
+# the cache from holding values for sites and courses no one looks at anymore
+HISTORY_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Upper bound for the `months_back` query parameter of the history endpoints
+HISTORY_MAX_MONTHS_BACK = 24
+
+
+def history_cache_timeout():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'HISTORY_CACHE_TIMEOUT', HISTORY_CACHE_TIMEOUT))
+
+
+def history_max_months_back():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'HISTORY_MAX_MONTHS_BACK', HISTORY_MAX_MONTHS_BACK))
+
+
+def _history_metric(func, site, date_for, months_back, course_id=None):
+    if course_id is None:
+        return get_monthly_history_metric(func=func,
+                                          site=site,
+                                          date_for=date_for,
+                                          months_back=months_back)
+    if func in DAILY_METRICS_HISTORY:
+        return get_daily_metrics_history(func=func,
+                                         site=site,
+                                         date_for=date_for,
+                                         months_back=months_back,
+                                         course_id=str(course_id))
+    return get_monthly_history_metric(
+        func=lambda site, start_date, end_date: func(site=site,
+                                                     start_date=start_date,
+                                                     end_date=end_date,
+                                                     course_id=course_id),
+        site=site,
+        date_for=date_for,
+        months_back=months_back)
+
+
+def get_cached_history_metric(func, site, date_for, months_back, course_id=None):
+    """Returns `get_monthly_history_metric` data, caching closed months
+
+    Values for months that are over are cached per site data generation,
+    course, metric and month. We only calculate the months that are not
+    cached, which is usually just the current month. Pass `course_id` for the
+    course metrics functions
+    """
+    date_for = as_date(date_for)
+    today = datetime.datetime.utcnow().date()
+    months = list(previous_months_iterator(month_for=date_for, months_back=months_back))
+    generation = get_data_generation(site.id)
+    keys = {}
+    for month in months:
+        if datetime.date(*month) < today:
+            keys[month] = HISTORY_CACHE_KEY.format(site_id=site.id,
+                                                   generation=generation,
+                                                   course_id=course_id,
+                                                   metric=func.__name__,
+                                                   year=month[0],
+                                                   month=month[1])
+    values = cache.get_many(list(keys.values()))
+    missing = [month for month in months if keys.get(month) not in values]
+    if missing:
+        # Calculate from the first missing month so we make a single call
+        index = months.index(missing[0])
+        calculated = _history_metric(func=func,
+                                     site=site,
+                                     date_for=date_for,
+                                     months_back=len(months) - index,
+                                     course_id=course_id)
+        to_cache = {}
+        for month, rec in zip(months[index:], calculated['history']):
+            if month in keys:
+                values[keys[month]] = to_cache[keys[month]] = rec['value']
+            else:
+                values[month] = rec['value']
+        cache.set_many(to_cache, history_cache_timeout())
+
+    history = [dict(period=period_str(month), value=values[keys.get(month, month)])
+               for month in months]
+    return dict(
+        current_month=history[-1]['value'],
+        history=history,)
+
+
 def get_month_course_metrics(site, course_id, month_for, **_kwargs):
     """Returns a dict with the metrics for the given site, course, month
 
@@ -633,13 +851,119 @@ def get_month_course_metrics(site, course_id, month_for, **_kwargs):
         )
 
 
+def get_month_course_metrics_for_courses(site, course_ids, month_for):
+    """Batched `get_month_course_metrics` for a list of courses
+
+    Returns a list of the dicts `get_month_course_metrics` returns, in the
+    order of `course_ids`. Instead of five queries per course, this runs one
+    `CourseDailyMetrics` aggregate and one `StudentModule` distinct count, each
+    grouped by course id
+    """
+    first_day, last_day = first_last_days_for_month(month_for)
+    course_ids = [str(course_id) for course_id in course_ids]
+
+    cdm_aggregates = CourseDailyMetrics.objects.filter(
+        site=site,
+        date_for__gt=prev_day(first_day),
+        date_for__lt=next_day(last_day),
+        course_id__in=course_ids).values('course_id').annotate(
+            course_enrollments=Max('enrollment_count'),
+            num_learners_completed=Max('num_learners_completed'),
+            avg_days_to_complete=Avg('average_days_to_complete'),
+            avg_progress=Avg('average_progress')).order_by()
+    cdm_by_course = {rec['course_id']: rec for rec in cdm_aggregates}
+
+    active_users = StudentModule.objects.filter(
+        course_id__in=[as_course_key(course_id) for course_id in course_ids],
+        **window_filter('modified', month_window(first_day.year, first_day.month))
+        ).values('course_id').annotate(
+            count=Count('student_id', distinct=True)).order_by()
+    active_users_by_course = {str(rec['course_id']): rec['count'] for rec in active_users}
+
+    data = []
+    for course_id in course_ids:
+        rec = cdm_by_course.get(course_id, {})
+        avg_days_to_complete = rec.get('avg_days_to_complete')
+        avg_progress = rec.get('avg_progress')
+        data.append(dict(
+            course_id=course_id,
+            month_for=month_for,
+            active_users=active_users_by_course.get(course_id, 0),
+            course_enrollments=rec.get('course_enrollments') or 0,
+            num_learners_completed=rec.get('num_learners_completed') or 0,
+            avg_days_to_complete=(int(math.ceil(avg_days_to_complete))
+                                  if avg_days_to_complete is not None else 0),
+            avg_progress=(float(Decimal(avg_progress).quantize(Decimal('.00')))
+                          if avg_progress is not None else 0.0),
+        ))
+    return data
+
+
+def get_monthly_rollup_history_metric(field, func, site, date_for, months_back):
+    """Like `get_monthly_history_metric` but reads the site monthly rollup
+
+    Retrieves the `SiteMonthlyMetrics` records for the months in one query and
+    reads `field` from each. The pipeline only rolls up the current and the
+    previous month, so months without a rollup are read with
+    `get_cached_history_metric`, which calculates each closed month once
+    """
+    date_for = as_date(date_for)
+    months = list(previous_months_iterator(month_for=date_for, months_back=months_back))
+    rollups = {rec.month_for: rec for rec in SiteMonthlyMetrics.objects.filter(
+        site=site,
+        month_for__in=[datetime.date(month[0], month[1], 1) for month in months])}
+    values = {}
+    missing = []
+    for month in months:
+        rec = rollups.get(datetime.date(month[0], month[1], 1))
+        if rec and rec.is_rolled_up:
+            values[month] = getattr(rec, field)
+        else:
+            missing.append(month)
+
+    # Calculate each run of consecutive months without a rollup in one call
+    runs = []
+    for month in missing:
+        if runs and months.index(month) == months.index(runs[-1][-1]) + 1:
+            runs[-1].append(month)
+        else:
+            runs.append([month])
+    for run in runs:
+        calculated = get_cached_history_metric(func=func,
+                                               site=site,
+                                               date_for=datetime.date(*run[-1]),
+                                               months_back=len(run))
+        for month, rec in zip(run, calculated['history']):
+            values[month] = rec['value']
+
+    history = [dict(period=period_str(month), value=values[month]) for month in months]
+    current_month = history[-1]['value'] if history else 0
+    return dict(
+        current_month=current_month,
+        history=history,)
+
+
 def get_current_month_site_metrics(site, **_kwargs):
     """
+    Reads the current month's site monthly rollup if the pipeline has created
+    it. Otherwise calculates the metrics
+
     TODO: put the metric names and functions in a dict and iterate. This then
     will let up dynamically retrieve fields for the monthly metrics this function
     returns
     """
     date_for = datetime.datetime.utcnow().date()
+    rollup = SiteMonthlyMetrics.objects.filter(
+        site=site,
+        month_for=datetime.date(year=date_for.year, month=date_for.month, day=1)).first()
+    if rollup and rollup.is_rolled_up:
+        return dict(active_users=rollup.active_user_count,
+                    registered_users=rollup.registered_users,
+                    new_users=rollup.new_users,
+                    site_courses=rollup.site_courses,
+                    course_enrollments=rollup.course_enrollments,
+                    course_completions=rollup.course_completions)
+
     start_date = datetime.date(year=date_for.year, month=date_for.month, day=1)
     end_date = datetime.date(year=date_for.year,
                              month=date_for.month,
@@ -760,31 +1084,36 @@ def get_monthly_site_metrics(site, date_for=None, **kwargs):
 
     # We are retrieving data here in series before constructing the return dict
     # This makes it easier to inspect
-    monthly_active_users = get_monthly_history_metric(
+    monthly_active_users = get_monthly_rollup_history_metric(
+        field='active_user_count',
         func=get_active_users_for_time_period,
         site=site,
         date_for=date_for,
         months_back=months_back,
     )
-    total_site_users = get_monthly_history_metric(
+    total_site_users = get_monthly_rollup_history_metric(
+        field='registered_users',
         func=get_total_site_users_for_time_period,
         site=site,
         date_for=date_for,
         months_back=months_back,
     )
-    total_site_courses = get_monthly_history_metric(
+    total_site_courses = get_monthly_rollup_history_metric(
+        field='site_courses',
         func=get_total_site_courses_for_time_period,
         site=site,
         date_for=date_for,
         months_back=months_back,
     )
-    total_course_enrollments = get_monthly_history_metric(
+    total_course_enrollments = get_monthly_rollup_history_metric(
+        field='course_enrollments',
         func=get_total_enrollments_for_time_period,
         site=site,
         date_for=date_for,
         months_back=months_back,
     )
-    total_course_completions = get_monthly_history_metric(
+    total_course_completions = get_monthly_rollup_history_metric(
+        field='course_completions',
         func=get_total_course_completions_for_time_period,
         site=site,
         date_for=date_for,
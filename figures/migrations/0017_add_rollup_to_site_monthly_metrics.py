@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 18:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0016_add_enrollment_data_high_water_mark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='course_completions',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='course_enrollments',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='new_users',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='registered_users',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='site_courses',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 19:35
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0018_add_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='active_learners_sketch',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitedailymetrics',
+            name='active_users_sketch',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 19:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0019_add_active_user_sketches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='active_learners_bitmap',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitedailymetrics',
+            name='active_users_bitmap',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 19:58
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def set_latest_flags(apps, schema_editor):
+    """Flags the most recent existing record for each learner and course
+
+    Goes one course at a time to keep the queries small
+    """
+    LearnerCourseGradeMetrics = apps.get_model('figures', 'LearnerCourseGradeMetrics')
+    course_ids = LearnerCourseGradeMetrics.objects.order_by().values_list(
+        'course_id', flat=True).distinct()
+    for course_id in list(course_ids):
+        qs = LearnerCourseGradeMetrics.objects.filter(course_id=course_id).order_by()
+        latest_dates = dict(qs.values('user_id').annotate(
+            latest=Max('date_for')).values_list('user_id', 'latest'))
+        candidates = qs.filter(date_for__in=set(latest_dates.values())).values_list(
+            'id', 'user_id', 'date_for')
+        latest_ids = [rec_id for rec_id, user_id, date_for in candidates
+                      if date_for == latest_dates.get(user_id)]
+        qs.filter(id__in=latest_ids).update(is_latest=True)
+
+
+class Migration(migrations.Migration):
+
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0020_add_active_user_bitmaps'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0020_add_active_user_bitmaps'),
+        ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learnercoursegrademetrics',
+            name='is_latest',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='learnercoursegrademetrics',
+            index_together=set([('course_id', 'is_latest'), ('site', 'is_latest')]),
+        ),
+        migrations.RunPython(set_latest_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 20:11
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+from django.db import migrations, models
+from django.db.models import F, Min
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+def set_completion_flags(apps, schema_editor):
+    """Flags the existing completed records and sets the first completion date
+    on the latest record of each completed enrollment
+
+    The `backfill_figures_completions` management command does the same and
+    also updates the completion counts
+    """
+    LearnerCourseGradeMetrics = apps.get_model('figures', 'LearnerCourseGradeMetrics')
+    LearnerCourseGradeMetrics.objects.filter(
+        sections_possible__gt=0,
+        sections_worked=F('sections_possible')).update(is_completed=True)
+    course_ids = LearnerCourseGradeMetrics.objects.filter(
+        is_completed=True).order_by().values_list('course_id', flat=True).distinct()
+    for course_id in list(course_ids):
+        qs = LearnerCourseGradeMetrics.objects.filter(course_id=course_id).order_by()
+        first_completed = qs.filter(is_completed=True).values('user_id').annotate(
+            first=Min('date_for')).values_list('user_id', 'first')
+        user_ids_by_date = {}
+        for user_id, date_completed in first_completed:
+            user_ids_by_date.setdefault(date_completed, []).append(user_id)
+        for date_completed, user_ids in user_ids_by_date.items():
+            qs.filter(user_id__in=user_ids, is_latest=True).update(
+                date_completed=date_completed)
+
+
+class Migration(migrations.Migration):
+
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0021_add_lcgm_is_latest'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0021_add_lcgm_is_latest'),
+        ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learnercoursegrademetrics',
+            name='date_completed',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='learnercoursegrademetrics',
+            name='is_completed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='learnercoursegrademetrics',
+            index_together=set([('course_id', 'is_latest'), ('site', 'is_latest'), ('site', 'is_completed')]),
+        ),
+        migrations.CreateModel(
+            name='CourseCompletionCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('course_id', models.CharField(db_index=True, max_length=255)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sites.Site')),
+            ],
+            options={
+                'unique_together': set([('site', 'course_id')]),
+            },
+        ),
+        migrations.RunPython(set_completion_flags, migrations.RunPython.noop),
+    ]
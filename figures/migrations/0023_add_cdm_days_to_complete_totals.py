@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 20:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0022_add_lcgm_completion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='days_to_complete_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='days_to_complete_total',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:10
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def fill_completion_counts(apps, schema_editor):
+    """Counts the completed enrollments of each course
+
+    The completed enrollments API reads its count from CourseCompletionCount,
+    so every course with completions needs a count
+    """
+    LearnerCourseGradeMetrics = apps.get_model('figures', 'LearnerCourseGradeMetrics')
+    CourseCompletionCount = apps.get_model('figures', 'CourseCompletionCount')
+    counts = LearnerCourseGradeMetrics.objects.filter(
+        is_latest=True, date_completed__isnull=False).order_by().values(
+            'site_id', 'course_id').annotate(completed_count=Count('id'))
+    for rec in counts:
+        CourseCompletionCount.objects.update_or_create(
+            site_id=rec['site_id'],
+            course_id=rec['course_id'],
+            defaults=dict(completed_count=rec['completed_count']))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0023_add_cdm_days_to_complete_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_completion_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 23:30
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def clear_open_day_active_users(apps, schema_editor):
+    """Clears the active user bitmaps and sketches written before their day closed
+
+    These only hold the users active up to the pipeline run. The pipeline
+    stores the whole day on its next run for the previous day. Older days fall
+    back to counting StudentModule records
+    """
+    for model_name, bitmap_field, sketch_field in [
+            ('SiteDailyMetrics', 'active_users_bitmap', 'active_users_sketch'),
+            ('CourseDailyMetrics', 'active_learners_bitmap', 'active_learners_sketch')]:
+        model = apps.get_model('figures', model_name)
+        records = model.objects.filter(**{bitmap_field + '__isnull': False}).values_list(
+            'id', 'date_for', 'modified')
+        open_ids = [rec_id for rec_id, date_for, modified in records.iterator()
+                    if modified.date() <= date_for]
+        for i in range(0, len(open_ids), 500):
+            model.objects.filter(id__in=open_ids[i:i + 500]).update(
+                **{bitmap_field: None, sketch_field: None})
+        # Sketches without bitmaps were written the same way
+        model.objects.filter(**{bitmap_field + '__isnull': True}).exclude(
+            **{sketch_field + '__isnull': True}).update(**{sketch_field: None})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0024_fill_course_completion_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_open_day_active_users, migrations.RunPython.noop),
+    ]
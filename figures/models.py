@@ -4,12 +4,13 @@ TODO: Create a base "SiteModel" or a "SiteModelMixin"
 """
 
 from __future__ import absolute_import
+from collections import defaultdict
 from datetime import date
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import F
+from django.db import models, transaction
+from django.db.models import F, Max, Min, Q, Sum
 from django.utils.encoding import python_2_unicode_compatible
 
 from jsonfield import JSONField
@@ -17,8 +18,8 @@ from jsonfield import JSONField
 from model_utils.models import TimeStampedModel
 
 from figures.compat import CourseEnrollment
-from figures.helpers import as_course_key
-from figures.progress import EnrollmentProgress
+from figures.helpers import as_course_key, as_date
+from figures.progress import EnrollmentProgress, bulk_progress_data
 
 
 def default_site():
@@ -65,6 +66,19 @@ class CourseDailyMetrics(TimeStampedModel):
     # for the course as of the "date_for"
     num_learners_completed = models.IntegerField()
 
+    # HyperLogLog sketch of the ids of the learners active on "date_for".
+    # See `figures.hll`
+    active_learners_sketch = models.TextField(blank=True, null=True)
+
+    # Compressed bitmap of the ids of the learners active on "date_for".
+    # See `figures.bitmaps`
+    active_learners_bitmap = models.TextField(blank=True, null=True)
+
+    # Sum of the days to complete and the number of certificates summed as of
+    # "date_for". These let the next day's record add only the new certificates
+    days_to_complete_total = models.IntegerField(blank=True, null=True)
+    days_to_complete_count = models.IntegerField(blank=True, null=True)
+
     class Meta:
         unique_together = ('course_id', 'date_for',)
         ordering = ('-date_for', 'course_id',)
@@ -116,6 +130,14 @@ class SiteDailyMetrics(TimeStampedModel):
     # Should change this to default value of 0
     mau = models.IntegerField(blank=True, null=True)
 
+    # HyperLogLog sketch of the ids of the users active on "date_for".
+    # See `figures.hll`
+    active_users_sketch = models.TextField(blank=True, null=True)
+
+    # Compressed bitmap of the ids of the users active on "date_for".
+    # See `figures.bitmaps`
+    active_users_bitmap = models.TextField(blank=True, null=True)
+
     # TODO: Add field for number of CDMs reported
 
     class Meta:
@@ -160,8 +182,14 @@ class SiteMonthlyMetrics(TimeStampedModel):
     """
     Stores metrics for a given site and month
 
-
+    Also serves as the monthly rollup for the site monthly metrics endpoints.
+    The rollup fields are null until the pipeline has rolled up the month. See
+    `figures.pipeline.site_monthly_metrics.update_month_rollup`
     """
+    # Fields rolled up by the pipeline, in addition to 'active_user_count'
+    ROLLUP_FIELDS = ('registered_users', 'new_users', 'site_courses',
+                     'course_enrollments', 'course_completions')
+
     # TODO: Review the most appropriate on_delete behaviour
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     # Month for which this record's data are collected
@@ -169,6 +197,12 @@ class SiteMonthlyMetrics(TimeStampedModel):
     month_for = models.DateField()
     active_user_count = models.IntegerField()
 
+    registered_users = models.IntegerField(null=True)
+    new_users = models.IntegerField(null=True)
+    site_courses = models.IntegerField(null=True)
+    course_enrollments = models.IntegerField(null=True)
+    course_completions = models.IntegerField(null=True)
+
     class Meta:
         ordering = ['-month_for', 'site']
         unique_together = ['month_for', 'site']
@@ -195,6 +229,55 @@ class SiteMonthlyMetrics(TimeStampedModel):
                                                            month_for=month_for,
                                                            defaults=defaults)
 
+    @classmethod
+    def add_months(cls, site, active_user_counts, overwrite=False):
+        """Add the records for many months at once
+
+        `active_user_counts` maps the first day of each month to its active
+        user count. New records are created with one `bulk_create`. Existing
+        records are only updated when `overwrite` is True and the count has
+        changed.
+
+        Returns a list of `(obj, created)` tuples in month order
+        """
+        existing = {obj.month_for: obj for obj in SiteMonthlyMetrics.objects.filter(
+            site=site, month_for__in=list(active_user_counts.keys()))}
+        SiteMonthlyMetrics.objects.bulk_create([
+            SiteMonthlyMetrics(site=site,
+                               month_for=month_for,
+                               active_user_count=count)
+            for month_for, count in active_user_counts.items()
+            if month_for not in existing])
+        if overwrite:
+            for month_for, obj in existing.items():
+                if obj.active_user_count != active_user_counts[month_for]:
+                    SiteMonthlyMetrics.objects.filter(id=obj.id).update(
+                        active_user_count=active_user_counts[month_for])
+        # bulk_create does not set primary keys on every backend, so we read
+        # the records back
+        objs = SiteMonthlyMetrics.objects.filter(
+            site=site, month_for__in=list(active_user_counts.keys())).order_by('month_for')
+        return [(obj, obj.month_for not in existing) for obj in objs]
+
+    @classmethod
+    def update_rollup(cls, site, year, month, active_user_count, **rollup_values):
+        """Create or update the month's record with rolled up values
+
+        Unlike `add_month`, this always overwrites the month's values. Keyword
+        arguments not in `ROLLUP_FIELDS` are ignored
+        """
+        month_for = date(year=year, month=month, day=1)
+        defaults = {key: val for key, val in rollup_values.items()
+                    if key in cls.ROLLUP_FIELDS}
+        defaults['active_user_count'] = active_user_count
+        return SiteMonthlyMetrics.objects.update_or_create(site=site,
+                                                           month_for=month_for,
+                                                           defaults=defaults)
+
+    @property
+    def is_rolled_up(self):
+        return all(getattr(self, field) is not None for field in self.ROLLUP_FIELDS)
+
 
 class EnrollmentDataManager(models.Manager):
     """Custom model manager for EnrollmentData
@@ -226,30 +309,9 @@ class EnrollmentDataManager(models.Manager):
             user=user,
             course_id=str(course_id))
         if lcgm:
-            # do we already have an enrollment data record
-            # We may change this to use
-            progress_data = dict(
-                date_for=lcgm.date_for,
-                is_completed=lcgm.completed,
-                progress_percent=lcgm.progress_percent,
-                points_possible=lcgm.points_possible,
-                points_earned=lcgm.points_earned,
-                sections_possible=lcgm.sections_possible,
-                sections_worked=lcgm.sections_worked
-            )
+            progress_data = self._progress_data_from_lcgm(lcgm)
         else:
-            ep = EnrollmentProgress(user=user, course_id=course_id)
-            # TODO: If we get progress worked and there is no LCGM, then we have
-            # a bug OR there was progress after the last daily metrics collection
-            progress_data = dict(
-                date_for=date.today(),
-                is_completed=ep.is_completed(),
-                progress_percent=ep.progress_percent(),
-                points_possible=ep.progress.get('points_possible', 0),
-                points_earned=ep.progress.get('points_earned', 0),
-                sections_possible=ep.progress.get('sections_possible', 0),
-                sections_worked=ep.progress.get('sections_worked', 0)
-            )
+            progress_data = self._progress_data_from_platform(user, course_id)
         defaults.update(progress_data)
 
         obj, created = self.update_or_create(
@@ -259,6 +321,109 @@ class EnrollmentDataManager(models.Manager):
             defaults=defaults)
         return obj, created
 
+    def bulk_set_enrollment_data(self, site, course_id, course_enrollments):
+        """Batched version of `set_enrollment_data` for enrollments in a course
+
+        Uses a fixed number of queries to read the learners' latest
+        LearnerCourseGradeMetrics records and existing EnrollmentData records.
+        New records are saved with `bulk_create` and existing records updated in
+        a single transaction
+
+        Returns a list of (EnrollmentData, created) tuples
+        """
+        course_enrollments = list(course_enrollments)
+        if not course_enrollments:
+            return []
+        user_ids = [ce.user_id for ce in course_enrollments]
+        lcgm_latest = LearnerCourseGradeMetrics.objects.latest_lcgm_for_course(
+            course_id=course_id, user_ids=user_ids)
+        existing = {obj.user_id: obj for obj in self.filter(site=site,
+                                                            course_id=str(course_id),
+                                                            user_id__in=user_ids)}
+        # Learners without LCGM records need progress from the platform. Get
+        # it in bulk from the course structure cache if we can
+        no_lcgm_user_ids = [user_id for user_id in user_ids if user_id not in lcgm_latest]
+        bulk_progress = bulk_progress_data(course_id=course_id, user_ids=no_lcgm_user_ids)
+
+        results = []
+        to_create = []
+        to_update = []
+        for ce in course_enrollments:
+            defaults = dict(
+                is_enrolled=ce.is_active,
+                date_enrolled=ce.created,
+            )
+            if ce.user_id in lcgm_latest:
+                defaults.update(self._progress_data_from_lcgm(lcgm_latest[ce.user_id]))
+            elif bulk_progress:
+                defaults.update(self._progress_data_from_progress(bulk_progress[ce.user_id]))
+            else:
+                defaults.update(self._progress_data_from_platform(ce.user, course_id))
+
+            obj = existing.get(ce.user_id)
+            if obj:
+                for key, val in defaults.items():
+                    setattr(obj, key, val)
+                to_update.append(obj)
+                results.append((obj, False))
+            else:
+                obj = self.model(site=site,
+                                 user_id=ce.user_id,
+                                 course_id=str(course_id),
+                                 **defaults)
+                to_create.append(obj)
+                results.append((obj, True))
+
+        with transaction.atomic():
+            self.bulk_create(to_create)
+            for obj in to_update:
+                obj.save()
+        return results
+
+    @staticmethod
+    def _progress_data_from_lcgm(lcgm):
+        return dict(
+            date_for=lcgm.date_for,
+            is_completed=lcgm.completed,
+            progress_percent=lcgm.progress_percent,
+            points_possible=lcgm.points_possible,
+            points_earned=lcgm.points_earned,
+            sections_possible=lcgm.sections_possible,
+            sections_worked=lcgm.sections_worked
+        )
+
+    @staticmethod
+    def _progress_data_from_progress(progress):
+        """Converts `figures.progress.bulk_progress_data` values
+        """
+        sections_possible = progress['count']
+        sections_worked = progress['sections_worked']
+        return dict(
+            date_for=date.today(),
+            is_completed=sections_worked > 0 and sections_worked == sections_possible,
+            progress_percent=(float(sections_worked) / float(sections_possible)
+                              if sections_possible else 0.0),
+            points_possible=progress['points_possible'],
+            points_earned=progress['points_earned'],
+            sections_possible=sections_possible,
+            sections_worked=sections_worked
+        )
+
+    @staticmethod
+    def _progress_data_from_platform(user, course_id):
+        ep = EnrollmentProgress(user=user, course_id=course_id)
+        # TODO: If we get progress worked and there is no LCGM, then we have
+        # a bug OR there was progress after the last daily metrics collection
+        return dict(
+            date_for=date.today(),
+            is_completed=ep.is_completed(),
+            progress_percent=ep.progress_percent(),
+            points_possible=ep.progress.get('points_possible', 0),
+            points_earned=ep.progress.get('points_earned', 0),
+            sections_possible=ep.progress.get('sections_possible', 0),
+            sections_worked=ep.progress.get('sections_worked', 0)
+        )
+
 
 @python_2_unicode_compatible
 class EnrollmentData(TimeStampedModel):
@@ -323,6 +488,25 @@ class EnrollmentData(TimeStampedModel):
         )
 
 
+@python_2_unicode_compatible
+class EnrollmentDataHighWaterMark(TimeStampedModel):
+    """Tracks when EnrollmentData was last refreshed for a site
+
+    The incremental EnrollmentData refresh only updates enrollments with
+    CourseEnrollment, StudentModule or LearnerCourseGradeMetrics records
+    changed since `refreshed_at`. See
+    `figures.backfill.refresh_enrollment_data_for_site`
+    """
+    site = models.OneToOneField(Site, on_delete=models.CASCADE)
+
+    # The time the refresh started. Changes made while the refresh runs are
+    # picked up by the next refresh
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return '{} {} {}'.format(self.id, self.site.domain, self.refreshed_at)
+
+
 class LearnerCourseGradeMetricsManager(models.Manager):
     """Custom model manager for LearnerCourseGrades model
     """
@@ -333,45 +517,113 @@ class LearnerCourseGradeMetricsManager(models.Manager):
         new records when data has changed. this means that for a given course,
         learners may not have the same "most recent date"
 
-        This means we have to be careful of where we use this method in our
-        API as it costs a query per call. We will likely require restructuring
-        or augmenting our data if we need to bulk retrieve
+        The most recent record is flagged with `is_latest` when it is saved, so
+        this is an indexed lookup instead of ordering the learner's records
 
         TODO: Consider if we want to add 'site' as a parameter and update the
         uniqueness constraint to be: site, course_id, user, date_for
         """
-        queryset = self.filter(user=user,
-                               course_id=str(course_id)).order_by('-date_for')
-        return queryset[0] if queryset else None
+        return self.filter(user=user,
+                           course_id=str(course_id),
+                           is_latest=True).order_by().first()
+
+    def latest_lcgm_for_course(self, course_id, user_ids=None):
+        """Returns a dict of the most recent record per learner in the course
+
+        This is the bulk counterpart to `latest_lcgm`. It costs one query
+        regardless of the number of learners. Learners without records are not
+        in the returned dict
+
+        Optionally filter on a list (or queryset) of learner ids with `user_ids`
+        """
+        qs = self.most_recent_for_course(course_id)
+        if user_ids is not None:
+            qs = qs.filter(user_id__in=user_ids)
+        return {rec.user_id: rec for rec in qs}
+
+    def latest_lcgm_for_enrollments(self, enrollments):
+        """Returns a dict of the most recent record for each enrollment
+
+        This is the bulk counterpart to `latest_lcgm` for a list of
+        `CourseEnrollment` records, like a page of API results. It costs one
+        query like `latest_lcgm_for_course`. The dict is keyed on
+        `(user_id, course_id)` with the course id as a string. Enrollments
+        without records are not in the returned dict
+        """
+        keys = set((enrollment.user_id, str(enrollment.course_id))
+                   for enrollment in enrollments)
+        if not keys:
+            return dict()
+        qs = self.filter(user_id__in=set(key[0] for key in keys),
+                         course_id__in=set(key[1] for key in keys),
+                         is_latest=True).order_by()
+        # The filter also matches learners in courses of the other enrollments
+        return {(rec.user_id, rec.course_id): rec for rec in qs
+                if (rec.user_id, rec.course_id) in keys}
 
     def most_recent_for_course(self, course_id):
-        statement = """ \
-        SELECT id, user_id, course_id, MAX(date_for)
-        FROM figures_learnercoursegrademetrics lcgm
-        WHERE course_id = {course_id} AND
-        GROUP BY user_id, course_id
+        """Returns the most recent record of each learner in the course
         """
-        return self.raw(statement.format(course_id=str(course_id)))
+        return self.filter(course_id=str(course_id), is_latest=True).order_by()
+
+    def most_recent_for_site(self, site, course_ids=None):
+        """Returns the most recent record of each enrollment in the site
+
+        This is the current progress of the site's learners. Optionally filter
+        on a list of course ids with `course_ids`
+        """
+        qs = self.filter(site=site, is_latest=True).order_by()
+        if course_ids:
+            qs = qs.filter(course_id__in=[str(key) for key in course_ids])
+        return qs
+
+    def set_latest_flags(self, **filter_args):
+        """Rebuilds the `is_latest` flags of the records matching the filter
+
+        Finds the newest `date_for` per learner and course by comparing dates.
+        The filter should select all the records of each learner and course it
+        matches, for example `course_id=...`
+
+        Returns the number of records flagged as latest
+        """
+        qs = self.filter(**filter_args).order_by()
+        latest_dates = {(rec['user_id'], rec['course_id']): rec['latest'] for rec in
+                        qs.values('user_id', 'course_id').annotate(latest=Max('date_for'))}
+        candidates = qs.filter(date_for__in=set(latest_dates.values())).values_list(
+            'id', 'user_id', 'course_id', 'date_for')
+        latest_ids = [rec_id for rec_id, user_id, course_id, date_for in candidates
+                      if date_for == latest_dates.get((user_id, course_id))]
+        with transaction.atomic():
+            qs.filter(is_latest=True).exclude(id__in=latest_ids).update(is_latest=False)
+            qs.filter(id__in=latest_ids, is_latest=False).update(is_latest=True)
+        return len(latest_ids)
 
     def completed_for_site(self, site, **_kwargs):
-        """Return course_id/user_id pairs that have completed
+        """Return the records that show a completed enrollment
         Initial filters on list of users, listr of course ids
 
         User IDs can be filtered by passing `user_id=` list of user ids
 
         Course IDs can be filtered by passing `course_ids=` list of course ids
 
-        Returns a distinct QuerySet dict list of values with keys
-        'course_id' and 'user_id'
+        Filters on the indexed `is_completed` column
+        """
+        qs = self.filter(site=site, is_completed=True)
+        return self._filter_users_and_courses(qs, **_kwargs)
+
+    def completed_ids_for_site(self, site, **_kwargs):
+        """Returns course_id/user_id pairs for enrollments that have completed
 
-        We will consider adding a "completed" field to the model for faster
-        filtering, since we can index on the field. However, we need to evaluate
-        the additional storage need
+        Returns a QuerySet dict list of values with keys 'course_id' and
+        'user_id'. The latest record of an enrollment carries the date the
+        learner first completed, so each pair comes from one row without a
+        DISTINCT
         """
-        qs = self.filter(site=site,
-                         sections_possible__gt=0,
-                         sections_worked=F('sections_possible'))
+        qs = self.filter(site=site, is_latest=True, date_completed__isnull=False)
+        return self._filter_users_and_courses(qs, **_kwargs).order_by(
+            'course_id', 'user_id').values('course_id', 'user_id')
 
+    def _filter_users_and_courses(self, qs, **_kwargs):
         # Build out filter. Note, we don't check if the var is iterable
         # we let it fail of invalid values passed in
         filter_args = dict()
@@ -386,9 +638,31 @@ class LearnerCourseGradeMetricsManager(models.Manager):
             qs = qs.filter(**filter_args)
         return qs
 
-    def completed_ids_for_site(self, site, **_kwargs):
-        qs = self.completed_for_site(site, **_kwargs)
-        return qs.values('course_id', 'user_id').distinct()
+    def set_completion_flags(self, **filter_args):
+        """Rebuilds `is_completed` and `date_completed` for the matching records
+
+        Used to backfill records saved before the columns existed. The filter
+        should select all the records of each learner and course it matches.
+        Only the latest records get `date_completed`, since those are the
+        records the pipeline carries it forward from
+
+        Returns the number of enrollments that have completed
+        """
+        qs = self.filter(**filter_args)
+        completed = Q(sections_possible__gt=0, sections_worked=F('sections_possible'))
+        with transaction.atomic():
+            qs.filter(completed).exclude(is_completed=True).update(is_completed=True)
+            qs.filter(is_completed=True).exclude(completed).update(is_completed=False)
+            qs.filter(date_completed__isnull=False).update(date_completed=None)
+            first_completed = qs.filter(is_completed=True).order_by().values(
+                'course_id', 'user_id').annotate(first=Min('date_for'))
+            user_ids_by_date = defaultdict(list)
+            for rec in first_completed:
+                user_ids_by_date[(rec['course_id'], rec['first'])].append(rec['user_id'])
+            for (course_id, date_completed), user_ids in user_ids_by_date.items():
+                qs.filter(course_id=course_id, user_id__in=user_ids, is_latest=True).update(
+                    date_completed=date_completed)
+        return len(first_completed)
 
     def completed_raw_for_site(self, site, **_kwargs):
         """Experimental
@@ -430,12 +704,16 @@ class LearnerCourseGradeMetrics(TimeStampedModel):
     actually needed and edx-platform uses FloatField in its grades models
 
 
+    The most recent record for each learner and course has `is_latest` set.
+    `save` maintains the flag and the completion fields. Code that writes
+    records with `bulk_create` must set them, as
+    `figures.pipeline.enrollment_metrics` does, or call
+    `LearnerCourseGradeMetrics.objects.set_latest_flags` and
+    `LearnerCourseGradeMetrics.objects.set_completion_flags`
+
     TODO: Add fields
         `is_active` - get the 'is_active' value from the enrollment at the time
         this record is created
-        `completed` - This lets us filter on a table column instead of
-                      calculating it
-    TODO: Add index on 'course_id', 'date_for', 'completed'
     """
     # TODO: Review the most appropriate on_delete behaviour
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
@@ -451,6 +729,10 @@ class LearnerCourseGradeMetrics(TimeStampedModel):
     points_earned = models.FloatField()
     sections_worked = models.IntegerField()
     sections_possible = models.IntegerField()
+    is_latest = models.BooleanField(default=False)
+    is_completed = models.BooleanField(default=False)
+    # On the latest record, the date the learner first completed the course
+    date_completed = models.DateField(blank=True, null=True)
 
     objects = LearnerCourseGradeMetricsManager()
 
@@ -460,12 +742,49 @@ class LearnerCourseGradeMetrics(TimeStampedModel):
         Open edX Course IDs are globally unique, so it is not required
         """
         unique_together = ('user', 'course_id', 'date_for',)
+        index_together = (('course_id', 'is_latest'), ('site', 'is_latest'),
+                          ('site', 'is_completed'),)
         ordering = ('date_for', 'user__username', 'course_id',)
 
     def __str__(self):
         return "{} {} {} {}".format(
             self.id, self.date_for, self.user.username, self.course_id)
 
+    def set_completion(self, previous=None):
+        """Sets `is_completed` and `date_completed` from the progress data
+
+        `previous` is the learner's previous latest record for the course. If
+        the learner completed before, its `date_completed` is carried forward,
+        so the latest record tells if the learner has ever completed
+        """
+        self.is_completed = self.sections_possible > 0 and (
+            self.sections_worked == self.sections_possible)
+        if previous and previous.date_completed:
+            self.date_completed = previous.date_completed
+        elif self.is_completed and not self.date_completed:
+            self.date_completed = as_date(self.date_for)
+
+    def save(self, *args, **kwargs):
+        """Saves the record and moves the `is_latest` flag to it if it is the
+        learner's most recent record for the course
+        """
+        with transaction.atomic():
+            flagged = LearnerCourseGradeMetrics.objects.filter(
+                user_id=self.user_id, course_id=self.course_id, is_latest=True)
+            latest = flagged.exclude(pk=self.pk).order_by().select_for_update().first()
+            self.is_latest = latest is None or latest.date_for <= as_date(self.date_for)
+            self.set_completion(previous=latest if self.is_latest else None)
+            # The enrollment is counted when its latest record first gets a
+            # completion date
+            newly_completed = bool(self.is_latest and self.date_completed) and not (
+                flagged.filter(date_completed__isnull=False).exists())
+            super(LearnerCourseGradeMetrics, self).save(*args, **kwargs)
+            if self.is_latest and latest:
+                flagged.exclude(pk=self.pk).update(is_latest=False)
+            if newly_completed:
+                CourseCompletionCount.objects.add_completion(site=self.site,
+                                                             course_id=self.course_id)
+
     @property
     def progress_percent(self):
         """Returns the sections worked divided by the sections possible
@@ -498,6 +817,61 @@ class LearnerCourseGradeMetrics(TimeStampedModel):
                 self.sections_worked == self.sections_possible)
 
 
+class CourseCompletionCountManager(models.Manager):
+    """Custom model manager for the CourseCompletionCount model
+    """
+    def update_count(self, site, course_id):
+        """Recounts the learners who have completed the course
+
+        The count is an indexed lookup on the latest LearnerCourseGradeMetrics
+        records. Returns the CourseCompletionCount record
+        """
+        completed_count = LearnerCourseGradeMetrics.objects.completed_ids_for_site(
+            site=site, course_ids=[course_id]).count()
+        obj, _created = self.update_or_create(site=site,
+                                              course_id=str(course_id),
+                                              defaults=dict(completed_count=completed_count))
+        return obj
+
+    def add_completion(self, site, course_id):
+        """Adds a newly completed enrollment to the course count
+
+        `LearnerCourseGradeMetrics.save` calls this. If the course has no
+        count yet, the course is recounted
+        """
+        updated = self.filter(site=site, course_id=str(course_id)).update(
+            completed_count=F('completed_count') + 1)
+        if not updated:
+            self.update_count(site=site, course_id=course_id)
+
+    def site_count(self, site):
+        """Returns the number of completed enrollments in the site
+        """
+        return self.filter(site=site).aggregate(
+            total=Sum('completed_count'))['total'] or 0
+
+
+@python_2_unicode_compatible
+class CourseCompletionCount(TimeStampedModel):
+    """Number of learners who have completed a course
+
+    `LearnerCourseGradeMetrics.save` adds each newly completed enrollment and
+    the bulk progress pipeline recounts the course, so completion totals for a
+    course or site do not need to count LearnerCourseGradeMetrics records
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, db_index=True)
+    completed_count = models.IntegerField(default=0)
+
+    objects = CourseCompletionCountManager()
+
+    class Meta:
+        unique_together = ('site', 'course_id',)
+
+    def __str__(self):
+        return "{} {} {}".format(self.id, self.course_id, self.completed_count)
+
+
 @python_2_unicode_compatible
 class PipelineError(TimeStampedModel):
     """
@@ -648,9 +1022,115 @@ class CourseMauMetrics(BaseDateMetricsModel):
                                                          defaults=dict(
                                                             mau=data['mau']))
 
+    @classmethod
+    def bulk_save_metrics(cls, site, date_for, mau_by_course, overwrite=False):
+        """Save the MAU of many courses for the date at once
+
+        `mau_by_course` maps course id strings to MAU counts. New records are
+        created with one `bulk_create`. Existing records are only updated when
+        `overwrite` is True and the count has changed.
+
+        Returns the records for the courses, ordered by course id
+        """
+        course_ids = list(mau_by_course.keys())
+        existing = {obj.course_id: obj for obj in CourseMauMetrics.objects.filter(
+            site=site, date_for=date_for, course_id__in=course_ids)}
+        CourseMauMetrics.objects.bulk_create([
+            CourseMauMetrics(site=site,
+                             course_id=course_id,
+                             date_for=date_for,
+                             mau=mau)
+            for course_id, mau in mau_by_course.items()
+            if course_id not in existing])
+        if overwrite:
+            for course_id, obj in existing.items():
+                if obj.mau != mau_by_course[course_id]:
+                    CourseMauMetrics.objects.filter(id=obj.id).update(
+                        mau=mau_by_course[course_id])
+        return list(CourseMauMetrics.objects.filter(
+            site=site, date_for=date_for, course_id__in=course_ids).order_by('course_id'))
+
     def __str__(self):
         return '{}, {}, {}, {}, {}'.format(self.id,
                                            self.site.domain,
                                            self.course_id,
                                            self.date_for,
                                            self.mau)
+
+
+@python_2_unicode_compatible
+class ReportJob(TimeStampedModel):
+    """Tracks a report built in the background
+
+    The `generate_report` task writes the report file to the report storage
+    and records progress here, so the API can report status and give a
+    download link when the file is ready. See `figures.reports`
+    """
+    LEARNER_METRICS = 'learner-metrics'
+    ENROLLMENT_METRICS = 'enrollment-metrics'
+    COURSE_METRICS = 'course-metrics'
+
+    REPORT_TYPE_CHOICES = (
+        (LEARNER_METRICS, 'Learner metrics'),
+        (ENROLLMENT_METRICS, 'Enrollment metrics'),
+        (COURSE_METRICS, 'Course daily metrics'),
+    )
+
+    CSV_GZIP = 'csv.gz'
+    NDJSON_GZIP = 'ndjson.gz'
+
+    FILE_FORMAT_CHOICES = (
+        (CSV_GZIP, 'Compressed CSV'),
+        (NDJSON_GZIP, 'Compressed NDJSON'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    )
+
+    # TODO: Review the most appropriate on_delete behaviour
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                     blank=True,
+                                     null=True,
+                                     on_delete=models.SET_NULL)
+    report_type = models.CharField(max_length=255, choices=REPORT_TYPE_CHOICES)
+    file_format = models.CharField(max_length=255,
+                                   choices=FILE_FORMAT_CHOICES,
+                                   default=CSV_GZIP)
+    # Filter query parameters for the report queryset
+    params = JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=255,
+                              choices=STATUS_CHOICES,
+                              default=PENDING)
+    records_total = models.IntegerField(blank=True, null=True)
+    records_done = models.IntegerField(default=0)
+    file_name = models.CharField(max_length=255, blank=True)
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    @property
+    def progress(self):
+        """Returns the fraction of records written, between 0.0 and 1.0
+        """
+        if self.status == self.COMPLETE:
+            return 1.0
+        if not self.records_total:
+            return 0.0
+        return min(float(self.records_done) / self.records_total, 1.0)
+
+    def __str__(self):
+        return '{}, {}, {}, {}'.format(self.id,
+                                       self.site.domain,
+                                       self.report_type,
+                                       self.status)
@@ -3,16 +3,92 @@
 '''
 
 from __future__ import absolute_import
-from rest_framework.pagination import LimitOffsetPagination
+from collections import OrderedDict
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+
+
+COUNT_CACHE_KEY = 'figures.pagination.count.{query_hash}'
+
+# How long the approximate count for a cursor paginated query is reused
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+
+def count_cache_timeout():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'PAGINATION_COUNT_CACHE_TIMEOUT', COUNT_CACHE_TIMEOUT))
 
 
 class FiguresLimitOffsetPagination(LimitOffsetPagination):
     '''Custom Figures paginator to make the number of records returned consistent
+
+    A view that already knows the number of records, for example from a
+    counter the pipeline maintains, can set `known_count` to skip the count
+    query
     '''
     default_limit = 20
+    known_count = None
+
+    def get_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        return super(FiguresLimitOffsetPagination, self).get_count(queryset)
 
 
 class FiguresKiloPagination(LimitOffsetPagination):
     '''Custom Figures paginator to make the number of records returned consistent
     '''
     default_limit = 1000
+
+
+class FiguresCursorPagination(CursorPagination):
+    '''Keyset paginator for large result sets
+
+    Pages are retrieved by filtering on the position of the cursor in a stable,
+    indexed ordering (the primary key by default) instead of an offset. So each
+    page costs the same no matter how deep into the results it is
+
+    There is no count by default. Add the `count=true` query parameter to
+    include an approximate count. The count is calculated once and reused for
+    `PAGINATION_COUNT_CACHE_TIMEOUT` seconds for the same query
+    '''
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = self.get_approximate_count(queryset, request)
+        return super(FiguresCursorPagination, self).paginate_queryset(
+            queryset, request, view)
+
+    def get_approximate_count(self, queryset, request):
+        # The key is the request without the cursor, so all the pages of a
+        # query share the count
+        params = sorted((key, value) for key, value in request.query_params.lists()
+                        if key != self.cursor_query_param)
+        query = '{host}{path}?{params}'.format(host=request.get_host(),
+                                               path=request.path,
+                                               params=params)
+        key = COUNT_CACHE_KEY.format(
+            query_hash=hashlib.md5(query.encode('utf-8')).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, count_cache_timeout())
+        return count
+
+    def get_paginated_response(self, data):
+        items = [('next', self.get_next_link()),
+                 ('previous', self.get_previous_link()),
+                 ('results', data)]
+        if self.count is not None:
+            items.insert(0, ('count', self.count))
+        return Response(OrderedDict(items))
@@ -12,19 +12,34 @@ Future: add a remote mode to pull data via REST API
 # TODO: Move extractors to figures.pipeline.extract module
 """
 from __future__ import absolute_import
+from collections import defaultdict
 from decimal import Decimal
 import logging
 
 from dateutil.relativedelta import relativedelta
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, F, Max
 
 from student.roles import CourseCcxCoachRole, CourseInstructorRole, CourseStaffRole  # noqa pylint: disable=import-error
 
-from figures.compat import (CourseEnrollment,
+from figures.compat import (CourseAccessRole,
+                            CourseEnrollment,
                             CourseOverview,
                             GeneratedCertificate,
                             StudentModule)
-from figures.helpers import as_course_key, as_datetime, is_past_date, next_day
+from figures.helpers import (
+    as_course_key,
+    as_datetime,
+    day_window,
+    is_past_date,
+    next_day,
+    prev_day,
+    window_filter,
+)
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
+from figures.mau import day_has_closed
 import figures.metrics
 from figures.models import CourseDailyMetrics, PipelineError
 from figures.pipeline.logger import log_error
@@ -37,6 +52,13 @@ from figures.pipeline.helpers import pipeline_date_for_rule
 
 logger = logging.getLogger(__name__)
 
+# Course roles excluded from the enrollment counts
+ADMIN_ROLES = (
+    CourseStaffRole.ROLE,
+    CourseInstructorRole.ROLE,
+    CourseCcxCoachRole.ROLE,
+)
+
 
 # Extraction helper methods
 
@@ -48,38 +70,68 @@ def get_enrolled_in_exclude_admins(course_id, date_for=None):
 
     If no date is provided then the date is not used as a filter
 
+    The course staff, instructors and CCX coaches are excluded with a single
+    `NOT IN` subquery on CourseAccessRole instead of a subquery for each role
     """
     course_locator = as_course_key(course_id)
 
     if getattr(course_id, 'ccx', None):
         course_locator = course_id.to_course_locator()
 
-    staff = CourseStaffRole(course_locator).users_with_role()
-    admins = CourseInstructorRole(course_locator).users_with_role()
-    coaches = CourseCcxCoachRole(course_locator).users_with_role()
     filter_args = dict(course_id=course_locator, is_active=1)
 
     if date_for:
         filter_args.update(dict(created__lt=as_datetime(next_day(date_for))))
 
+    admin_user_ids = CourseAccessRole.objects.filter(
+        course_id=course_locator,
+        role__in=ADMIN_ROLES).values('user_id')
     return CourseEnrollment.objects.filter(**filter_args).exclude(
-        user__in=staff).exclude(user__in=admins).exclude(user__in=coaches)
+        user_id__in=admin_user_ids)
+
+
+def get_enrollment_counts_exclude_admins(site, date_for=None, course_ids=None):
+    """Returns a dict of the non-admin enrollment count for each of the site's courses
+
+    This is the batched version of `get_enrolled_in_exclude_admins`. It runs
+    one grouped count of the active enrollments and one grouped count of the
+    active enrollments held by course admins, then subtracts. The role join
+    matches on the enrollment's own course, so a learner who is staff in one
+    course is still counted in the others
+
+    Courses without enrollments are included with a count of zero
+    """
+    if course_ids is None:
+        course_ids = figures.sites.get_course_keys_for_site(site)
+    course_keys = [as_course_key(course_id) for course_id in course_ids]
+
+    enrollments = CourseEnrollment.objects.filter(course_id__in=course_keys,
+                                                  is_active=1)
+    if date_for:
+        enrollments = enrollments.filter(created__lt=as_datetime(next_day(date_for)))
+
+    counts = dict((str(key), 0) for key in course_keys)
+    for course_id, count in enrollments.order_by().values('course_id').annotate(
+            count=Count('id')).values_list('course_id', 'count'):
+        counts[str(course_id)] = count
+    # A learner can hold more than one admin role in a course
+    admin_enrollments = enrollments.filter(
+        user__courseaccessrole__course_id=F('course_id'),
+        user__courseaccessrole__role__in=ADMIN_ROLES)
+    for course_id, count in admin_enrollments.order_by().values('course_id').annotate(
+            count=Count('id', distinct=True)).values_list('course_id', 'count'):
+        counts[str(course_id)] -= count
+    return counts
 
 
 def get_active_learner_ids_today(course_id, date_for):
     """Get unique user ids for learners who are active today for the given
     course and date
 
-    Note: When Figures no longer has to support Django 1.8, we can simplify
-    this date check:
-        https://docs.djangoproject.com/en/1.9/ref/models/querysets/#date
     """
-    date_for_as_datetime = as_datetime(date_for)
     return StudentModule.objects.filter(
         course_id=as_course_key(course_id),
-        modified__year=date_for_as_datetime.year,
-        modified__month=date_for_as_datetime.month,
-        modified__day=date_for_as_datetime.day,
+        **window_filter('modified', day_window(date_for))
         ).values_list('student__id', flat=True).distinct()
 
 
@@ -125,57 +177,135 @@ def get_average_progress_deprecated(course_id, date_for, course_enrollments):
     return average_progress
 
 
-def get_days_to_complete(course_id, date_for):
+def get_days_to_complete(course_id, date_for, since=None):
     """Return a dict with a list of days to complete and errors
 
+    Reads the certificate and enrollment dates in two queries and matches them
+    by user. If `since` is given, only certificates created after the start of
+    that day are included. The pipeline uses this to add the new certificates
+    to the totals stored on the previous day's metrics
+
     NOTE: This is a work in progress, as it has issues to resolve:
     * It returns the delta in days, so working in ints
     * This means if a learner starts at midnight and finished just before
       midnight, then 0 days will be given
 
-    NOTE: This has limited scaling. We ought to test it with
-    1k, 10k, 100k cert records
-
-    TODO: change to use start_date, end_date with defaults that
-    start_date is open and end_date is today
-
     TODO: Consider collecting the total seconds rather than days
     This will improve accuracy, but may actually not be that important
     TODO: Analyze the error based on number of completions
-
-    When we have to support scale, we can look into optimization
-    techinques.
     """
+    course_key = as_course_key(course_id)
     certificates = GeneratedCertificate.objects.filter(
-        course_id=as_course_key(course_id),
+        course_id=course_key,
         created_date__lte=as_datetime(date_for))
+    if since:
+        certificates = certificates.filter(created_date__gt=as_datetime(since))
+    cert_dates = list(certificates.values_list('user_id', 'created_date'))
+
+    enrollments = CourseEnrollment.objects.filter(course_id=course_key)
+    if since:
+        # Only a few certificates are new each day, so only read their learners
+        enrollments = enrollments.filter(
+            user_id__in=set(user_id for user_id, _ in cert_dates))
+    enrollment_dates = defaultdict(list)
+    if cert_dates:
+        for user_id, created in enrollments.values_list('user_id', 'created'):
+            enrollment_dates[user_id].append(created)
 
     days = []
     errors = []
-    for cert in certificates:
-        ce = CourseEnrollment.objects.filter(
-            course_id=as_course_key(course_id),
-            user=cert.user)
+    for user_id, cert_created in cert_dates:
+        created = enrollment_dates.get(user_id)
         # How do we want to handle multiples?
-        if ce.count() > 1:
+        if created and len(created) > 1:
             errors.append(
                 dict(msg='Multiple CE records',
                      course_id=course_id,
-                     user_id=cert.user.id,
+                     user_id=user_id,
                      ))
-        try:
-            days.append((cert.created_date - ce[0].created).days)
-        except IndexError:
+        if created:
+            days.append((cert_created - created[0]).days)
+        else:
             # sometimes a course enrollment is deleted after the cert is generated.  why, who knows?
             # in which case just leave out that data
             errors.append(
                 dict(msg='No CourseEnrollment matching user course certificate',
                      course_id=course_id,
-                     user_id=cert.user.id,
+                     user_id=user_id,
                      ))
     return dict(days=days, errors=errors)
 
 
+def get_days_to_complete_totals(course_id, date_for, previous_cdm=None):
+    """Return a dict with the total days to complete and the certificate count
+
+    If the previous CourseDailyMetrics record has stored totals, only the
+    certificates created since its `date_for` are read and added to them.
+    Otherwise all of the course's certificates are read
+    """
+    if previous_cdm and previous_cdm.days_to_complete_count is not None:
+        total = previous_cdm.days_to_complete_total
+        count = previous_cdm.days_to_complete_count
+        since = previous_cdm.date_for
+    else:
+        total, count, since = 0, 0, None
+    days = get_days_to_complete(course_id, date_for, since=since)['days']
+    return dict(total=total + sum(days), count=count + len(days))
+
+
+def get_days_to_complete_totals_for_courses(course_ids, date_for, previous_cdms=None):
+    """Return a dict of the days to complete totals for each course id string
+
+    This is the batched version of `get_days_to_complete_totals`.
+    `previous_cdms` maps course id strings to each course's previous
+    CourseDailyMetrics record. Courses are grouped by the date of their stored
+    totals, and each group reads its certificates and enrollments in two
+    queries. Certificates without an enrollment are left out, as in
+    `get_days_to_complete`
+    """
+    previous_cdms = previous_cdms or {}
+    totals = {}
+    course_ids_by_since = defaultdict(list)
+    for course_id in course_ids:
+        course_id = str(course_id)
+        previous_cdm = previous_cdms.get(course_id)
+        if previous_cdm and previous_cdm.days_to_complete_count is not None:
+            totals[course_id] = dict(total=previous_cdm.days_to_complete_total,
+                                     count=previous_cdm.days_to_complete_count)
+            course_ids_by_since[previous_cdm.date_for].append(course_id)
+        else:
+            totals[course_id] = dict(total=0, count=0)
+            course_ids_by_since[None].append(course_id)
+
+    for since, since_course_ids in course_ids_by_since.items():
+        certificates = GeneratedCertificate.objects.filter(
+            course_id__in=[as_course_key(course_id) for course_id in since_course_ids],
+            created_date__lte=as_datetime(date_for))
+        if since:
+            certificates = certificates.filter(created_date__gt=as_datetime(since))
+        cert_dates = list(certificates.values_list('course_id', 'user_id', 'created_date'))
+        if not cert_dates:
+            continue
+
+        enrollments = CourseEnrollment.objects.filter(
+            course_id__in=set(course_id for course_id, _, _ in cert_dates))
+        if since:
+            enrollments = enrollments.filter(
+                user_id__in=set(user_id for _, user_id, _ in cert_dates))
+        enrollment_dates = {}
+        for course_id, user_id, created in enrollments.values_list(
+                'course_id', 'user_id', 'created'):
+            enrollment_dates.setdefault((str(course_id), user_id), created)
+
+        for course_id, user_id, cert_created in cert_dates:
+            created = enrollment_dates.get((str(course_id), user_id))
+            if created:
+                course_totals = totals[str(course_id)]
+                course_totals['total'] += (cert_created - created).days
+                course_totals['count'] += 1
+    return totals
+
+
 def calc_average_days_to_complete(days):
     rec_count = len(days)
     if rec_count:
@@ -184,14 +314,67 @@ def calc_average_days_to_complete(days):
         return 0.0
 
 
-def get_average_days_to_complete(course_id, date_for):
+def get_average_days_to_complete(course_id, date_for, previous_cdm=None):
+    """Returns the average days to complete from the days to complete totals
+
+    See `get_days_to_complete_totals`
+    """
+    return average_days_to_complete_from_totals(
+        get_days_to_complete_totals(course_id, date_for, previous_cdm))
 
-    days_to_complete = get_days_to_complete(course_id, date_for)
-    # TODO: Track any errors in getting days to complete
-    # This is in days_to_complete['errors']
-    average_days_to_complete = calc_average_days_to_complete(
-        days_to_complete['days'])
-    return average_days_to_complete
+
+def average_days_to_complete_from_totals(totals):
+    if totals['count']:
+        return float(totals['total']) / totals['count']
+    else:
+        return 0.0
+
+
+def reset_later_days_to_complete_totals(course_ids, date_for):
+    """Clears the days to complete totals of the records after `date_for`
+
+    Each record's totals start from the previous record's, so rewriting a
+    record, for example with `force_update`, can leave the later records with
+    totals that no longer add up. Without totals, the next record reads all of
+    the course's certificates, so the totals are correct again from there on
+    """
+    CourseDailyMetrics.objects.filter(
+        course_id__in=[str(course_id) for course_id in course_ids],
+        date_for__gt=date_for).update(days_to_complete_total=None,
+                                      days_to_complete_count=None)
+
+
+def get_average_progress(course_id, date_for):
+    """Returns the course's average progress for the pipeline, or None
+
+    Progress data cannot be reliable for backfills or for any date prior to yesterday
+    without using StudentModuleHistory so we skip getting this data if running
+    for a day earlier than previous day (i.e., not during daily update of CDMs),
+    especially since it is so expensive to calculate.
+    Note that Avg() applied across null and decimal vals for aggregate average_progress
+    will correctly ignore nulls
+    TODO: Reconsider this if we implement either StudentModuleHistory-based queries
+    (if so, you will need to add any types you want to
+    StudentModuleHistory.HISTORY_SAVING_TYPES)
+    TODO: Reconsider this once we switch to using Persistent Grades
+    """
+    if is_past_date(date_for + relativedelta(days=1)):  # more than 1 day in past
+        msg = ('FIGURES:PIPELINE:CDM Declining to calculate average progress for a past date'
+               ' date_for={date_for}, course_id="{course_id}"')
+        logger.debug(msg.format(date_for=date_for, course_id=course_id))
+        return None
+    try:
+        progress_data = bulk_calculate_course_progress_data(course_id=course_id,
+                                                            date_for=date_for)
+        return progress_data['average_progress']
+    except Exception:  # pylint: disable=broad-except
+        # Broad exception for starters. Refine as we see what gets caught
+        # Make sure we set the average_progres to None so that upstream
+        # does not think things are normal
+        msg = ('FIGURES:FAIL bulk_calculate_course_progress_data'
+               ' date_for={date_for}, course_id="{course_id}"')
+        logger.exception(msg.format(date_for=date_for, course_id=course_id))
+        return None
 
 
 def get_num_learners_completed(course_id, date_for):
@@ -264,46 +447,25 @@ class CourseDailyMetricsExtractor(object):
 
         data['enrollment_count'] = course_enrollments.count()
 
-        active_learner_ids_today = get_active_learner_ids_today(
-            course_id, date_for,)
-        if active_learner_ids_today:
-            active_learners_today = active_learner_ids_today.count()
-        else:
-            active_learners_today = 0
-        data['active_learners_today'] = active_learners_today
-
-        # Average progress
-        # Progress data cannot be reliable for backfills or for any date prior to yesterday
-        # without using StudentModuleHistory so we skip getting this data if running
-        # for a day earlier than previous day (i.e., not during daily update of CDMs),
-        #  especially since it is so expensive to calculate.
-        # Note that Avg() applied across null and decimal vals for aggregate average_progress
-        # will correctly ignore nulls
-        # TODO: Reconsider this if we implement either StudentModuleHistory-based queries
-        # (if so, you will need to add any types you want to
-        # StudentModuleHistory.HISTORY_SAVING_TYPES)
-        # TODO: Reconsider this once we switch to using Persistent Grades
-        if is_past_date(date_for + relativedelta(days=1)):  # more than 1 day in past
-            data['average_progress'] = None
-            msg = ('FIGURES:PIPELINE:CDM Declining to calculate average progress for a past date'
-                   ' date_for={date_for}, course_id="{course_id}"')
-            logger.debug(msg.format(date_for=date_for, course_id=course_id))
-        else:
-            try:
-                progress_data = bulk_calculate_course_progress_data(course_id=course_id,
-                                                                    date_for=date_for)
-                data['average_progress'] = progress_data['average_progress']
-            except Exception:  # pylint: disable=broad-except
-                # Broad exception for starters. Refine as we see what gets caught
-                # Make sure we set the average_progres to None so that upstream
-                # does not think things are normal
-                data['average_progress'] = None
-                msg = ('FIGURES:FAIL bulk_calculate_course_progress_data'
-                       ' date_for={date_for}, course_id="{course_id}"')
-                logger.exception(msg.format(date_for=date_for, course_id=course_id))
-
-        data['average_days_to_complete'] = get_average_days_to_complete(
-            course_id, date_for,)
+        # Evaluate the ids once for both the count and the sketch
+        active_learner_ids_today = list(get_active_learner_ids_today(
+            course_id, date_for,))
+        data['active_learners_today'] = len(active_learner_ids_today)
+        # Learners can still become active on a day that has not closed, so
+        # its active learners are stored on the next run. See
+        # `close_active_learners_for_day`
+        if day_has_closed(date_for):
+            data.update(active_learners_data(active_learner_ids_today))
+
+        data['average_progress'] = get_average_progress(course_id, date_for)
+
+        previous_cdm = CourseDailyMetrics.objects.filter(
+            course_id=str(course_id),
+            date_for__lt=date_for).order_by('-date_for').first()
+        totals = get_days_to_complete_totals(course_id, date_for, previous_cdm)
+        data['days_to_complete_total'] = totals['total']
+        data['days_to_complete_count'] = totals['count']
+        data['average_days_to_complete'] = average_days_to_complete_from_totals(totals)
 
         data['num_learners_completed'] = get_num_learners_completed(
             course_id, date_for,)
@@ -311,6 +473,67 @@ class CourseDailyMetricsExtractor(object):
         return data
 
 
+def active_learners_data(user_ids):
+    """Returns the sketch and bitmap field values for the active learner ids
+    """
+    return dict(active_learners_sketch=HyperLogLog.from_values(user_ids).to_string(),
+                active_learners_bitmap=UserBitmap.from_ids(user_ids).to_string())
+
+
+def get_active_learner_ids_for_courses(course_ids, date_for):
+    """Returns a dict of the ids of the learners active on `date_for` for
+    each course id string, with one grouped query
+    """
+    active_learner_ids = defaultdict(list)
+    active_learners = StudentModule.objects.filter(
+        course_id__in=[as_course_key(course_id) for course_id in course_ids],
+        **window_filter('modified', day_window(date_for))
+        ).order_by().values_list('course_id', 'student_id').distinct()
+    for course_id, user_id in active_learners:
+        active_learner_ids[str(course_id)].append(user_id)
+    return active_learner_ids
+
+
+def close_active_learners_for_day(course_ids, date_for):
+    """Stores the active learners of the days that were still open when their
+    CourseDailyMetrics records were written
+
+    The records keep the rest of their values. Returns the number of records
+    updated
+    """
+    if not day_has_closed(date_for):
+        return 0
+    open_course_ids = list(CourseDailyMetrics.objects.filter(
+        course_id__in=[str(course_id) for course_id in course_ids],
+        date_for=date_for,
+        active_learners_bitmap__isnull=True).values_list('course_id', flat=True))
+    if not open_course_ids:
+        return 0
+    active_learner_ids = get_active_learner_ids_for_courses(open_course_ids, date_for)
+    for course_id in open_course_ids:
+        CourseDailyMetrics.objects.filter(course_id=course_id, date_for=date_for).update(
+            **active_learners_data(active_learner_ids[course_id]))
+    return len(open_course_ids)
+
+
+def cdm_field_values(data):
+    """Returns the CourseDailyMetrics field values for the extracted data
+    """
+    values = dict(
+        enrollment_count=data['enrollment_count'],
+        active_learners_today=data['active_learners_today'],
+        average_days_to_complete=int(round(data['average_days_to_complete'])),
+        num_learners_completed=data['num_learners_completed'],
+        active_learners_sketch=data.get('active_learners_sketch'),
+        active_learners_bitmap=data.get('active_learners_bitmap'),
+        days_to_complete_total=data.get('days_to_complete_total'),
+        days_to_complete_count=data.get('days_to_complete_count'),
+    )
+    if data['average_progress'] is not None:
+        values['average_progress'] = str(data['average_progress'])
+    return values
+
+
 class CourseDailyMetricsLoader(object):
 
     def __init__(self, course_id):
@@ -332,15 +555,7 @@ class CourseDailyMetricsLoader(object):
         Raises django.core.exceptions.ValidationError if the record fails
         validation
         """
-        defaults = dict(
-            enrollment_count=data['enrollment_count'],
-            active_learners_today=data['active_learners_today'],
-            average_days_to_complete=int(round(data['average_days_to_complete'])),
-            num_learners_completed=data['num_learners_completed'],
-        )
-        if data['average_progress'] is not None:
-            defaults['average_progress'] = str(data['average_progress'])
-
+        defaults = cdm_field_values(data)
         cdm, created = CourseDailyMetrics.objects.update_or_create(
             course_id=str(self.course_id),
             site=self.site,
@@ -348,6 +563,7 @@ class CourseDailyMetricsLoader(object):
             defaults=defaults
         )
         cdm.clean_fields()
+        reset_later_days_to_complete_totals([self.course_id], date_for)
         return (cdm, created,)
 
     def load(self, date_for=None, force_update=False, **_kwargs):
@@ -366,6 +582,7 @@ class CourseDailyMetricsLoader(object):
         course daily metrics model instance
         """
         date_for = pipeline_date_for_rule(date_for)
+        close_active_learners_for_day([self.course_id], prev_day(date_for))
         try:
             cdm = CourseDailyMetrics.objects.get(course_id=str(self.course_id),
                                                  date_for=date_for)
@@ -378,3 +595,134 @@ class CourseDailyMetricsLoader(object):
 
         data = self.get_data(date_for=date_for)
         return self.save_metrics(date_for=date_for, data=data)
+
+
+class SiteCourseDailyMetricsExtractor(object):
+    """Extracts the CourseDailyMetrics data for all of a site's courses
+
+    The enrollment counts, active learners, certificate counts and days to
+    complete are collected for every course with grouped queries instead of
+    running the `CourseDailyMetricsExtractor` queries for each course. Average
+    progress is still calculated for each course
+    """
+
+    def extract(self, site, date_for, course_ids=None):
+        """Returns a dict of the CourseDailyMetrics data for each course id string
+        """
+        if course_ids is None:
+            course_ids = figures.sites.site_course_ids(site)
+        course_ids = [str(course_id) for course_id in course_ids]
+        course_keys = [as_course_key(course_id) for course_id in course_ids]
+
+        enrollment_counts = get_enrollment_counts_exclude_admins(
+            site=site, date_for=date_for, course_ids=course_ids)
+
+        active_learner_ids = get_active_learner_ids_for_courses(course_ids, date_for)
+        day_closed = day_has_closed(date_for)
+
+        certificates = GeneratedCertificate.objects.filter(
+            course_id__in=course_keys,
+            created_date__lt=as_datetime(next_day(date_for)))
+        certificate_counts = dict(
+            (str(course_id), count) for course_id, count in certificates.order_by().values(
+                'course_id').annotate(count=Count('id')).values_list('course_id', 'count'))
+
+        days_to_complete_totals = get_days_to_complete_totals_for_courses(
+            course_ids=course_ids,
+            date_for=date_for,
+            previous_cdms=self.previous_cdms(course_ids, date_for))
+
+        data_by_course = {}
+        for course_id in course_ids:
+            learner_ids = active_learner_ids[course_id]
+            totals = days_to_complete_totals[course_id]
+            data_by_course[course_id] = dict(
+                date_for=date_for,
+                course_id=course_id,
+                enrollment_count=enrollment_counts[course_id],
+                active_learners_today=len(learner_ids),
+                average_progress=get_average_progress(course_id, date_for),
+                days_to_complete_total=totals['total'],
+                days_to_complete_count=totals['count'],
+                average_days_to_complete=average_days_to_complete_from_totals(totals),
+                num_learners_completed=certificate_counts.get(course_id, 0),
+            )
+            if day_closed:
+                data_by_course[course_id].update(active_learners_data(learner_ids))
+        return data_by_course
+
+    def previous_cdms(self, course_ids, date_for):
+        """Returns a dict of the latest record before `date_for` for each course
+        """
+        previous = CourseDailyMetrics.objects.filter(
+            course_id__in=course_ids,
+            date_for__lt=date_for).order_by()
+        latest_dates = dict(previous.values('course_id').annotate(
+            latest=Max('date_for')).values_list('course_id', 'latest'))
+        candidates = previous.filter(date_for__in=set(latest_dates.values())).only(
+            'course_id', 'date_for', 'days_to_complete_total', 'days_to_complete_count')
+        return dict((cdm.course_id, cdm) for cdm in candidates
+                    if cdm.date_for == latest_dates.get(cdm.course_id))
+
+
+class SiteCourseDailyMetricsLoader(object):
+    """Loads the CourseDailyMetrics records for all of a site's courses
+
+    The records for the day are written in one transaction with a single bulk
+    insert. Existing records are kept unless `force_update` is True, in which
+    case they are replaced
+    """
+
+    def __init__(self, site):
+        self.site = site
+        self.extractor = SiteCourseDailyMetricsExtractor()
+
+    def load(self, date_for=None, force_update=False, course_ids=None):
+        """Returns the list of CourseDailyMetrics records written
+
+        Courses whose data fails validation are logged and skipped so they do
+        not stop the rest of the site's courses from loading
+        """
+        date_for = pipeline_date_for_rule(date_for)
+        if course_ids is None:
+            course_ids = figures.sites.site_course_ids(self.site)
+        course_ids = [str(course_id) for course_id in course_ids]
+        close_active_learners_for_day(course_ids, prev_day(date_for))
+        if not force_update:
+            existing = set(CourseDailyMetrics.objects.filter(
+                course_id__in=course_ids,
+                date_for=date_for).values_list('course_id', flat=True))
+            course_ids = [course_id for course_id in course_ids if course_id not in existing]
+        if not course_ids:
+            return []
+
+        data_by_course = self.extractor.extract(site=self.site,
+                                                date_for=date_for,
+                                                course_ids=course_ids)
+        records = []
+        for course_id in course_ids:
+            cdm = CourseDailyMetrics(site=self.site,
+                                     course_id=course_id,
+                                     date_for=date_for,
+                                     **cdm_field_values(data_by_course[course_id]))
+            try:
+                cdm.clean_fields()
+            except ValidationError as e:
+                log_error(dict(msg='Invalid CourseDailyMetrics data',
+                               course_id=course_id,
+                               date_for=date_for,
+                               errors=e.message_dict),
+                          error_type=PipelineError.COURSE_DATA,
+                          course_id=course_id,
+                          site=self.site)
+                continue
+            records.append(cdm)
+
+        with transaction.atomic():
+            CourseDailyMetrics.objects.filter(
+                course_id__in=[cdm.course_id for cdm in records],
+                date_for=date_for).delete()
+            CourseDailyMetrics.objects.bulk_create(records)
+            reset_later_days_to_complete_totals([cdm.course_id for cdm in records],
+                                                date_for)
+        return records
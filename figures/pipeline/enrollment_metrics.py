@@ -14,7 +14,7 @@ field
 
 ```
 
-for each learner+course  # See bulk_calculate_course_progress_data
+for each learner+course  # See _bulk_collect_metrics_for_course
     get newest lgcm record
     get newest sm record
 
@@ -51,12 +51,17 @@ from datetime import datetime
 from decimal import Decimal
 import logging
 
+from django.db import transaction
+from django.db.models import Max
 from django.utils.timezone import utc
 
+from figures.helpers import is_multisite
 from figures.metrics import LearnerCourseGrades
-from figures.models import LearnerCourseGradeMetrics
+from figures.models import CourseCompletionCount, LearnerCourseGradeMetrics
+from figures.progress import bulk_progress_data
 from figures.sites import (get_site_for_course,
                            course_enrollments_for_course,
+                           get_student_modules_for_course_in_site,
                            student_modules_for_course_enrollment,
                            UnlinkedCourseError)
 
@@ -67,17 +72,22 @@ def bulk_calculate_course_progress_data(course_id, date_for=None):
     """Calculates the average progress for a set of course enrollments
 
     How it works
-    1. collects progress percent for each course enrollment
+    1. collects progress percent for each course enrollment with activity
         1.1. If an up to date enrollment metrics record already exists, use that
+        1.2. Otherwise collect new progress data and save a new record
     2. calculate and return the average of these enrollments
 
+    The number of queries is constant for the course instead of growing with
+    the number of enrollments. See `_bulk_collect_metrics_for_course`. Only
+    the progress collection for learners that need an update is done per
+    learner
+
     TODO: Update to filter on active users
 
     Questions:
     - What makes a learner an active learner?
 
     """
-    progress_percentages = []
     if not date_for:
         date_for = datetime.utcnow().replace(tzinfo=utc).date()
 
@@ -85,27 +95,95 @@ def bulk_calculate_course_progress_data(course_id, date_for=None):
     if not site:
         raise UnlinkedCourseError('No site found for course "{}"'.format(course_id))
 
-    # We might be able to make this more efficient by finding only the learners
-    # in the course with StudentModule (SM) records then get their course
-    # enrollment (CE) records as we can ignore any learners without SM records
-    # since that means they don't have any course progress
-    for ce in course_enrollments_for_course(course_id):
-        sm = student_modules_for_course_enrollment(
-            site=site,
-            course_enrollment=ce).order_by('-modified')
-        if sm:
-            metrics = collect_metrics_for_enrollment(site=site,
-                                                     course_enrollment=ce,
-                                                     date_for=date_for,
-                                                     student_modules=sm)
-            if metrics:
-                progress_percentages.append(metrics.progress_percent)
-
+    metrics = _bulk_collect_metrics_for_course(site=site,
+                                               course_id=course_id,
+                                               date_for=date_for)
+    CourseCompletionCount.objects.update_count(site=site, course_id=course_id)
+    progress_percentages = [rec.progress_percent for rec in metrics]
     return dict(
         average_progress=calculate_average_progress(progress_percentages),
     )
 
 
+def _bulk_collect_metrics_for_course(site, course_id, date_for):
+    """Collect metrics for every enrollment in the course with activity
+
+    This is the set based equivalent of calling `collect_metrics_for_enrollment`
+    for each enrollment in the course. Instead of querying per enrollment, we:
+
+    1. Get the most recent StudentModule `modified` per enrolled learner
+    2. Get the most recent LearnerCourseGradeMetrics (LCGM) record per learner
+    3. Apply `_enrollment_metrics_needs_update` rules to find the learners that
+       need new progress data
+    4. Collect progress data for those learners and save new LCGM records in
+       bulk. Progress comes from the course structure cache and persisted
+       grades when available. See `figures.progress.bulk_progress_data`
+
+    Returns a list of the up to date LCGM records, one per learner with
+    StudentModule records in the course
+    """
+    enrolled_user_ids = course_enrollments_for_course(course_id).values('user_id')
+    sm_qs = get_student_modules_for_course_in_site(site, course_id).filter(
+        student_id__in=enrolled_user_ids)
+    if is_multisite():
+        sm_qs = sm_qs.filter(student__organizations__sites__in=[site])
+    sm_latest = dict(sm_qs.order_by().values('student_id').annotate(
+        latest=Max('modified')).values_list('student_id', 'latest'))
+    if not sm_latest:
+        return []
+
+    lcgm_latest = LearnerCourseGradeMetrics.objects.latest_lcgm_for_course(
+        course_id=course_id, user_ids=enrolled_user_ids)
+
+    metrics = []
+    stale_user_ids = []
+    for user_id, sm_modified in sm_latest.items():
+        lcgm = lcgm_latest.get(user_id)
+        if lcgm and lcgm.date_for >= sm_modified.date():
+            metrics.append(lcgm)
+        else:
+            stale_user_ids.append(user_id)
+
+    # Use the course structure cache if we can, else collect per learner
+    bulk_progress = bulk_progress_data(course_id=course_id, user_ids=stale_user_ids)
+    new_records = []
+    for user_id in stale_user_ids:
+        lcgm = lcgm_latest.get(user_id)
+        if bulk_progress:
+            progress_data = bulk_progress[user_id]
+        else:
+            progress_data = _collect_progress_data_for_learner(user_id=user_id,
+                                                               course_id=course_id)
+        if lcgm and lcgm.date_for == date_for:
+            # The pipeline was interrupted and rerun for the same date. We
+            # update the existing record instead of violating the
+            # user, course_id, date_for uniqueness constraint
+            _update_enrollment_metrics_record(lcgm, progress_data)
+            metrics.append(lcgm)
+        else:
+            new_records.append(_build_enrollment_metrics_record(
+                site=site,
+                user_id=user_id,
+                course_id=course_id,
+                progress_data=progress_data,
+                date_for=date_for))
+    if new_records:
+        # bulk_create does not call `save`, so we move the `is_latest` flags
+        # and set the completion fields
+        replaced_ids = []
+        for record in new_records:
+            lcgm = lcgm_latest.get(record.user_id)
+            record.is_latest = lcgm is None or lcgm.date_for < record.date_for
+            record.set_completion(previous=lcgm if record.is_latest else None)
+            if lcgm and record.is_latest:
+                replaced_ids.append(lcgm.id)
+        with transaction.atomic():
+            LearnerCourseGradeMetrics.objects.filter(id__in=replaced_ids).update(
+                is_latest=False)
+            LearnerCourseGradeMetrics.objects.bulk_create(new_records)
+    return metrics + new_records
+
+
 def calculate_average_progress(progress_percentages):
     """Calcuates average progress from a list of values
 
@@ -199,6 +277,38 @@ def collect_metrics_for_enrollment(site, course_enrollment, date_for, student_mo
     return metrics
 
 
+def capture_enrollment_metrics(site, course_enrollment, date_for):
+    """Collect and save current progress for the enrollment for `date_for`
+
+    Used for live capture when the platform signals an enrollment or grade
+    change. Unlike `collect_metrics_for_enrollment`, we don't check if the
+    learner has StudentModule records newer than the latest LCGM record. We
+    know progress may have changed, so we always collect it and save it as the
+    LCGM record for `date_for`, updating the record if it already exists
+
+    Returns the LCGM record
+    """
+    course_id = str(course_enrollment.course_id)
+    user_id = course_enrollment.user_id
+    bulk_progress = bulk_progress_data(course_id=course_id, user_ids=[user_id])
+    if bulk_progress:
+        progress_data = bulk_progress[user_id]
+    else:
+        progress_data = _collect_progress_data_for_learner(user_id=user_id,
+                                                           course_id=course_id)
+    lcgm, _created = LearnerCourseGradeMetrics.objects.update_or_create(
+        user_id=user_id,
+        course_id=course_id,
+        date_for=date_for,
+        defaults=dict(
+            site=site,
+            points_possible=progress_data['points_possible'],
+            points_earned=progress_data['points_earned'],
+            sections_worked=progress_data['sections_worked'],
+            sections_possible=progress_data['count']))
+    return lcgm
+
+
 def _enrollment_metrics_needs_update(most_recent_lcgm, most_recent_sm):
     """Returns True if we need to update our learner progress, False otherwise
 
@@ -264,6 +374,34 @@ def _enrollment_metrics_needs_update(most_recent_lcgm, most_recent_sm):
     return needs_update
 
 
+def _build_enrollment_metrics_record(site, user_id, course_id, progress_data, date_for):
+    """Convenience function to build an unsaved progress metrics record
+
+    Used for bulk saving. See `_bulk_collect_metrics_for_course`
+    """
+    return LearnerCourseGradeMetrics(
+        site=site,
+        user_id=user_id,
+        course_id=str(course_id),
+        date_for=date_for,
+        points_possible=progress_data['points_possible'],
+        points_earned=progress_data['points_earned'],
+        sections_worked=progress_data['sections_worked'],
+        sections_possible=progress_data['count']
+        )
+
+
+def _update_enrollment_metrics_record(lcgm, progress_data):
+    """Convenience function to update an existing progress metrics record
+    """
+    lcgm.points_possible = progress_data['points_possible']
+    lcgm.points_earned = progress_data['points_earned']
+    lcgm.sections_worked = progress_data['sections_worked']
+    lcgm.sections_possible = progress_data['count']
+    lcgm.save()
+    return lcgm
+
+
 def _new_enrollment_metrics_record(site, course_enrollment, progress_data, date_for):
     """Convenience function to save progress metrics to Figures
     """
@@ -285,7 +423,15 @@ def _collect_progress_data(student_module):
     Uses `figures.metrics.LearnerCourseGrades` to retrieve progress data via
     `CourseGradeFactory().read(...)` and calculate progress percentage
     """
-    lcg = LearnerCourseGrades(user_id=student_module.student_id,
-                              course_id=student_module.course_id)
+    return _collect_progress_data_for_learner(user_id=student_module.student_id,
+                                              course_id=student_module.course_id)
+
+
+def _collect_progress_data_for_learner(user_id, course_id):
+    """Get new progress data for the learner/course identified by ids
+
+    Lets the bulk pipeline collect progress without a StudentModule instance
+    """
+    lcg = LearnerCourseGrades(user_id=user_id, course_id=course_id)
     course_progress_details = lcg.progress()
     return course_progress_details
@@ -12,10 +12,14 @@ See figures.tasks for the Celery tasks that run MAU jobs
 """
 
 from __future__ import absolute_import
+from figures.compat import StudentModule
 from figures.helpers import as_course_key
-from figures.mau import get_mau_from_student_modules
+from figures.mau import get_course_mau_counts, get_mau_from_student_modules
 from figures.models import CourseMauMetrics
-from figures.sites import get_student_modules_for_course_in_site
+from figures.sites import (
+    get_course_keys_for_site,
+    get_student_modules_for_course_in_site,
+)
 
 
 def get_all_mau_for_site_course(site, courselike, month_for):
@@ -88,3 +92,26 @@ def collect_course_mau(site, courselike, month_for, **kwargs):
                                    overwrite=overwrite)
 
     return obj, created
+
+
+def collect_site_course_mau(site, month_for, **kwargs):
+    """
+    Extracts, transforms, loads MAU data for all of the site's courses at once
+
+    Runs one grouped StudentModule query for the site's courses and saves the
+    course MAU records in bulk. Courses without activity get a MAU of zero.
+
+    Returns the list of `CourseMauMetrics` records
+    """
+    overwrite = kwargs.get('overwrite', False)
+    course_keys = get_course_keys_for_site(site)
+    mau_by_course = get_course_mau_counts(
+        student_modules=StudentModule.objects.filter(course_id__in=course_keys),
+        year=month_for.year,
+        month=month_for.month)
+    return CourseMauMetrics.bulk_save_metrics(
+        site=site,
+        date_for=month_for,
+        mau_by_course={str(course_key): mau_by_course.get(str(course_key), 0)
+                       for course_key in course_keys},
+        overwrite=overwrite)
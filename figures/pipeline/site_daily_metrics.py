@@ -10,8 +10,17 @@ from __future__ import absolute_import
 
 from django.db.models import Sum
 
-from figures.helpers import as_course_key, as_datetime, next_day
-from figures.mau import site_mau_1g_for_month_as_of_day
+from figures.helpers import (
+    as_course_key,
+    as_datetime,
+    day_window,
+    next_day,
+    prev_day,
+    window_filter,
+)
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
+from figures.mau import day_has_closed, site_mau_count_for_month_as_of_day
 from figures.models import CourseDailyMetrics, SiteDailyMetrics
 from figures.sites import (
     get_courses_for_site,
@@ -63,13 +72,8 @@ def get_site_active_users_for_date(site, date_for):
     user ids
     '''
     student_modules = get_student_modules_for_site(site)
-
-    # For Ginkgo backward compatibility, Django 1.8 does not support
-    # `modified__date=<some_value>` in filters. Therefore, we need to match
-    # each date field
-    return student_modules.filter(modified__year=date_for.year,
-                                  modified__month=date_for.month,
-                                  modified__day=date_for.day).values_list(
+    return student_modules.filter(
+        **window_filter('modified', day_window(date_for))).values_list(
         'student__id', flat=True).distinct()
 
 
@@ -102,6 +106,29 @@ def get_total_enrollment_count(site, date_for, course_ids=None):  # pylint: disa
     return enrollment_count
 
 
+def active_users_data(user_ids):
+    """Returns the sketch and bitmap field values for the active user ids
+    """
+    return dict(active_users_sketch=HyperLogLog.from_values(user_ids).to_string(),
+                active_users_bitmap=UserBitmap.from_ids(user_ids).to_string())
+
+
+def close_active_users_for_day(site, date_for):
+    """Stores the active users of a day that was still open when its record was written
+
+    The SiteDailyMetrics record for the day keeps the rest of its values.
+    Returns True if the record was updated
+    """
+    open_records = SiteDailyMetrics.objects.filter(site=site,
+                                                   date_for=date_for,
+                                                   active_users_bitmap__isnull=True)
+    if not day_has_closed(date_for) or not open_records.exists():
+        return False
+    user_ids = list(get_site_active_users_for_date(site, date_for))
+    open_records.update(**active_users_data(user_ids))
+    return True
+
+
 class SiteDailyMetricsExtractor(object):
     '''
     Currently a bag of "function". We can change this to a function if we
@@ -127,9 +154,8 @@ class SiteDailyMetricsExtractor(object):
         course_count = site_courses.filter(
             created__lt=as_datetime(next_day(date_for))).count()
 
-        todays_active_users = get_site_active_users_for_date(site, date_for)
-        todays_active_user_count = todays_active_users.count()
-        mau = site_mau_1g_for_month_as_of_day(site, date_for)
+        todays_active_users = list(get_site_active_users_for_date(site, date_for))
+        todays_active_user_count = len(todays_active_users)
 
         data['todays_active_user_count'] = todays_active_user_count
         data['cumulative_active_user_count'] = get_previous_cumulative_active_user_count(
@@ -137,7 +163,12 @@ class SiteDailyMetricsExtractor(object):
         data['total_user_count'] = user_count
         data['course_count'] = course_count
         data['total_enrollment_count'] = get_total_enrollment_count(site, date_for)
-        data['mau'] = mau.count()
+        data['mau'] = site_mau_count_for_month_as_of_day(
+            site, date_for, todays_user_ids=todays_active_users)
+        # Users can still become active on a day that has not closed, so its
+        # active users are stored on the next run. See `close_active_users_for_day`
+        if day_has_closed(date_for):
+            data.update(active_users_data(todays_active_users))
         return data
 
 
@@ -159,6 +190,8 @@ class SiteDailyMetricsLoader(object):
         * Course acess groups
         """
         date_for = pipeline_date_for_rule(date_for)
+        # The month to date MAU reads the previous day's active users
+        close_active_users_for_day(site=site, date_for=prev_day(date_for))
 
         # if we already have a record for the date_for and force_update is False
         # then skip getting data
@@ -182,6 +215,8 @@ class SiteDailyMetricsLoader(object):
                 course_count=data['course_count'],
                 total_enrollment_count=data['total_enrollment_count'],
                 mau=data['mau'],
+                active_users_sketch=data.get('active_users_sketch'),
+                active_users_bitmap=data.get('active_users_bitmap'),
             )
         )
         return site_metrics, created
@@ -3,62 +3,151 @@
 """
 
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime
 from django.db import connection
-from django.db.models import IntegerField
 from django.utils.timezone import utc
 from dateutil.relativedelta import relativedelta
 
-from figures.compat import RELEASE_LINE
+from figures.compat import RELEASE_LINE, StudentModule
+from figures.helpers import (
+    as_date,
+    as_datetime,
+    days_in_month,
+    month_window,
+    window_filter,
+)
+from figures.metrics import (
+    get_total_course_completions_for_time_period,
+    get_total_enrollments_for_time_period,
+    get_total_site_courses_for_time_period,
+    get_total_site_users_for_time_period,
+    get_total_site_users_joined_for_time_period,
+)
 from figures.models import SiteMonthlyMetrics
-from figures.sites import get_student_modules_for_site
+from figures.sites import get_course_keys_for_site, get_student_modules_for_site
 
 
-def _get_fill_month_raw_sql_for_month(site_ids, month_for):
-    """Return a string for the raw SQL statement to get distinct student_id counts.
+# The site monthly rollup fields and the functions that calculate them. These
+# are the functions the site monthly metrics endpoints called for each request
+# before we had the rollup
+ROLLUP_METRICS = (
+    ('registered_users', get_total_site_users_for_time_period),
+    ('new_users', get_total_site_users_joined_for_time_period),
+    ('site_courses', get_total_site_courses_for_time_period),
+    ('course_enrollments', get_total_enrollments_for_time_period),
+    ('course_completions', get_total_course_completions_for_time_period),
+)
+
+
+def _adapt_datetime(value):
+    """Returns the datetime as a raw SQL parameter for the database backend
     """
-    # this is just a separate function so it can be patched in test to acccommodate sqlite
-    return """\
-    SELECT COUNT(DISTINCT student_id) from courseware_studentmodule
-    where id in {}
-    and MONTH(modified) = {}
-    and YEAR(modified) = {}
-    """.format(site_ids, month_for.month, month_for.year)
+    # TODO: Remove this `if` branch after dropping Ginkgo support.
+    if RELEASE_LINE == 'ginkgo':
+        return connection.ops.value_to_db_datetime(value)
+    return connection.ops.adapt_datetimefield_value(value)
 
 
-def fill_month(site, month_for, student_modules=None, overwrite=False, use_raw=False):
-    """Fill a month's site monthly metrics for the specified site
+def raw_sql_mau_count(course_ids, month_for):
+    """Returns the count of distinct students active in the courses in the month
+
+    This runs a single parameterized statement that counts distinct
+    `StudentModule.student_id` values for the courses over the half open
+    `modified` range of the month. The database does the whole count and uses
+    the `course_id` and `modified` indexes, so no StudentModule ids are loaded
+    into Python. The statement is plain SQL that runs on MySQL and SQLite
+    """
+    if not course_ids:
+        return 0
+    qn = connection.ops.quote_name
+    opts = StudentModule._meta
+    statement = (
+        'SELECT COUNT(DISTINCT {student}) FROM {table} '
+        'WHERE {course_id} IN ({placeholders}) '
+        'AND {modified} >= %s AND {modified} < %s').format(
+            student=qn(opts.get_field('student').column),
+            table=qn(opts.db_table),
+            course_id=qn(opts.get_field('course_id').column),
+            modified=qn(opts.get_field('modified').column),
+            placeholders=', '.join(['%s'] * len(course_ids)))
+    start, end = month_window(month_for.year, month_for.month)
+    params = [str(course_id) for course_id in course_ids]
+    params += [_adapt_datetime(start), _adapt_datetime(end)]
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        row = cursor.fetchone()
+    return row[0]
+
+
+def raw_sql_mau_counts_by_month(course_ids, end=None):
+    """Returns the distinct students active in the courses for every month
+
+    Runs one statement that groups the `StudentModule` records for the courses
+    by the month of `modified` and counts distinct students in each month.
+    Records modified at or after the optional `end` datetime are left out.
+
+    Returns a dict that maps the first day of each month with activity to the
+    month's count
+    """
+    if not course_ids:
+        return {}
+    qn = connection.ops.quote_name
+    opts = StudentModule._meta
+    modified = qn(opts.get_field('modified').column)
+    # The backend's own SQL, so the statement runs on MySQL and SQLite
+    month_sql = connection.ops.date_trunc_sql('month', modified)
+    statement = (
+        'SELECT {month_sql}, COUNT(DISTINCT {student}) FROM {table} '
+        'WHERE {course_id} IN ({placeholders}){end_clause} '
+        'GROUP BY {month_sql}').format(
+            month_sql=month_sql,
+            student=qn(opts.get_field('student').column),
+            table=qn(opts.db_table),
+            course_id=qn(opts.get_field('course_id').column),
+            placeholders=', '.join(['%s'] * len(course_ids)),
+            end_clause=' AND {} < %s'.format(modified) if end else '')
+    params = [str(course_id) for course_id in course_ids]
+    if end:
+        params.append(_adapt_datetime(end))
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        rows = cursor.fetchall()
+    return {as_date(month_for).replace(day=1): count for month_for, count in rows}
+
+
+def site_month_active_user_count(site, month_for, student_modules=None, use_raw=False):
+    """Returns the site's active user count for the month
+
+    This is the count stored in `SiteMonthlyMetrics.active_user_count`: the
+    distinct learners with StudentModule records for the site's courses
+    modified in the month. Both the monthly fill and the daily rollup use it.
+
+    When `use_raw` is True, the count comes from `raw_sql_mau_count` for the
+    site's courses, and `student_modules` is only checked for records
     """
-    if not student_modules:
+    if student_modules is None:
         student_modules = get_student_modules_for_site(site)
 
-    if student_modules:
-        if not use_raw:
-            month_sm = student_modules.filter(modified__year=month_for.year,
-                                              modified__month=month_for.month)
-            mau_count = month_sm.values_list('student_id',
-                                             flat=True).distinct().count()
-        else:
-            if RELEASE_LINE == 'ginkgo':
-                site_ids = tuple(
-                    [int(sid) for sid in student_modules.values_list('id', flat=True).distinct()]
-                )
-            else:
-                # make sure we get integers and not longints from db
-                from django.db.models.functions import Cast
-                site_ids = tuple(
-                    student_modules.annotate(
-                        id_as_int=Cast('id', IntegerField())
-                    ).values_list('id_as_int', flat=True).distinct()
-                )
-
-            statement = _get_fill_month_raw_sql_for_month(site_ids, month_for)
-            with connection.cursor() as cursor:
-                cursor.execute(statement)
-                row = cursor.fetchone()
-                mau_count = row[0]
+    if not student_modules.exists():
+        return 0
+    elif use_raw:
+        return raw_sql_mau_count(course_ids=get_course_keys_for_site(site),
+                                 month_for=month_for)
     else:
-        mau_count = 0
+        month_sm = student_modules.filter(**window_filter(
+            'modified', month_window(month_for.year, month_for.month)))
+        return month_sm.values_list('student_id', flat=True).distinct().count()
+
+
+def fill_month(site, month_for, student_modules=None, overwrite=False, use_raw=False):
+    """Fill a month's site monthly metrics for the specified site
+
+    See `site_month_active_user_count` for the `use_raw` argument
+    """
+    mau_count = site_month_active_user_count(site=site,
+                                             month_for=month_for,
+                                             student_modules=student_modules,
+                                             use_raw=use_raw)
 
     obj, created = SiteMonthlyMetrics.add_month(site=site,
                                                 year=month_for.year,
@@ -74,3 +163,44 @@ def fill_last_month(site, overwrite=False):
     # Maybe we want to make 'last_month' a 'figures.helpers' method
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
     return fill_month(site=site, month_for=last_month, overwrite=overwrite)
+
+
+def update_month_rollup(site, month_for):
+    """Roll up the site monthly metrics for the month of `month_for`
+
+    Calculates the monthly site metrics once and saves them to the month's
+    `SiteMonthlyMetrics` record, overwriting existing values. The site monthly
+    metrics endpoints then read the record instead of calculating the metrics
+    """
+    month_for = as_date(month_for)
+    start_date = date(year=month_for.year, month=month_for.month, day=1)
+    end_date = date(year=month_for.year,
+                    month=month_for.month,
+                    day=days_in_month(month_for))
+    values = {field: func(site=site, start_date=start_date, end_date=end_date) or 0
+              for field, func in ROLLUP_METRICS}
+    active_user_count = site_month_active_user_count(site=site,
+                                                     month_for=month_for,
+                                                     use_raw=True)
+    return SiteMonthlyMetrics.update_rollup(site=site,
+                                            year=month_for.year,
+                                            month=month_for.month,
+                                            active_user_count=active_user_count,
+                                            **values)
+
+
+def update_rollups_for_date(site, date_for):
+    """Daily pipeline update of the site monthly rollup
+
+    Rolls up the month of `date_for`. Also rolls up the previous month if its
+    record was last updated before the month ended. This way the rollup of a
+    closed month includes the month's last days
+    """
+    date_for = as_date(date_for)
+    rollups = [update_month_rollup(site=site, month_for=date_for)]
+    month_start = date(year=date_for.year, month=date_for.month, day=1)
+    prev_month = month_start - relativedelta(months=1)
+    prev_rec = SiteMonthlyMetrics.objects.filter(site=site, month_for=prev_month).first()
+    if not prev_rec or prev_rec.modified < as_datetime(month_start):
+        rollups.append(update_month_rollup(site=site, month_for=prev_month))
+    return rollups
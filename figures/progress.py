@@ -1,10 +1,234 @@
 """
 This module exists as a quick fix to prevent cyclical dependencies
+
+It also provides the course structure cache. The graded structure of a course
+is the same for every learner, so we build it once per course and then compute
+learner progress from the learner's persisted subsection grades instead of
+calling CourseGradeFactory for every learner. See `CourseStructure`
+
+This is enabled with the `PROGRESS_FROM_PERSISTED_GRADES` Figures setting
 """
+from __future__ import absolute_import
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.timezone import utc
+
 from figures.compat import (
     chapter_grade_values,
-    course_grade_from_course_id
+    course_from_course_id,
+    course_grade,
+    course_grade_from_course_id,
+    PersistentSubsectionGrade,
 )
+from figures.helpers import as_course_key
+
+
+COURSE_STRUCTURE_CACHE_KEY = 'figures.course_structure.{course_id}'
+
+# One day, so a structure is built at most once per daily pipeline run. Course
+# publish events invalidate the cache sooner. See `figures.signals`
+COURSE_STRUCTURE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Keeps 'user_id IN (...)' clauses to a size all our databases accept
+PERSISTED_GRADES_QUERY_CHUNK_SIZE = 500
+
+
+def course_structure_cache_timeout():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'COURSE_STRUCTURE_CACHE_TIMEOUT', COURSE_STRUCTURE_CACHE_TIMEOUT))
+
+
+def use_persisted_grades():
+    """Returns True if learner progress is read from persisted grades
+
+    This is opt in. Sites that persist subsection grades set the
+    `PROGRESS_FROM_PERSISTED_GRADES` Figures setting to True. Otherwise
+    progress comes from CourseGradeFactory
+    """
+    return PersistentSubsectionGrade is not None and bool(settings.ENV_TOKENS[
+        'FIGURES'].get('PROGRESS_FROM_PERSISTED_GRADES', False))
+
+
+def get_structure_user():
+    """Returns the user the course structure is built as, or None
+
+    A global staff user sees all of a course's graded content, so the
+    structure does not depend on the content visibility of any one learner.
+    Content only staff can see is left out with `hidden_subsections`
+    """
+    return get_user_model().objects.filter(
+        is_active=True, is_staff=True).order_by('id').first()
+
+
+def is_hidden_from_learners(block, now):
+    """Returns True if learners cannot see the block
+
+    This is content hidden from learners in Studio or not yet released. Staff
+    still see it, so it is in the staff user's course grade
+    """
+    if getattr(block, 'visible_to_staff_only', False):
+        return True
+    start = getattr(block, 'start', None)
+    return start is not None and start > now
+
+
+def hidden_subsections(course):
+    """Returns the locations of the course's subsections learners cannot see
+
+    A subsection is hidden if it or its section is hidden from learners
+    """
+    now = datetime.utcnow().replace(tzinfo=utc)
+    hidden = set()
+    for chapter in course.get_children():
+        chapter_hidden = is_hidden_from_learners(chapter, now)
+        for subsection in chapter.get_children():
+            if chapter_hidden or is_hidden_from_learners(subsection, now):
+                hidden.add(str(subsection.location))
+    return hidden
+
+
+def is_section_graded(section):
+    # just being defensive, might not need to check if
+    # all_total exists and if all_total.possible exists
+    return bool(
+        hasattr(section, 'all_total')
+        and hasattr(section.all_total, 'possible')
+        and section.all_total.possible > 0
+    )
+
+
+class CourseStructure(object):
+    """Learner independent graded structure of a course
+
+    Holds the graded subsections of a course, in course order, mapped to the
+    points possible for each subsection. From this we get the course's
+    'sections_possible' and 'points_possible' and can calculate a learner's
+    progress from the learner's own subsection scores
+    """
+    def __init__(self, course_id, subsections):
+        self.course_id = str(course_id)
+        self.subsections = OrderedDict(subsections)
+
+    @classmethod
+    def from_course_grade(cls, course_id, course_grade, hidden=None):
+        """Builds the structure from any learner's course grade
+
+        Subsections with locations in `hidden` are left out
+
+        Returns None if a graded subsection does not identify its block, as we
+        then cannot match the learner's scores to the structure
+        """
+        hidden = hidden or set()
+        subsections = []
+        for chapter_grade in chapter_grade_values(course_grade.chapter_grades):
+            for section in chapter_grade['sections']:
+                if not is_section_graded(section):
+                    continue
+                location = getattr(section, 'location', None)
+                if location is None:
+                    return None
+                if str(location) in hidden:
+                    continue
+                subsections.append((str(location), section.all_total.possible))
+        return cls(course_id=course_id, subsections=subsections)
+
+    @property
+    def sections_possible(self):
+        return len(self.subsections)
+
+    @property
+    def points_possible(self):
+        return sum(self.subsections.values())
+
+    def progress(self, scores):
+        """Returns the learner's progress for the learner's subsection scores
+
+        `scores` is an iterable of (usage_key, earned) pairs. Scores for
+        subsections not graded in this structure are ignored
+
+        The returned dict has the same form as
+        `figures.metrics.LearnerCourseGrades.progress`
+        """
+        points_earned = sections_worked = 0
+        for usage_key, earned in scores:
+            if str(usage_key) in self.subsections and earned > 0:
+                sections_worked += 1
+                points_earned += earned
+        return dict(
+            points_possible=self.points_possible,
+            points_earned=points_earned,
+            sections_worked=sections_worked,
+            count=self.sections_possible,
+        )
+
+
+def get_course_structure(course_id):
+    """Returns the cached `CourseStructure` for the course
+
+    If not cached, builds the structure from the course grade of the user from
+    `get_structure_user`. This is the only CourseGradeFactory call needed for
+    the course until the cache expires or the course is republished. Content
+    hidden from learners or not yet released is left out, so it does not count
+    toward a learner's sections possible
+
+    Returns None if the structure cannot be built
+    """
+    cache_key = COURSE_STRUCTURE_CACHE_KEY.format(course_id=str(course_id))
+    subsections = cache.get(cache_key)
+    if subsections is not None:
+        return CourseStructure(course_id=course_id, subsections=subsections)
+
+    learner = get_structure_user()
+    if not learner:
+        return None
+    course = course_from_course_id(course_id)
+    structure = CourseStructure.from_course_grade(
+        course_id=course_id,
+        course_grade=course_grade(learner, course),
+        hidden=hidden_subsections(course))
+    if structure:
+        cache.set(cache_key,
+                  list(structure.subsections.items()),
+                  course_structure_cache_timeout())
+    return structure
+
+
+def invalidate_course_structure(course_id):
+    cache.delete(COURSE_STRUCTURE_CACHE_KEY.format(course_id=str(course_id)))
+
+
+def bulk_progress_data(course_id, user_ids):
+    """Returns a dict of progress data for the learners, keyed by user id
+
+    Progress is calculated from the cached course structure and the learners'
+    persisted subsection grades. The number of queries does not depend on the
+    number of learners beyond chunking the user id list
+
+    Returns None if progress cannot be calculated this way. Callers should then
+    fall back to `figures.metrics.LearnerCourseGrades`
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not use_persisted_grades():
+        return None
+    structure = get_course_structure(course_id=course_id)
+    if not structure:
+        return None
+
+    scores = {user_id: [] for user_id in user_ids}
+    course_key = as_course_key(course_id)
+    for i in range(0, len(user_ids), PERSISTED_GRADES_QUERY_CHUNK_SIZE):
+        rows = PersistentSubsectionGrade.objects.filter(
+            course_id=course_key,
+            user_id__in=user_ids[i:i + PERSISTED_GRADES_QUERY_CHUNK_SIZE]
+        ).values_list('user_id', 'usage_key', 'earned_all')
+        for user_id, usage_key, earned in rows:
+            scores[user_id].append((usage_key, earned))
+    return {user_id: structure.progress(user_scores)
+            for user_id, user_scores in scores.items()}
 
 
 class EnrollmentProgress(object):
@@ -32,19 +256,33 @@ class EnrollmentProgress(object):
             django.core.exceptions.PermissionDenied(
                 "User does not have access to this course")
         """
-        self.course_grade = course_grade_from_course_id(learner=user,
-                                                        course_id=course_id)
-        self.progress = self._get_progress()
+        self.user = user
+        self.course_id = course_id
+        self._course_grade = None
+        progress_data = bulk_progress_data(course_id=course_id, user_ids=[user.id])
+        if progress_data:
+            # Use the course structure cache instead of loading the course.
+            # The course grade is only loaded if `sections` is called
+            progress = progress_data[user.id]
+            self.progress = dict(
+                points_possible=progress['points_possible'],
+                points_earned=progress['points_earned'],
+                sections_worked=progress['sections_worked'],
+                sections_possible=progress['count'],
+            )
+        else:
+            self.progress = self._get_progress()
+
+    @property
+    def course_grade(self):
+        if self._course_grade is None:
+            self._course_grade = course_grade_from_course_id(learner=self.user,
+                                                             course_id=self.course_id)
+        return self._course_grade
 
     # Can be a class method instead of instance
     def is_section_graded(self, section):
-        # just being defensive, might not need to check if
-        # all_total exists and if all_total.possible exists
-        return bool(
-            hasattr(section, 'all_total')
-            and hasattr(section.all_total, 'possible')
-            and section.all_total.possible > 0
-        )
+        return is_section_graded(section)
 
     def sections(self, only_graded=False, **_kwargs):
         """
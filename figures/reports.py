@@ -0,0 +1,148 @@
+"""Background report generation
+
+Very large exports can take longer than a request is allowed to run. A
+report job builds the same data as the export endpoints in a Celery task and
+writes it as a gzip compressed file to the report storage. The job records its
+status and progress so the API can tell the client when the file is ready.
+See `figures.storage` for where the files are written
+"""
+from __future__ import absolute_import
+import gzip
+import tempfile
+
+from django.core.files import File
+import six
+
+from figures.export import (
+    CSV_FORMAT,
+    ENROLLMENT_METRICS_CSV_FIELDS,
+    LEARNER_CSV_FIELDS,
+    NDJSON_FORMAT,
+    export_chunk_size,
+    export_lines,
+    learner_csv_records,
+    queryset_chunks,
+)
+from figures.filters import (
+    CourseDailyMetricsFilter,
+    EnrollmentMetricsFilter,
+    UserFilterSet,
+)
+from figures.models import CourseDailyMetrics, LearnerCourseGradeMetrics, ReportJob
+from figures.query import site_users_enrollment_data
+from figures.serializers import (
+    CourseDailyMetricsSerializer,
+    EnrollmentMetricsSerializer,
+    LearnerMetricsSerializerV2,
+)
+from figures.storage import report_file_name, report_storage
+
+
+COURSE_METRICS_CSV_FIELDS = [
+    'id', 'date_for', 'course_id', 'enrollment_count', 'active_learners_today',
+    'average_progress', 'average_days_to_complete', 'num_learners_completed',
+]
+
+FILE_FORMAT_EXPORT_FORMATS = {
+    ReportJob.CSV_GZIP: CSV_FORMAT,
+    ReportJob.NDJSON_GZIP: NDJSON_FORMAT,
+}
+
+
+def learner_metrics_queryset(site, params):
+    return site_users_enrollment_data(site=site,
+                                      course_ids=params.get('course_ids'))
+
+
+def enrollment_metrics_queryset(site, params):  # pylint: disable=unused-argument
+    return LearnerCourseGradeMetrics.objects.filter(site=site).select_related(
+        'user', 'user__profile')
+
+
+def course_metrics_queryset(site, params):  # pylint: disable=unused-argument
+    return CourseDailyMetrics.objects.filter(site=site)
+
+
+# Each report type maps to the functions and classes that build it. The
+# `csv_records` function reshapes serialized records into CSV rows
+REPORTS = {
+    ReportJob.LEARNER_METRICS: dict(
+        queryset=learner_metrics_queryset,
+        filter_class=UserFilterSet,
+        serializer_class=LearnerMetricsSerializerV2,
+        csv_fields=LEARNER_CSV_FIELDS,
+        csv_records=learner_csv_records),
+    ReportJob.ENROLLMENT_METRICS: dict(
+        queryset=enrollment_metrics_queryset,
+        filter_class=EnrollmentMetricsFilter,
+        serializer_class=EnrollmentMetricsSerializer,
+        csv_fields=ENROLLMENT_METRICS_CSV_FIELDS,
+        csv_records=None),
+    ReportJob.COURSE_METRICS: dict(
+        queryset=course_metrics_queryset,
+        filter_class=CourseDailyMetricsFilter,
+        serializer_class=CourseDailyMetricsSerializer,
+        csv_fields=COURSE_METRICS_CSV_FIELDS,
+        csv_records=None),
+}
+
+
+def report_queryset(report_job):
+    """Returns the filtered queryset of the records in the report
+
+    The job's `params` are the same filter query parameters the matching API
+    endpoint accepts
+    """
+    report = REPORTS[report_job.report_type]
+    queryset = report['queryset'](report_job.site, report_job.params)
+    return report['filter_class'](report_job.params, queryset=queryset).qs
+
+
+def tracked_records(report_job, queryset, serializer_class, context=None):
+    """Yields the serialized records and saves the job progress after each chunk
+    """
+    for chunk in queryset_chunks(queryset, export_chunk_size()):
+        for data in serializer_class(chunk, many=True, context=context).data:
+            yield data
+        report_job.records_done += len(chunk)
+        ReportJob.objects.filter(id=report_job.id).update(
+            records_done=report_job.records_done)
+
+
+def write_report(report_job, fileobj):
+    """Writes the report as gzip compressed lines to the open binary file
+    """
+    report = REPORTS[report_job.report_type]
+    export_format = FILE_FORMAT_EXPORT_FORMATS[report_job.file_format]
+    records = tracked_records(report_job=report_job,
+                              queryset=report_queryset(report_job),
+                              serializer_class=report['serializer_class'],
+                              context=dict(site=report_job.site))
+    if export_format == CSV_FORMAT and report['csv_records']:
+        records = report['csv_records'](records)
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gzip_file:
+        for line in export_lines(records, export_format, report['csv_fields']):
+            if isinstance(line, six.text_type):
+                line = line.encode('utf-8')
+            gzip_file.write(line)
+
+
+def build_report(report_job):
+    """Builds the report file for the job and saves it to the report storage
+
+    Returns the report job with the stored file name
+    """
+    report_job.status = ReportJob.RUNNING
+    report_job.records_done = 0
+    report_job.records_total = report_queryset(report_job).count()
+    report_job.save()
+
+    with tempfile.TemporaryFile() as fileobj:
+        write_report(report_job, fileobj)
+        fileobj.seek(0)
+        file_name = report_storage().save(report_file_name(report_job), File(fileobj))
+
+    report_job.file_name = file_name
+    report_job.status = ReportJob.COMPLETE
+    report_job.save()
+    return report_job
@@ -23,6 +23,7 @@ from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.db.models import Manager
 from django_countries import Countries
 from rest_framework import serializers
 from rest_framework.fields import empty
@@ -40,7 +41,7 @@ from figures.metrics import (
     get_course_average_progress_for_time_period,
     get_course_average_days_to_complete_for_time_period,
     get_course_num_learners_completed_for_time_period,
-    get_monthly_history_metric,
+    get_cached_history_metric,
     )
 from figures.models import (
     CourseDailyMetrics,
@@ -50,9 +51,11 @@ from figures.models import (
     SiteMauMetrics,
     LearnerCourseGradeMetrics,
     PipelineError,
+    ReportJob,
     )
 from figures.pipeline.logger import log_error
 import figures.sites
+from figures.storage import report_download_url
 
 
 # Temporarily hardcoding here
@@ -188,7 +191,8 @@ class CourseDailyMetricsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CourseDailyMetrics
-        exclude = ()
+        exclude = ('active_learners_sketch', 'active_learners_bitmap',
+                   'days_to_complete_total', 'days_to_complete_count',)
 
 
 class SiteDailyMetricsSerializer(serializers.ModelSerializer):
@@ -198,7 +202,7 @@ class SiteDailyMetricsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SiteDailyMetrics
-        exclude = ()
+        exclude = ('active_users_sketch', 'active_users_bitmap',)
 
 #
 # Serializers for serving the front end views
@@ -330,28 +334,14 @@ def get_course_history_metric(site, course_id, func, date_for, months_back):
     :param months_back: How many months back to retrieve data
     :returns: a dict with the current month metric and list of metrics for
     previous months
+
+    Values for closed months are cached. See `get_cached_history_metric`
     """
-    # wrapper_func = lambda start_date, end_date: func(
-    #         start_date=start_date,
-    #         end_date=end_date,
-    #         course_id=course_id)
-
-    # def wrapper_func(start_date, end_date):
-    #         start_date=start_date,
-    #         end_date=end_date,
-    #         course_id=course_id
-
-    return get_monthly_history_metric(
-        func=lambda site, start_date, end_date: func(
-            site=site,
-            start_date=start_date,
-            end_date=end_date,
-            # site=site,
-            course_id=course_id),
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-        )
+    return get_cached_history_metric(func=func,
+                                     site=site,
+                                     date_for=date_for,
+                                     months_back=months_back,
+                                     course_id=course_id)
 
 
 class CourseDetailsSerializer(serializers.ModelSerializer):
@@ -541,6 +531,33 @@ class UserDemographicSerializer(serializers.Serializer):
         read_only=True)
 
 
+def certificates_for_enrollments(enrollments):
+    """Returns a dict of a certificate for each enrollment that has one
+
+    The dict is keyed on `(user_id, course_id)` with the course id as a string
+    """
+    certificates = GeneratedCertificate.objects.filter(
+        user_id__in=set(enrollment.user_id for enrollment in enrollments),
+        course_id__in=set(enrollment.course_id for enrollment in enrollments))
+    return {(cert.user_id, str(cert.course_id)): cert for cert in certificates}
+
+
+class LearnerCourseDetailsListSerializer(serializers.ListSerializer):
+    """Retrieves the certificates and most recent LCGM records for all the
+    enrollments up front
+
+    `LearnerCourseDetailsSerializer` reads them from here instead of running
+    queries for each enrollment
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        enrollments = list(iterable)
+        self.certificates = certificates_for_enrollments(enrollments)
+        self.latest_lcgms = LearnerCourseGradeMetrics.objects.latest_lcgm_for_enrollments(
+            enrollments)
+        return [self.child.to_representation(item) for item in enrollments]
+
+
 class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
     """
             {
@@ -576,6 +593,7 @@ class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CourseEnrollment
+        list_serializer_class = LearnerCourseDetailsListSerializer
         fields = (
             'course_name', 'course_code', 'course_id', 'date_enrolled',
             'progress_data', 'enrollment_id',
@@ -590,13 +608,18 @@ class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
         TODO: We will cache course grades, so we'll refactor this method to  use
         the cache, so we'll likely change the call to LearnerCourseGrades
         """
-        cert = GeneratedCertificate.objects.filter(
-            user=course_enrollment.user,
-            course_id=course_enrollment.course_id,
-            )
+        key = (course_enrollment.user_id, str(course_enrollment.course_id))
+        prefetched = isinstance(self.parent, LearnerCourseDetailsListSerializer)
+        if prefetched:
+            cert = self.parent.certificates.get(key)
+        else:
+            cert = GeneratedCertificate.objects.filter(
+                user=course_enrollment.user,
+                course_id=course_enrollment.course_id,
+                ).first()
 
         if cert:
-            course_completed = cert[0].created_date
+            course_completed = cert.created_date
         else:
             course_completed = False
 
@@ -605,9 +628,12 @@ class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
         course_progress_details = None
 
         try:
-            obj = LearnerCourseGradeMetrics.objects.latest_lcgm(
-                user=course_enrollment.user,
-                course_id=str(course_enrollment.course_id))
+            if prefetched:
+                obj = self.parent.latest_lcgms.get(key)
+            else:
+                obj = LearnerCourseGradeMetrics.objects.latest_lcgm(
+                    user=course_enrollment.user,
+                    course_id=str(course_enrollment.course_id))
             if obj:
                 progress_percent = obj.progress_percent
                 course_progress_details = obj.progress_details
@@ -792,6 +818,28 @@ class EnrollmentMetricsSerializer(serializers.ModelSerializer):
                   'progress_percent')
 
 
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Provides the status of a background report and its download link
+
+    `params` holds the filter query parameters of the report. The learner
+    metrics report also takes a `course_ids` list
+    """
+    params = serializers.DictField(required=False)
+    progress = serializers.FloatField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'created', 'modified', 'report_type', 'file_format',
+                  'params', 'status', 'progress', 'records_done',
+                  'records_total', 'error_message', 'download_url')
+        read_only_fields = ('id', 'created', 'modified', 'status',
+                            'records_done', 'records_total', 'error_message')
+
+    def get_download_url(self, obj):
+        return report_download_url(obj, request=self.context.get('request'))
+
+
 class CourseCompletedSerializer(serializers.Serializer):
     """Provides course id and user id for course completions
 
@@ -801,6 +849,23 @@ class CourseCompletedSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()
 
 
+class EnrollmentMetricsListSerializer(serializers.ListSerializer):
+    """Retrieves the most recent LCGM records for all the enrollments up front
+
+    If the `latest_lcgms` context value is set, we use it instead. This lets
+    `LearnerMetricsListSerializer` retrieve the records for a whole page of
+    learners at once
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        enrollments = list(iterable)
+        self.latest_lcgms = self.context.get('latest_lcgms')
+        if self.latest_lcgms is None:
+            self.latest_lcgms = LearnerCourseGradeMetrics.objects.latest_lcgm_for_enrollments(
+                enrollments)
+        return [self.child.to_representation(item) for item in enrollments]
+
+
 class EnrollmentMetricsSerializerV2(serializers.ModelSerializer):
     """Provides serialization for an enrollment
 
@@ -821,6 +886,7 @@ class EnrollmentMetricsSerializerV2(serializers.ModelSerializer):
 
     class Meta:
         model = CourseEnrollment
+        list_serializer_class = EnrollmentMetricsListSerializer
         fields = ['id', 'course_id', 'date_enrolled', 'is_enrolled',
                   'progress_percent', 'progress_details']
         read_only_fields = fields
@@ -829,8 +895,12 @@ class EnrollmentMetricsSerializerV2(serializers.ModelSerializer):
         """
         Get the most recent LCGM record for the enrollment, if it exists
         """
-        self._lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
-            user=instance.user, course_id=str(instance.course_id))
+        if isinstance(self.parent, EnrollmentMetricsListSerializer):
+            self._lcgm = self.parent.latest_lcgms.get(
+                (instance.user_id, str(instance.course_id)))
+        else:
+            self._lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
+                user=instance.user, course_id=str(instance.course_id))
         return super(EnrollmentMetricsSerializerV2, self).to_representation(instance)
 
     def get_progress_percent(self, obj):  # pylint: disable=unused-argument
@@ -861,6 +931,22 @@ class LearnerMetricsListSerializer(serializers.ListSerializer):
         super(LearnerMetricsListSerializer, self).__init__(
             instance=instance, data=data, **kwargs)
 
+    def to_representation(self, data):
+        """Retrieves the enrollments and their most recent LCGM records for
+        the learners before serializing them
+        """
+        iterable = data.all() if isinstance(data, Manager) else data
+        users = list(iterable)
+        enrollments = list(CourseEnrollment.objects.filter(
+            user_id__in=[user.id for user in users],
+            course_id__in=self.course_keys))
+        self.enrollments_by_user = {}
+        for enrollment in enrollments:
+            self.enrollments_by_user.setdefault(enrollment.user_id, []).append(enrollment)
+        self.latest_lcgms = LearnerCourseGradeMetrics.objects.latest_lcgm_for_enrollments(
+            enrollments)
+        return [self.child.to_representation(item) for item in users]
+
 
 class LearnerMetricsSerializer(serializers.ModelSerializer):
     fullname = serializers.CharField(source='profile.name', default=None)
@@ -878,6 +964,12 @@ class LearnerMetricsSerializer(serializers.ModelSerializer):
         Use the course ids identified in this serializer's list serializer to
         filter enrollments
         """
+        if hasattr(self.parent, 'enrollments_by_user'):
+            return EnrollmentMetricsSerializerV2(
+                self.parent.enrollments_by_user.get(user.id, []),
+                many=True,
+                context=dict(latest_lcgms=self.parent.latest_lcgms)).data
+
         user_enrollments = user.courseenrollment_set.filter(
             course_id__in=self.parent.course_keys)
 
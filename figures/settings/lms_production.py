@@ -57,6 +57,10 @@ def update_celerybeat_schedule(
     Daily metrics pipeline scheduler is on by default
     Course MAU metrics pipeline scheduler is off by default
 
+    The daily metrics pipeline runs serially in one task by default. Set
+    ``DAILY_METRICS_DISTRIBUTED`` to true to run it as per site and per course
+    Celery tasks instead
+
     TODO: Language improvement: Change the "IMPORT" to "CAPTURE" or "EXTRACT"
 
     We need to set the celery queue for each scheduled task again here, celery
@@ -64,8 +68,12 @@ def update_celerybeat_schedule(
     https://stackoverflow.com/questions/51631455/how-to-route-tasks-to-different-queues-with-celery-and-django
     """
     if figures_env_tokens.get('ENABLE_DAILY_METRICS_IMPORT', True):
+        if figures_env_tokens.get('DAILY_METRICS_DISTRIBUTED', False):
+            daily_metrics_task = 'figures.tasks.populate_daily_metrics_distributed'
+        else:
+            daily_metrics_task = 'figures.tasks.populate_daily_metrics'
         celerybeat_schedule_settings['figures-populate-daily-metrics'] = {
-            'task': 'figures.tasks.populate_daily_metrics',
+            'task': daily_metrics_task,
             'schedule': crontab(
                 hour=figures_env_tokens.get('DAILY_METRICS_IMPORT_HOUR', 2),
                 minute=figures_env_tokens.get('DAILY_METRICS_IMPORT_MINUTE', 0),
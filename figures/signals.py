@@ -0,0 +1,59 @@
+"""Signal receivers for Figures
+
+Receivers are connected when the Figures app is ready. See
+`figures.apps.FiguresConfig.ready`
+"""
+# Receivers must accept the 'sender' argument even though we don't use it
+# pylint: disable=unused-argument
+
+from __future__ import absolute_import
+import logging
+
+from figures.compat import (
+    COURSE_GRADE_CHANGED,
+    ENROLL_STATUS_CHANGE,
+    SignalHandler,
+)
+from figures.progress import invalidate_course_structure
+from figures.tasks import enrollment_live_capture_enabled, schedule_enrollment_update
+
+
+logger = logging.getLogger(__name__)
+
+
+def handle_course_published(sender, course_key, **_kwargs):
+    """Drop the cached course structure when a course is (re)published
+    """
+    invalidate_course_structure(course_key)
+    logger.debug('FIGURES:SIGNALS: invalidated course structure for "%s"', course_key)
+
+
+def handle_enrollment_status_change(sender, user=None, course_id=None, **_kwargs):
+    """Queue an EnrollmentData update when a learner enrolls or unenrolls
+    """
+    if user and course_id and enrollment_live_capture_enabled():
+        schedule_enrollment_update(user_id=user.id, course_id=course_id)
+
+
+def handle_course_grade_changed(sender, user=None, course_key=None, **_kwargs):
+    """Queue an EnrollmentData update when a learner's course grade changes
+    """
+    if user and course_key and enrollment_live_capture_enabled():
+        schedule_enrollment_update(user_id=user.id, course_id=course_key)
+
+
+def connect_receivers():
+    """Connects Figures receivers to the platform signals available
+    """
+    if SignalHandler is not None:
+        SignalHandler.course_published.connect(
+            handle_course_published,
+            dispatch_uid='figures.signals.handle_course_published')
+    if ENROLL_STATUS_CHANGE is not None:
+        ENROLL_STATUS_CHANGE.connect(
+            handle_enrollment_status_change,
+            dispatch_uid='figures.signals.handle_enrollment_status_change')
+    if COURSE_GRADE_CHANGED is not None:
+        COURSE_GRADE_CHANGED.connect(
+            handle_course_grade_changed,
+            dispatch_uid='figures.signals.handle_course_grade_changed')
@@ -0,0 +1,72 @@
+"""Storage for the files Figures writes, such as background reports
+
+Figures settings:
+
+* `REPORT_STORAGE` - Import path of the storage class for report files. The
+  default storage is used when not set
+* `REPORT_DIRECTORY` - Path in the storage where report files are written
+
+Report files can hold learner personal data, so they are never linked to
+directly in the storage. They are downloaded through the authenticated
+`reports/<id>/download/` API endpoint, which checks the report's site
+"""
+from __future__ import absolute_import
+
+from django.conf import settings
+from django.core.files.storage import default_storage, get_storage_class
+from django.utils.timezone import now
+
+try:
+    # Django 2.0+
+    from django.urls import NoReverseMatch, reverse
+except ImportError:
+    # Django <1.9
+    from django.core.urlresolvers import NoReverseMatch, reverse
+
+from figures.models import ReportJob
+
+
+REPORT_DIRECTORY = 'figures/reports'
+
+REPORT_FILE_NAME = '{directory}/{site_id}/{report_type}-{job_id}-{timestamp}.{file_format}'
+
+
+def report_storage():
+    storage_class = settings.ENV_TOKENS['FIGURES'].get('REPORT_STORAGE')
+    if storage_class:
+        return get_storage_class(storage_class)()
+    return default_storage
+
+
+def report_directory():
+    return settings.ENV_TOKENS['FIGURES'].get('REPORT_DIRECTORY', REPORT_DIRECTORY)
+
+
+def report_file_name(report_job):
+    return REPORT_FILE_NAME.format(directory=report_directory(),
+                                   site_id=report_job.site_id,
+                                   report_type=report_job.report_type,
+                                   job_id=report_job.id,
+                                   timestamp=now().strftime('%Y%m%d%H%M%S'),
+                                   file_format=report_job.file_format)
+
+
+def report_is_ready(report_job):
+    return report_job.status == ReportJob.COMPLETE and bool(report_job.file_name)
+
+
+def report_download_url(report_job, request=None):
+    """Returns the API URL to download the report file or None if it is not ready
+
+    The URL is absolute when the request is given
+    """
+    if not report_is_ready(report_job):
+        return None
+    try:
+        url = reverse('figures:api:reports-download', args=[report_job.id])
+    except NoReverseMatch:
+        # The Figures URLs are the root URL conf, as in the test settings
+        url = reverse('api:reports-download', args=[report_job.id])
+    if request:
+        return request.build_absolute_uri(url)
+    return url
@@ -8,26 +8,45 @@ from __future__ import absolute_import
 import datetime
 import time
 
-import six
 import waffle
 
+from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.utils.timezone import utc
 
 from celery import chord, group
 from celery.app import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from celery.utils.log import get_task_logger
 
-from figures.backfill import backfill_enrollment_data_for_site
-from figures.compat import CourseEnrollment, CourseOverview
+from figures.backfill import (
+    backfill_completions_for_site,
+    backfill_enrollment_data_for_site,
+    refresh_enrollment_data_for_site,
+)
+from figures.caching import bump_data_generation
+from figures.compat import CourseEnrollment
 from figures.helpers import as_course_key, as_date, is_past_date
 from figures.log import log_exec_time
-from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.models import EnrollmentData, ReportJob
+from figures.pipeline.course_daily_metrics import (
+    CourseDailyMetricsLoader,
+    SiteCourseDailyMetricsLoader,
+)
+from figures.pipeline.enrollment_metrics import capture_enrollment_metrics
 from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
-from figures.sites import get_sites, get_sites_by_id, site_course_ids
-from figures.pipeline.mau_pipeline import collect_course_mau
+from figures.sites import (
+    get_site_for_course,
+    get_sites,
+    get_sites_by_id,
+    site_course_ids,
+)
+from figures.pipeline.mau_pipeline import collect_course_mau, collect_site_course_mau
 from figures.pipeline.helpers import DateForCannotBeFutureError
 from figures.pipeline.site_monthly_metrics import fill_last_month as fill_last_smm_month
+from figures.pipeline.site_monthly_metrics import update_rollups_for_date
+from figures.reports import build_report
 
 
 logger = get_task_logger(__name__)
@@ -35,6 +54,8 @@ logger = get_task_logger(__name__)
 # Consistent log message prefixes for easier log grepping
 FPD_LOG_PREFIX = 'FIGURES:PIPELINE:DAILY'
 FPM_LOG_PREFIX = 'FIGURES:PIPELINE:MONTHLY'
+FPL_LOG_PREFIX = 'FIGURES:PIPELINE:LIVE'
+FR_LOG_PREFIX = 'FIGURES:REPORTS'
 
 # For debugging in the devstack celery worker, unremark this line
 # This can reduce the noise over seting the log level to info via the Celery
@@ -45,6 +66,20 @@ FPM_LOG_PREFIX = 'FIGURES:PIPELINE:MONTHLY'
 
 WAFFLE_DISABLE_PIPELINE = 'figures.disable_pipeline'
 
+# Defaults for the distributed daily pipeline. These can be overridden in the
+# ``FIGURES`` section of the LMS env tokens (``lms.env.json``)
+DAILY_METRICS_MAX_PARALLEL_COURSE_TASKS = 8
+# Seconds the course tasks for a site get, from when the site is queued, before
+# they stop processing courses
+DAILY_METRICS_SITE_TIME_LIMIT = 60 * 60
+DAILY_METRICS_TASK_MAX_RETRIES = 2
+DAILY_METRICS_TASK_RETRY_DELAY = 60 * 5
+
+# Seconds we wait after an enrollment or grade change before updating the
+# enrollment. Changes for the same enrollment during this time are coalesced
+ENROLLMENT_LIVE_CAPTURE_DELAY = 60 * 5
+ENROLLMENT_LIVE_CAPTURE_KEY = 'figures.live_capture.{user_id}.{course_id}'
+
 
 @shared_task
 def populate_single_cdm(course_id, date_for=None, force_update=False):
@@ -81,17 +116,66 @@ def populate_single_sdm(site_id, date_for, force_update=False):
     """
     logger.debug('populate_single_sdm: site_id={}'.format(site_id))
 
-    SiteDailyMetricsLoader().load(site=Site.objects.get(id=site_id),
+    site = Site.objects.get(id=site_id)
+    SiteDailyMetricsLoader().load(site=site,
                                   date_for=date_for,
                                   force_update=force_update)
 
+    # The monthly rollup serves the site monthly metrics endpoints. Failing to
+    # update it should not fail the daily site metrics
+    try:
+        update_rollups_for_date(site=site, date_for=date_for)
+    except Exception:  # pylint: disable=broad-except
+        msg = ('{prefix}:SITE:FAIL:populate_single_sdm:update_rollups_for_date.'
+               ' site_id:{site_id}, date_for:{date_for}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site_id,
+                                    date_for=date_for))
+
+    # The site's daily data is complete, so cached API responses are stale
+    bump_data_generation(site_id)
+
     logger.debug(
         'done running populate_site_daily_metrics for site_id={}'.format(site_id))
 
 
+def daily_metrics_bulk_cdm():
+    return bool(settings.ENV_TOKENS['FIGURES'].get('DAILY_METRICS_BULK_CDM', False))
+
+
+def bulk_load_cdms(site, date_for, force_update=False, course_ids=None):
+    """Loads CourseDailyMetrics records with `SiteCourseDailyMetricsLoader`
+
+    Returns True if the records were loaded. The records for all the courses
+    are written together, so if the load fails none are written. On failure
+    we log and return False so the caller can load the courses one at a time,
+    which keeps a failing course from stopping the others
+    """
+    try:
+        SiteCourseDailyMetricsLoader(site).load(date_for=date_for,
+                                                force_update=force_update,
+                                                course_ids=course_ids)
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception as e:  # pylint: disable=broad-except
+        msg = ('{prefix}:SITE:FAIL:bulk_load_cdms, loading courses one at a time.'
+               ' site_id:{site_id}, date_for:{date_for}. exception:{exception}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site.id,
+                                    date_for=date_for,
+                                    exception=e))
+        return False
+    return True
+
+
 @shared_task
 def populate_daily_metrics_for_site(site_id, date_for, force_update=False):
     """Collect metrics for the given site and date
+
+    If the `DAILY_METRICS_BULK_CDM` Figures setting is True, the site's
+    CourseDailyMetrics records are collected with grouped queries and written
+    together by `SiteCourseDailyMetricsLoader` instead of one course at a time.
+    If the bulk load fails, the courses are loaded one at a time
     """
     try:
         site = Site.objects.get(id=site_id)
@@ -101,27 +185,34 @@ def populate_daily_metrics_for_site(site_id, date_for, force_update=False):
         logger.exception(msg.format(prefix=FPD_LOG_PREFIX, site_id=site_id))
         raise e
 
-    for course_id in site_course_ids(site):
-        try:
-            populate_single_cdm(course_id=course_id,
-                                date_for=date_for,
-                                force_update=force_update)
-        except Exception as e:  # pylint: disable=broad-except
-            msg = ('{prefix}:SITE:COURSE:FAIL:populate_daily_metrics_for_site.'
-                   ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
-                   ' exception:{exception}')
-            logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
-                                        site_id=site_id,
-                                        date_for=date_for,
-                                        course_id=str(course_id),
-                                        exception=e))
+    if not (daily_metrics_bulk_cdm() and bulk_load_cdms(site=site,
+                                                        date_for=date_for,
+                                                        force_update=force_update)):
+        for course_id in site_course_ids(site):
+            try:
+                populate_single_cdm(course_id=course_id,
+                                    date_for=date_for,
+                                    force_update=force_update)
+            except Exception as e:  # pylint: disable=broad-except
+                msg = ('{prefix}:SITE:COURSE:FAIL:populate_daily_metrics_for_site.'
+                       ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
+                       ' exception:{exception}')
+                logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                            site_id=site_id,
+                                            date_for=date_for,
+                                            course_id=str(course_id),
+                                            exception=e))
     populate_single_sdm(site_id=site.id,
                         date_for=date_for,
                         force_update=force_update)
 
 
+def enrollment_data_incremental():
+    return bool(settings.ENV_TOKENS['FIGURES'].get('ENROLLMENT_DATA_INCREMENTAL', False))
+
+
 @shared_task
-def update_enrollment_data(site_id, **_kwargs):
+def update_enrollment_data(site_id, incremental=None, **_kwargs):
     """
     This can be an expensive task as it iterates over all the enrollments in a
     site
@@ -132,10 +223,20 @@ def update_enrollment_data(site_id, **_kwargs):
     However, we have to ensure that we don't exclude learners who have just
     completed a course and are awaiting post course activities, like being
     awarded a certificate
+
+    If `incremental` is True, only enrollments that changed since the last
+    refresh are updated. See `figures.backfill.refresh_enrollment_data_for_site`
+    If `incremental` is None, the `ENROLLMENT_DATA_INCREMENTAL` Figures setting
+    is used
     """
+    if incremental is None:
+        incremental = enrollment_data_incremental()
     try:
         site = Site.objects.get(id=site_id)
-        results = backfill_enrollment_data_for_site(site)
+        if incremental:
+            results = refresh_enrollment_data_for_site(site)
+        else:
+            results = backfill_enrollment_data_for_site(site)
         if results.get('errors'):
             for rec in results['errors']:
                 logger.error('figures.tasks.update_enrollment_data. Error:{}'.format(rec))
@@ -149,9 +250,47 @@ def update_enrollment_data(site_id, **_kwargs):
         logger.exception(msg)
 
 
+@shared_task
+def backfill_completions(site_id):
+    """Rebuilds the completion fields and counts for the site
+
+    See `figures.backfill.backfill_completions_for_site`
+    """
+    try:
+        site = Site.objects.get(id=site_id)
+        results = backfill_completions_for_site(site)
+        logger.info('figures.tasks.backfill_completions: site_id={}, completed={}'.format(
+            site_id, results['completed']))
+    except Site.DoesNotExist:
+        logger.error(
+            'figures.tasks.backfill_completions: site_id={} does not exist'.format(
+                site_id))
+
+
 # TODO: Sites iterator with entry and exit logging
 
 
+def _daily_metrics_date_for(date_for, today):
+    """Returns the date for which the daily metrics tasks collect data
+
+    Unlike `figures.pipeline.helpers.pipeline_date_for_rule`, this does not
+    set 'date_for' to yesterday. It defaults to today
+
+    Raises `DateForCannotBeFutureError` if 'date_for' is after today
+    """
+    # TODO: Decide if/how we want any special logging if we get an exception
+    # on 'casting' the date_for argument as a datetime.date object
+    if date_for:
+        date_for = as_date(date_for)
+        if date_for > today:
+            msg = '{prefix}:ERROR - Attempted pipeline call with future date: "{date_for}"'
+            raise DateForCannotBeFutureError(msg.format(prefix=FPD_LOG_PREFIX,
+                                                        date_for=date_for))
+    else:
+        date_for = today
+    return date_for
+
+
 @shared_task
 def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
     """Runs Figures daily metrics collection
@@ -183,19 +322,10 @@ def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
     # transform function, like `prev_day`
 
     today = datetime.datetime.utcnow().replace(tzinfo=utc).date()
-    # TODO: Decide if/how we want any special logging if we get an exception
-    # on 'casting' the date_for argument as a datetime.date object
-    if date_for:
-        date_for = as_date(date_for)
-        if date_for > today:
-            msg = '{prefix}:ERROR - Attempted pipeline call with future date: "{date_for}"'
-            raise DateForCannotBeFutureError(msg.format(prefix=FPD_LOG_PREFIX,
-                                                        date_for=date_for))
-        # Don't update enrollment data if we are backfilling (loading data for
-        # previous dates) as it is expensive
-    else:
-        date_for = today
+    date_for = _daily_metrics_date_for(date_for, today)
 
+    # Don't update enrollment data if we are backfilling (loading data for
+    # previous dates) as it is expensive
     do_update_enrollment_data = False if date_for < today else True
     if site_id is not None:
         sites = get_sites_by_id((site_id, ))
@@ -259,58 +389,289 @@ def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
 
 
 #
-# Daily Metrics Experimental Tasks
+# Daily Metrics Distributed Tasks
+#
+# The distributed daily pipeline runs the same work as `populate_daily_metrics`
+# but as a Celery canvas instead of serially in a single worker:
+#
+#   populate_daily_metrics_distributed
+#     -> group of populate_daily_metrics_for_site_distributed (one per site)
+#       -> chord(group of populate_cdms_for_course_ids)(populate_single_sdm)
+#
+# Per site, the course ids are split into at most
+# `DAILY_METRICS_MAX_PARALLEL_COURSE_TASKS` batches. This bounds how many
+# workers a single site can occupy so one large site does not starve the rest.
 #
 
 
-@shared_task
-def experimental_populate_daily_metrics(date_for=None, force_update=False):
-    '''Experimental task to populate daily metrics
+def daily_metrics_max_parallel_course_tasks():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'DAILY_METRICS_MAX_PARALLEL_COURSE_TASKS',
+        DAILY_METRICS_MAX_PARALLEL_COURSE_TASKS))
 
-    WARNING: In Ginkgo devstack, this task tends to gets stuck in the middle of
-    processing course metrics. Not all the courses get processed and the site
-    metrics doesn't get called.
 
-    We're keeping it in the tasks so that we can continue to debug this.
-    Enabling parallel course tasks will improve the pipeline performance
+def daily_metrics_site_time_limit():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'DAILY_METRICS_SITE_TIME_LIMIT',
+        DAILY_METRICS_SITE_TIME_LIMIT))
 
-    '''
-    def include_course(course_overview, threshold=50):
-        '''This function let's us skip over courses with many enrollments, speeding
-        up testing. Do not use for production
-        '''
-        count = CourseEnrollment.objects.filter(course_id=course_overview.id).count()
-        return False if count > threshold else True
 
-    if date_for:
-        date_for = as_date(date_for)
-    else:
-        date_for = datetime.datetime.utcnow().replace(tzinfo=utc).date()
-    date_for = date_for.strftime("%Y-%m-%d")
-    logger.info(
-        'Starting task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
-            date_for))
+def split_course_ids(course_ids, max_batches):
+    """Split the course ids into at most `max_batches` lists
+
+    Course ids are dealt round robin so that batches are about the same size
+    """
+    course_ids = list(course_ids)
+    batch_count = max(1, min(max_batches, len(course_ids)))
+    return [course_ids[i::batch_count] for i in range(batch_count) if course_ids[i::batch_count]]
+
+
+@shared_task(bind=True,
+             max_retries=DAILY_METRICS_TASK_MAX_RETRIES,
+             default_retry_delay=DAILY_METRICS_TASK_RETRY_DELAY)
+def populate_cdms_for_course_ids(self, site_id, course_ids, date_for, force_update=False,
+                                 deadline=None):
+    """Populate CourseDailyMetrics records for a batch of courses in a site
+
+    This task is a chord header member of the distributed daily pipeline.
+
+    If the `DAILY_METRICS_BULK_CDM` Figures setting is True, the batch is
+    loaded by `SiteCourseDailyMetricsLoader` first. If that fails, the courses
+    are loaded one at a time.
+
+    `deadline` is the time, in seconds since the epoch, by which all of the
+    site's course tasks must be done. Courses are not started after it.
+
+    Courses that fail are retried, and only the failed course ids are passed to
+    the retry. When the retries are used up or the site time limit is reached
+    we log and return instead of raising. We do this so the chord still calls
+    `populate_single_sdm` for the site, as the serial pipeline does.
+    """
+    failed_course_ids = []
+    remaining = list(course_ids)
+    try:
+        if daily_metrics_bulk_cdm() and bulk_load_cdms(site=Site.objects.get(id=site_id),
+                                                       date_for=date_for,
+                                                       force_update=force_update,
+                                                       course_ids=remaining):
+            return
+        while remaining:
+            if deadline is not None and time.time() >= deadline:
+                raise SoftTimeLimitExceeded()
+            course_id = remaining[0]
+            try:
+                populate_single_cdm(course_id=course_id,
+                                    date_for=date_for,
+                                    force_update=force_update)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:  # pylint: disable=broad-except
+                msg = ('{prefix}:SITE:COURSE:FAIL:populate_cdms_for_course_ids.'
+                       ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
+                       ' exception:{exception}')
+                logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                            site_id=site_id,
+                                            date_for=date_for,
+                                            course_id=str(course_id),
+                                            exception=e))
+                failed_course_ids.append(course_id)
+            remaining.pop(0)
+    except SoftTimeLimitExceeded:
+        msg = ('{prefix}:SITE:TIMEOUT:populate_cdms_for_course_ids.'
+               ' site_id:{site_id}, date_for:{date_for}.'
+               ' skipped course_ids:{course_ids}')
+        logger.error(msg.format(prefix=FPD_LOG_PREFIX,
+                                site_id=site_id,
+                                date_for=date_for,
+                                course_ids=remaining))
+        return
+
+    if failed_course_ids:
+        retry_in_time = deadline is None or (
+            time.time() + self.default_retry_delay < deadline)
+        if self.request.retries < self.max_retries and retry_in_time:
+            raise self.retry(kwargs=dict(site_id=site_id,
+                                         course_ids=failed_course_ids,
+                                         date_for=date_for,
+                                         force_update=force_update,
+                                         deadline=deadline))
+        msg = ('{prefix}:SITE:FAIL:populate_cdms_for_course_ids {reason}.'
+               ' site_id:{site_id}, date_for:{date_for}. course_ids:{course_ids}')
+        logger.error(msg.format(prefix=FPD_LOG_PREFIX,
+                                reason=('retries exhausted' if retry_in_time
+                                        else 'no time left to retry'),
+                                site_id=site_id,
+                                date_for=date_for,
+                                course_ids=failed_course_ids))
+
+
+@shared_task
+def populate_daily_metrics_for_site_distributed(site_id, date_for, force_update=False,
+                                                update_enrollments=False):
+    """Start the daily metrics chord for a site
+
+    Builds a group of `populate_cdms_for_course_ids` tasks for the site's
+    courses, then a chord into `populate_single_sdm`. If `update_enrollments`
+    is True, `update_enrollment_data` is linked to run after the site metrics
+    are collected, as it reads the learner progress the course tasks update.
+
+    The course tasks share a deadline, the site time limit from when the site
+    is queued. Each task stops starting courses once the deadline passes, and
+    its soft time limit stops a task that runs for longer than the site time
+    limit. Either way the task logs which courses were skipped and returns so
+    the chord can complete.
+    """
+    try:
+        site = Site.objects.get(id=site_id)
+    except Site.DoesNotExist as e:
+        msg = ('{prefix}:SITE:FAIL:populate_daily_metrics_for_site_distributed:'
+               'site_id: {site_id} does not exist')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX, site_id=site_id))
+        raise e
+
+    date_for = str(as_date(date_for))
+    time_limit = daily_metrics_site_time_limit()
+    deadline = time.time() + time_limit
+    course_batches = split_course_ids(
+        course_ids=[str(course_id) for course_id in site_course_ids(site)],
+        max_batches=daily_metrics_max_parallel_course_tasks())
 
-    courses = CourseOverview.objects.all()
     cdm_tasks = [
-        populate_single_cdm.s(
-            course_id=six.text_type(course.id),  # noqa: F821
+        populate_cdms_for_course_ids.si(
+            site_id=site.id,
+            course_ids=course_ids,
             date_for=date_for,
-            force_update=force_update) for course in courses if include_course(course)
+            force_update=force_update,
+            deadline=deadline).set(soft_time_limit=time_limit,
+                                   time_limit=time_limit + 60)
+        for course_ids in course_batches
     ]
-    results = chord(cdm_tasks)(populate_single_sdm.s(
-        date_for=date_for, force_update=force_update))
+    sdm_task = populate_single_sdm.si(site_id=site.id,
+                                      date_for=date_for,
+                                      force_update=force_update)
+    if update_enrollments:
+        sdm_task = sdm_task.set(link=update_enrollment_data.si(site_id=site.id))
+
+    msg = '{prefix}:SITE:QUEUED:{id}:{domain} - course tasks:{task_count}'
+    logger.info(msg.format(prefix=FPD_LOG_PREFIX,
+                           id=site.id,
+                           domain=site.domain,
+                           task_count=len(cdm_tasks)))
+    if cdm_tasks:
+        return chord(cdm_tasks)(sdm_task)
+    else:
+        return sdm_task.delay()
+
+
+@shared_task
+def populate_daily_metrics_distributed(site_id=None, date_for=None, force_update=False):
+    """Runs Figures daily metrics collection as a distributed Celery workflow
+
+    This is the distributed counterpart of `populate_daily_metrics`. Instead of
+    processing every site and course in this task, it starts one
+    `populate_daily_metrics_for_site_distributed` task per site. So the
+    pipeline run time scales down as workers are added.
+
+    Enable it in the CeleryBeat schedule by setting
+    ``DAILY_METRICS_DISTRIBUTED`` in the ``FIGURES`` env tokens.
+    """
+    if waffle.switch_is_active(WAFFLE_DISABLE_PIPELINE):
+        logger.warning('Figures pipeline is disabled due to %s being active.',
+                       WAFFLE_DISABLE_PIPELINE)
+        return
+
+    today = datetime.datetime.utcnow().replace(tzinfo=utc).date()
+    date_for = _daily_metrics_date_for(date_for, today)
+    if site_id is not None:
+        sites = get_sites_by_id((site_id, ))
+    else:
+        sites = get_sites()
+
+    msg = '{prefix}:DISTRIBUTED:START:date_for={date_for}, site_count={site_count}'
+    logger.info(msg.format(prefix=FPD_LOG_PREFIX,
+                           date_for=date_for,
+                           site_count=sites.count()))
+
+    all_sites_jobs = group(populate_daily_metrics_for_site_distributed.si(
+        site_id=site.id,
+        date_for=str(date_for),
+        force_update=force_update,
+        update_enrollments=(date_for == today)) for site in sites)
+    return all_sites_jobs.delay()
+
+
+#
+# Enrollment Live Capture
+#
+# When the `ENROLLMENT_DATA_LIVE_CAPTURE` Figures setting is True, the
+# receivers in `figures.signals` call `schedule_enrollment_update` for platform
+# enrollment and grade change events. The first event for an enrollment queues
+# an `update_enrollment_live` task to run after the capture delay. Events for
+# the same enrollment until the task starts are coalesced into that task.
+#
+# Course ids are unique across sites, so the user and course identify the
+# (site, user, course) enrollment. The nightly `update_enrollment_data` then
+# only needs to reconcile what live capture missed
+#
+
+
+def enrollment_live_capture_enabled():
+    return bool(settings.ENV_TOKENS['FIGURES'].get('ENROLLMENT_DATA_LIVE_CAPTURE', False))
+
+
+def enrollment_live_capture_delay():
+    return int(settings.ENV_TOKENS['FIGURES'].get(
+        'ENROLLMENT_DATA_LIVE_CAPTURE_DELAY',
+        ENROLLMENT_LIVE_CAPTURE_DELAY))
+
 
-    # TODO: Are we going to update the SDM for the day if
-    # * course records were created, meaning there are data not added to the SDM
-    # * the SDM record already exists
-    # * force_update is not true
+def schedule_enrollment_update(user_id, course_id):
+    """Queue a debounced `update_enrollment_live` task for the enrollment
 
-    logger.info(
-        'Finished task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
-            date_for))
+    Returns True if a task was queued, False if one is already pending
+    """
+    delay = enrollment_live_capture_delay()
+    cache_key = ENROLLMENT_LIVE_CAPTURE_KEY.format(user_id=user_id, course_id=str(course_id))
+    # The key times out in case the task is lost so later events queue again
+    if not cache.add(cache_key, True, delay * 2):
+        return False
+    update_enrollment_live.apply_async(
+        kwargs=dict(user_id=user_id, course_id=str(course_id)),
+        countdown=delay)
+    return True
 
-    return results
+
+@shared_task
+def update_enrollment_live(user_id, course_id):
+    """Capture progress and refresh EnrollmentData for a single enrollment
+
+    Saves the learner's current progress as the LearnerCourseGradeMetrics
+    record for today, then updates the EnrollmentData record from it
+    """
+    # Events from here on need a new update
+    cache.delete(ENROLLMENT_LIVE_CAPTURE_KEY.format(user_id=user_id, course_id=course_id))
+    try:
+        site = get_site_for_course(course_id)
+        if not site:
+            msg = '{prefix}:ENROLLMENT:SKIP no site for course "{course_id}"'
+            logger.warning(msg.format(prefix=FPL_LOG_PREFIX, course_id=course_id))
+            return
+        course_enrollment = CourseEnrollment.objects.select_related('user').get(
+            user_id=user_id, course_id=as_course_key(course_id))
+        capture_enrollment_metrics(site=site,
+                                   course_enrollment=course_enrollment,
+                                   date_for=datetime.datetime.utcnow().replace(
+                                       tzinfo=utc).date())
+        EnrollmentData.objects.set_enrollment_data(site=site,
+                                                   user=course_enrollment.user,
+                                                   course_id=course_id,
+                                                   course_enrollment=course_enrollment)
+    except CourseEnrollment.DoesNotExist:
+        msg = '{prefix}:ENROLLMENT:SKIP no enrollment user_id={user_id}, course_id="{course_id}"'
+        logger.warning(msg.format(prefix=FPL_LOG_PREFIX, user_id=user_id, course_id=course_id))
+    except Exception:  # pylint: disable=broad-except
+        msg = '{prefix}:ENROLLMENT:FAIL user_id={user_id}, course_id="{course_id}"'
+        logger.exception(msg.format(prefix=FPL_LOG_PREFIX, user_id=user_id, course_id=course_id))
 
 
 #
@@ -346,21 +707,20 @@ def populate_mau_metrics_for_site(site_id, month_for=None, force_update=False):
     """
     Collect (save) MAU metrics for the specified site
 
-    Iterates over all courses in the site to collect MAU counts
+    Collects the MAU counts of all courses in the site with one grouped query
     TODO: Decide how sites would be excluded and create filter
-    TODO: Check results of 'store_mau_metrics' to log unexpected results
     """
+    if month_for:
+        month_for = as_date(month_for)
+    else:
+        month_for = datetime.datetime.utcnow().date()
     site = Site.objects.get(id=site_id)
-    msg = 'Starting figures'
-    logger.info(msg)
-    for course_id in site_course_ids(site):
-        # 'course_id' should be string and not a CourseKey
-        # However, we cast to 'str' so that this function doesn't care whether
-        # the course identifier is a CourseKey type or a string
-        populate_course_mau(site_id=site_id,
-                            course_id=str(course_id),
-                            month_for=month_for,
-                            force_update=force_update)
+    msg = 'Ran populate_mau_metrics_for_site. [{}]:{}'
+    with log_exec_time(msg.format(site.id, site.domain)):
+        collect_site_course_mau(site=site,
+                                month_for=month_for,
+                                overwrite=force_update)
+    bump_data_generation(site_id)
 
 
 @shared_task
@@ -382,6 +742,7 @@ def populate_monthly_metrics_for_site(site_id):
         msg = 'Ran populate_monthly_metrics_for_site. [{}]:{}'
         with log_exec_time(msg.format(site.id, site.domain)):
             fill_last_smm_month(site=site)
+        bump_data_generation(site_id)
     except Site.DoesNotExist:
         msg = '{prefix}:SITE:ERROR: site_id:{site_id} Site does not exist'
         logger.error(msg.format(prefix=FPM_LOG_PREFIX, site_id=site_id))
@@ -403,3 +764,24 @@ def run_figures_monthly_metrics():
     logger.info('Starting figures.tasks.run_figures_monthly_metrics...')
     all_sites_jobs = group(populate_monthly_metrics_for_site.s(site.id) for site in get_sites())
     all_sites_jobs.delay()
+
+
+@shared_task
+def generate_report(report_job_id):
+    """Builds the report file for a report job. See `figures.reports`
+    """
+    try:
+        report_job = ReportJob.objects.get(id=report_job_id)
+    except ReportJob.DoesNotExist:
+        msg = '{prefix}:ERROR: report_job_id:{job_id} Report job does not exist'
+        logger.error(msg.format(prefix=FR_LOG_PREFIX, job_id=report_job_id))
+        return
+    try:
+        msg = 'Ran generate_report. [{}]:{}'
+        with log_exec_time(msg.format(report_job.id, report_job.report_type)):
+            build_report(report_job)
+    except Exception as e:  # pylint: disable=broad-except
+        msg = '{prefix}:ERROR: report_job_id:{job_id} Report failed'
+        logger.exception(msg.format(prefix=FR_LOG_PREFIX, job_id=report_job_id))
+        ReportJob.objects.filter(id=report_job_id).update(status=ReportJob.FAILED,
+                                                          error_message=str(e))
@@ -123,6 +123,11 @@ router.register(
     views.LearnerMetricsViewSetV2,
     base_name='learner-metrics')
 
+router.register(
+    r'reports',
+    views.ReportJobViewSet,
+    base_name='reports')
+
 urlpatterns = [
 
     # UI Templates
@@ -4,22 +4,23 @@
 from __future__ import absolute_import
 from datetime import datetime
 import logging
+import os
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
 import django.contrib.sites.shortcuts
 from django.contrib.sites.models import Site
-from django.http import HttpResponseRedirect
+from django.http import FileResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.csrf import ensure_csrf_cookie
 
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.authentication import (
     SessionAuthentication,
     TokenAuthentication,
 )
 from rest_framework.decorators import detail_route, list_route
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework.filters import (
@@ -38,7 +39,21 @@ except ImportError:
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 
+from figures.caching import (
+    CachedResponseMixin,
+    DataGenerationMixin,
+    cache_response,
+)
 from figures.compat import CourseEnrollment, CourseOverview
+from figures.export import (
+    CSV_FORMAT,
+    ENROLLMENT_METRICS_CSV_FIELDS,
+    EXPORT_FORMATS,
+    LEARNER_CSV_FIELDS,
+    export_response,
+    learner_csv_records,
+    serialized_records,
+)
 from figures.filters import (
     CourseDailyMetricsFilter,
     CourseEnrollmentFilter,
@@ -51,13 +66,16 @@ from figures.filters import (
     UserFilterSet,
 )
 from figures.models import (
+    CourseCompletionCount,
     CourseDailyMetrics,
     CourseMauMetrics,
     LearnerCourseGradeMetrics,
+    ReportJob,
     SiteDailyMetrics,
     SiteMauMetrics,
 )
 from figures.query import site_users_enrollment_data
+from figures.storage import report_is_ready, report_storage
 from figures.serializers import (
     CourseCompletedSerializer,
     CourseDailyMetricsSerializer,
@@ -72,6 +90,7 @@ from figures.serializers import (
     LearnerDetailsSerializer,
     LearnerMetricsSerializer,
     LearnerMetricsSerializerV2,
+    ReportJobSerializer,
     SiteDailyMetricsSerializer,
     SiteMauMetricsSerializer,
     SiteMauLiveMetricsSerializer,
@@ -82,12 +101,14 @@ from figures.serializers import (
 )
 from figures import metrics
 from figures.pagination import (
+    FiguresCursorPagination,
     FiguresLimitOffsetPagination,
     FiguresKiloPagination,
 )
 import figures.permissions
 import figures.helpers
 import figures.sites
+import figures.tasks
 from figures.mau import (
     retrieve_live_course_mau_data,
     retrieve_live_site_mau_data,
@@ -145,6 +166,76 @@ class CommonAuthMixin(object):
     )
 
 
+class MonthsBackMixin(object):
+    """Provides the `months_back` query parameter for the history endpoints
+
+    Values above `metrics.history_max_months_back()` are reduced to it
+    """
+    default_months_back = 6
+
+    def get_months_back(self):
+        months_back = self.request.query_params.get('months_back')
+        if months_back is None:
+            return self.default_months_back
+        try:
+            months_back = int(months_back)
+        except ValueError:
+            raise ValidationError({'months_back': 'must be an integer'})
+        if months_back < 1:
+            raise ValidationError({'months_back': 'must be at least 1'})
+        return min(months_back, metrics.history_max_months_back())
+
+
+class CursorPaginationMixin(object):
+    """Lets the client choose cursor pagination with `pagination=cursor`
+
+    Without the query parameter, the viewset's `pagination_class` is used so
+    existing clients are not affected. See `FiguresCursorPagination`
+    """
+    cursor_pagination_class = FiguresCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super(CursorPaginationMixin, self).paginator
+        return self._paginator
+
+
+class ExportMixin(object):
+    """Adds an `export` action that streams every filtered record
+
+    The `export_format` query parameter selects `csv` (the default) or
+    `ndjson`. Pagination is not applied. See `figures.export`
+    """
+    export_filename = None
+    export_csv_fields = None
+
+    def export_csv_records(self, records):
+        """Override to reshape serialized records into CSV rows
+        """
+        return records
+
+    @list_route()
+    def export(self, request):
+        export_format = request.query_params.get('export_format', CSV_FORMAT)
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': 'must be one of {}'.format(
+                ', '.join(sorted(EXPORT_FORMATS)))})
+        queryset = self.filter_queryset(self.get_queryset())
+        records = serialized_records(queryset=queryset,
+                                     serializer_class=self.get_serializer_class(),
+                                     context=self.get_serializer_context())
+        if export_format == CSV_FORMAT:
+            records = self.export_csv_records(records)
+        return export_response(records=records,
+                               export_format=export_format,
+                               filename=self.export_filename,
+                               csv_fields=self.export_csv_fields)
+
+
 class StaffUserOnDefaultSiteAuthMixin(object):
     '''Provides a common authorization base for the Figures API views
     TODO: Consider moving this to figures.permissions
@@ -261,7 +352,8 @@ class CourseEnrollmentViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class CourseDailyMetricsViewSet(CommonAuthMixin, viewsets.ModelViewSet):
+class CourseDailyMetricsViewSet(CommonAuthMixin, CachedResponseMixin, DataGenerationMixin,
+                                viewsets.ModelViewSet):
 
     model = CourseDailyMetrics
     pagination_class = FiguresLimitOffsetPagination
@@ -275,7 +367,8 @@ class CourseDailyMetricsViewSet(CommonAuthMixin, viewsets.ModelViewSet):
         return queryset
 
 
-class SiteDailyMetricsViewSet(CommonAuthMixin, viewsets.ModelViewSet):
+class SiteDailyMetricsViewSet(CommonAuthMixin, CachedResponseMixin, DataGenerationMixin,
+                              viewsets.ModelViewSet):
 
     model = SiteDailyMetrics
     pagination_class = FiguresLimitOffsetPagination
@@ -312,6 +405,7 @@ class GeneralSiteMetricsView(CommonAuthMixin, APIView):
         '''
         return metrics.get_monthly_site_metrics
 
+    @cache_response
     def get(self, request, format=None):  # pylint: disable=redefined-builtin
         '''
         Does not yet support multi-tenancy
@@ -446,7 +540,8 @@ class LearnerMetricsViewSetV1(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return context
 
 
-class LearnerMetricsViewSetV2(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class LearnerMetricsViewSetV2(CommonAuthMixin, CursorPaginationMixin, ExportMixin,
+                              viewsets.ReadOnlyModelViewSet):
     """Provides user identity and nested enrollment data
 
     Version 2 of this viewset. We'll remove the old view
@@ -467,6 +562,13 @@ class LearnerMetricsViewSetV2(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
     ordering_fields = [
         'username', 'email', 'profile__name', 'is_active', 'date_joined'
     ]
+    # Default ordering. Cursor pagination needs a stable ordering
+    ordering = ('id',)
+    export_filename = 'learner-metrics'
+    export_csv_fields = LEARNER_CSV_FIELDS
+
+    def export_csv_records(self, records):
+        return learner_csv_records(records)
 
     def query_param_course_ids(self):
         """Returns list of formatted course ids or empty list
@@ -504,7 +606,8 @@ class LearnerMetricsViewSetV2(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return context
 
 
-class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class EnrollmentMetricsViewSet(CommonAuthMixin, CursorPaginationMixin, ExportMixin,
+                               viewsets.ReadOnlyModelViewSet):
     """Initial viewset for enrollment metrics
 
     Initial purpose to serve up course progress and completion data
@@ -519,6 +622,8 @@ class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
     # Assess updating to "EnrollmentFilterSet" to filter on list of courses and
     # or users, so we can use it to build a filterable table of users, courses
     filter_class = EnrollmentMetricsFilter
+    export_filename = 'enrollment-metrics'
+    export_csv_fields = ENROLLMENT_METRICS_CSV_FIELDS
 
     def get_queryset(self):
         site = django.contrib.sites.shortcuts.get_current_site(self.request)
@@ -536,6 +641,9 @@ class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         """
         site = django.contrib.sites.shortcuts.get_current_site(request)
         qs = self.model.objects.completed_ids_for_site(site=site)
+        if isinstance(self.paginator, FiguresLimitOffsetPagination):
+            # The completion counts save counting the completed enrollments
+            self.paginator.known_count = CourseCompletionCount.objects.site_count(site)
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = CourseCompletedSerializer(page, many=True)
@@ -562,12 +670,10 @@ class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
+class CourseMonthlyMetricsViewSet(CommonAuthMixin, MonthsBackMixin, viewsets.GenericViewSet):
 
     lookup_value_regex = settings.COURSE_ID_PATTERN
-    # TODO: Make 'months_back' be a query parameter.
-    # We will also need to either set a limit or paginate history results
-    months_back = 6
+    pagination_class = FiguresLimitOffsetPagination
 
     def site_course_helper(self, pk):
         """Hep
@@ -593,7 +699,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
 
     def historic_data(self, site, course_id, func, **_kwargs):
         date_for = _kwargs.get('date_for', datetime.utcnow().date())
-        months_back = _kwargs.get('months_back', self.months_back)
+        months_back = _kwargs.get('months_back', self.get_months_back())
         return get_course_history_metric(
             site=site,
             course_id=course_id,
@@ -604,20 +710,24 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
 
     def list(self, request):
         """
-        Returns site metrics data for current month
+        Returns course metrics data for current month for the site's courses
+
+        We paginate the course keys, then retrieve the metrics for the page of
+        courses in batch
 
         TODO: NEXT Add query params to get data from previous months
-        TODO: Add paginagation
         """
         site = django.contrib.sites.shortcuts.get_current_site(request)
         course_keys = figures.sites.get_course_keys_for_site(site)
         date_for = datetime.utcnow().date()
         month_for = '{}/{}'.format(date_for.month, date_for.year)
-        data = []
-        for course_key in course_keys:
-            data.append(metrics.get_month_course_metrics(site=site,
-                                                         course_id=str(course_key),
-                                                         month_for=month_for))
+        page = self.paginate_queryset(course_keys)
+        data = metrics.get_month_course_metrics_for_courses(
+            site=site,
+            course_ids=page if page is not None else course_keys,
+            month_for=month_for)
+        if page is not None:
+            return self.get_paginated_response(data)
         return Response(data)
 
     def retrieve(self, request, **kwargs):  # pylint: disable=unused-argument
@@ -637,7 +747,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
     def active_users(self, request, **kwargs):  # pylint: disable=unused-argument
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
         active_users = metrics.get_course_mau_history_metrics(
             site=site,
             course_id=course_id,
@@ -688,24 +798,21 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
 
-class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
+class SiteMonthlyMetricsViewSet(CommonAuthMixin, MonthsBackMixin, viewsets.ViewSet):
     """Serves sitewide metrics
 
     TODO:
-    * Make months_back be a query param.
     * Create a decorator to do the duplicate work in these methods
     * Improve test coverage
     * Create viewsets for `SiteMetricsViewSet`, `UserMetricsViewSet`
     #   `CourseMetricsViewSet` for retrieving live data for each context
 
     ## Dev note
-    Does it benefit to make serializers for these calls?
-    Do we want to create a SiteMonthlyMetrics model?
-    If we do, then we can also use django-filter on the model
-    Tradeoff: Additional storage cost to reduced request time
-    Perhaps we make this a server setting
+    The monthly values are read from the `SiteMonthlyMetrics` rollup the
+    pipeline maintains. Months that have not been rolled up are calculated
     """
 
+    @cache_response
     def list(self, request):
         """
         Returns site metrics data for current month
@@ -716,12 +823,14 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def registered_users(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
 
-        registered_users = metrics.get_monthly_history_metric(
+        registered_users = metrics.get_monthly_rollup_history_metric(
+            field='registered_users',
             func=metrics.get_total_site_users_for_time_period,
             site=site,
             date_for=date_for,
@@ -731,15 +840,17 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def new_users(self, request):
         """
         TODO: Rename the metrics module function to "new_users" to match this
         """
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
 
-        new_users = metrics.get_monthly_history_metric(
+        new_users = metrics.get_monthly_rollup_history_metric(
+            field='new_users',
             func=metrics.get_total_site_users_joined_for_time_period,
             site=site,
             date_for=date_for,
@@ -749,12 +860,14 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def course_completions(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
 
-        course_completions = metrics.get_monthly_history_metric(
+        course_completions = metrics.get_monthly_rollup_history_metric(
+            field='course_completions',
             func=metrics.get_total_course_completions_for_time_period,
             site=site,
             date_for=date_for,
@@ -764,12 +877,14 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def course_enrollments(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
 
-        course_enrollments = metrics.get_monthly_history_metric(
+        course_enrollments = metrics.get_monthly_rollup_history_metric(
+            field='course_enrollments',
             func=metrics.get_total_enrollments_for_time_period,
             site=site,
             date_for=date_for,
@@ -779,12 +894,14 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def site_courses(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
-        months_back = 6
+        months_back = self.get_months_back()
 
-        site_courses = metrics.get_monthly_history_metric(
+        site_courses = metrics.get_monthly_rollup_history_metric(
+            field='site_courses',
             func=metrics.get_total_site_courses_for_time_period,
             site=site,
             date_for=date_for,
@@ -794,9 +911,10 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response
     def active_users(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
-        months_back = 6
+        months_back = self.get_months_back()
         active_users = metrics.get_site_mau_history_metrics(site=site,
                                                             months_back=months_back)
         return Response(dict(active_users=active_users))
@@ -864,7 +982,7 @@ class SiteMauLiveMetricsViewSet(CommonAuthMixin, viewsets.GenericViewSet):
         return Response(serializer.data)
 
 
-class CourseMauMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class CourseMauMetricsViewSet(CommonAuthMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     model = CourseMauMetrics
     serializer_class = CourseMauMetricsSerializer
     filter_backends = (DjangoFilterBackend, )
@@ -877,7 +995,7 @@ class CourseMauMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class SiteMauMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class SiteMauMetricsViewSet(CommonAuthMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
 
     model = SiteMauMetrics
     serializer_class = SiteMauMetricsSerializer
@@ -890,6 +1008,41 @@ class SiteMauMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
+class ReportJobViewSet(CommonAuthMixin, mixins.CreateModelMixin,
+                       viewsets.ReadOnlyModelViewSet):
+    """Starts background reports and provides their status
+
+    POST a `report_type` with optional `file_format` and `params` to queue a
+    report. The response has the job id. Poll the job until its `status` is
+    `complete`, then fetch the file from `download_url`. This is the `download`
+    action, which streams the file from the report storage
+    """
+    model = ReportJob
+    pagination_class = FiguresLimitOffsetPagination
+    serializer_class = ReportJobSerializer
+
+    def get_queryset(self):
+        site = django.contrib.sites.shortcuts.get_current_site(self.request)
+        return ReportJob.objects.filter(site=site)
+
+    def perform_create(self, serializer):
+        site = django.contrib.sites.shortcuts.get_current_site(self.request)
+        report_job = serializer.save(site=site, requested_by=self.request.user)
+        figures.tasks.generate_report.delay(report_job.id)
+
+    @detail_route()
+    def download(self, request, pk=None):
+        # `get_object` only finds the current site's reports
+        report_job = self.get_object()
+        if not report_is_ready(report_job):
+            raise NotFound()
+        response = FileResponse(report_storage().open(report_job.file_name),
+                                content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            os.path.basename(report_job.file_name))
+        return response
+
+
 class SiteViewSet(StaffUserOnDefaultSiteAuthMixin, viewsets.ReadOnlyModelViewSet):
     """Provides API access to the django.contrib.sites.models.Site model
 
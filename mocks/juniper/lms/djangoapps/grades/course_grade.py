@@ -4,6 +4,8 @@
 from __future__ import absolute_import
 from collections import OrderedDict
 
+SECTION_KEY = u'block-v1:edX+DemoX+Demo_Course+type@sequential+block@section{}'
+
 
 class MockAggregatedScore(object):
     '''
@@ -29,6 +31,7 @@ class MockSubsectionGrade(object):
     '''
     def __init__(self, **kwargs):
         self.problem_scores = OrderedDict()
+        self.location = kwargs.get('location', None)
         self.all_total = MockAggregatedScore(
             tw_earned=kwargs.get('tw_earned', 0.0),
             tw_possible=kwargs.get('tw_possible', 0.0)
@@ -60,18 +63,18 @@ def create_chapter_grades():
     return OrderedDict(
         alpha=dict(
             sections=[
-                MockSubsectionGrade(tw_earned=0.0, tw_possible=0.0),
-                MockSubsectionGrade(tw_earned=0.0,tw_possible=0.5),
-                MockSubsectionGrade(tw_earned=0.5,tw_possible=1.0),
+                MockSubsectionGrade(tw_earned=0.0, tw_possible=0.0, location=SECTION_KEY.format(1)),
+                MockSubsectionGrade(tw_earned=0.0,tw_possible=0.5, location=SECTION_KEY.format(2)),
+                MockSubsectionGrade(tw_earned=0.5,tw_possible=1.0, location=SECTION_KEY.format(3)),
             ],
             url_name=u'ec7e84694fca2d073731a462a5916a7a',
             display_name=u'Module 1 - Overview',
         ),
         bravo=dict(
             sections=[
-                MockSubsectionGrade(),
-                MockSubsectionGrade(),
-                MockSubsectionGrade(),
+                MockSubsectionGrade(location=SECTION_KEY.format(4)),
+                MockSubsectionGrade(location=SECTION_KEY.format(5)),
+                MockSubsectionGrade(location=SECTION_KEY.format(6)),
             ],
             url_name=u'2f43c0b7da59ed40156155f9a8ca4d40',
             display_name=u'Module 2 - First Principles',
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.24 on 2026-10-17 18:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import opaque_keys.edx.django.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersistentSubsectionGrade',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('user_id', models.IntegerField()),
+                ('course_id', opaque_keys.edx.django.models.CourseKeyField(max_length=255)),
+                ('usage_key', models.CharField(max_length=255)),
+                ('earned_all', models.FloatField()),
+                ('possible_all', models.FloatField()),
+                ('earned_graded', models.FloatField()),
+                ('possible_graded', models.FloatField()),
+                ('first_attempted', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('course_id', 'user_id', 'usage_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+'''
+Mocks the persisted grades models in lms.djangoapps.grades.models
+
+Only the fields Figures reads are mocked
+'''
+
+from __future__ import absolute_import
+from django.db import models
+
+from opaque_keys.edx.django.models import CourseKeyField
+
+
+class PersistentSubsectionGrade(models.Model):
+    '''
+    Mocks lms.djangoapps.grades.models.PersistentSubsectionGrade
+
+    The production model uses a 'UsageKeyField' for 'usage_key'. We use a
+    CharField as Figures only compares the string form
+    '''
+    class Meta(object):
+        app_label = 'grades'
+        unique_together = [
+            ('course_id', 'user_id', 'usage_key'),
+        ]
+
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    user_id = models.IntegerField(blank=False)
+    course_id = CourseKeyField(blank=False, max_length=255)
+    usage_key = models.CharField(blank=False, max_length=255)
+
+    earned_all = models.FloatField(blank=False)
+    possible_all = models.FloatField(blank=False)
+    earned_graded = models.FloatField(blank=False)
+    possible_graded = models.FloatField(blank=False)
+
+    first_attempted = models.DateTimeField(null=True, blank=True)
@@ -30,6 +30,9 @@ class MockCourse(object):
     def set_grading_policy(self, grading_policy):
         self.grading_policy = grading_policy
 
+    def get_children(self):
+        return []
+
 
 class MockMixedModulestore(object):
     '''
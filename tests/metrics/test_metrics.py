@@ -44,22 +44,34 @@ from dateutil.rrule import rrule, DAILY
 import pytest
 
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.utils.timezone import utc
 
+from figures.caching import bump_data_generation
 from figures.metrics import (
     get_active_users_for_time_period,
     get_course_average_days_to_complete_for_time_period,
     get_course_average_progress_for_time_period,
     get_course_enrolled_users_for_time_period,
     get_course_num_learners_completed_for_time_period,
+    get_cached_history_metric,
+    get_current_month_site_metrics,
+    get_daily_metrics_history,
+    get_monthly_history_metric,
+    get_month_course_metrics,
+    get_month_course_metrics_for_courses,
+    get_monthly_rollup_history_metric,
     get_monthly_site_metrics,
     get_total_course_completions_for_time_period,
     get_total_enrollments_for_time_period,
     get_total_site_courses_for_time_period,
+    get_total_site_users_for_time_period,
     get_total_site_users_joined_for_time_period,
 
 )
+from figures.bitmaps import UserBitmap
 import figures.helpers
+from figures.models import SiteMonthlyMetrics
 
 from figures.sites import get_organizations_for_site
 
@@ -251,6 +263,132 @@ class TestGetMonthlyActiveUsers(object):
         pass
 
 
+@pytest.mark.django_db
+class TestSiteMonthlyRollup(object):
+    """Tests the site monthly metrics getters that read the monthly rollup
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        cache.clear()
+        self.site = SiteFactory()
+        self.rollup_values = dict(registered_users=10,
+                                  new_users=2,
+                                  site_courses=3,
+                                  course_enrollments=20,
+                                  course_completions=4)
+        self.calls = []
+        yield
+        cache.clear()
+
+    def mock_func(self, site, start_date, end_date):
+        self.calls.append(start_date)
+        return 99
+
+    def test_history_reads_rollup_with_fallback(self):
+        SiteMonthlyMetrics.update_rollup(site=self.site, year=2020, month=2,
+                                         active_user_count=5, **self.rollup_values)
+        # Has only the active user count so the month is not rolled up
+        SiteMonthlyMetrics.add_month(site=self.site, year=2020, month=1,
+                                     active_user_count=6)
+        data = get_monthly_rollup_history_metric(field='registered_users',
+                                                 func=self.mock_func,
+                                                 site=self.site,
+                                                 date_for=datetime.date(2020, 3, 10),
+                                                 months_back=3)
+        assert data['history'] == [
+            dict(period='2020/01', value=99),
+            dict(period='2020/02', value=10),
+            dict(period='2020/03', value=99),
+        ]
+        assert data['current_month'] == 99
+        assert self.calls == [datetime.date(2020, 1, 1), datetime.date(2020, 3, 1)]
+
+    def test_history_caches_fallback_months(self):
+        """Months older than the rollups are calculated once
+        """
+        today = datetime.datetime.utcnow().date()
+        SiteMonthlyMetrics.update_rollup(site=self.site, year=today.year,
+                                         month=today.month, active_user_count=5,
+                                         **self.rollup_values)
+        for _ in range(2):
+            data = get_monthly_rollup_history_metric(field='registered_users',
+                                                     func=self.mock_func,
+                                                     site=self.site,
+                                                     date_for=today,
+                                                     months_back=6)
+            assert [rec['value'] for rec in data['history']] == [99] * 5 + [10]
+        assert len(self.calls) == 5
+
+    def test_current_month_reads_rollup(self, monkeypatch):
+        today = datetime.datetime.utcnow().date()
+        SiteMonthlyMetrics.update_rollup(site=self.site, year=today.year,
+                                         month=today.month, active_user_count=5,
+                                         **self.rollup_values)
+        monkeypatch.setattr('figures.metrics.get_active_users_for_time_period',
+                            self.mock_func)
+        data = get_current_month_site_metrics(site=self.site)
+        expected = dict(self.rollup_values, active_users=5)
+        assert data == expected
+        assert not self.calls
+
+
+@pytest.mark.django_db
+class TestCachedHistoryMetric(object):
+    """Tests closed months are cached and the current month is calculated
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        cache.clear()
+        self.site = SiteFactory()
+        self.calls = []
+        yield
+        cache.clear()
+
+    def metric_func(self, site, start_date, end_date, course_id=None):
+        self.calls.append((start_date, course_id))
+        return start_date.month
+
+    def get_history(self, months_back, course_id=None):
+        return get_cached_history_metric(func=self.metric_func,
+                                         site=self.site,
+                                         date_for=datetime.datetime.utcnow().date(),
+                                         months_back=months_back,
+                                         course_id=course_id)
+
+    def test_caches_closed_months(self):
+        first = self.get_history(months_back=3)
+        assert len(self.calls) == 3
+        self.calls = []
+        second = self.get_history(months_back=3)
+        assert second == first
+        assert [call[0].month for call in self.calls] == [first['current_month']]
+
+    def test_calculates_uncached_months(self):
+        self.get_history(months_back=2)
+        self.calls = []
+        data = self.get_history(months_back=4)
+        assert len(data['history']) == 4
+        assert [rec['value'] for rec in data['history']] == [
+            call[0].month for call in self.calls]
+
+    def test_course_id(self):
+        first = self.get_history(months_back=2, course_id='course-v1:a+b+c')
+        assert all(call[1] == 'course-v1:a+b+c' for call in self.calls)
+        self.calls = []
+        self.get_history(months_back=2, course_id='course-v1:a+b+d')
+        assert len(self.calls) == 2
+        self.calls = []
+        assert self.get_history(months_back=2, course_id='course-v1:a+b+c') == first
+        assert len(self.calls) == 1
+
+    def test_new_data_generation_recalculates(self):
+        self.get_history(months_back=3)
+        self.calls = []
+        bump_data_generation(self.site.id)
+        self.get_history(months_back=3)
+        assert len(self.calls) == 3
+
+
 @pytest.mark.django_db
 class TestSiteMetricsGettersStandalone(object):
     """
@@ -312,6 +450,33 @@ class TestSiteMetricsGettersStandalone(object):
                                                  end_date=end_date)
         assert count == len(sm_in) - 1
 
+    def test_get_active_users_for_time_period_from_bitmaps(self, monkeypatch):
+        start_date = datetime.date(2019, 9, 1)
+        end_date = datetime.date(2019, 9, 3)
+        for i, day in enumerate(rrule(DAILY, dtstart=start_date, until=end_date)):
+            SiteDailyMetricsFactory(site=self.site,
+                                    date_for=day.date(),
+                                    active_users_bitmap=UserBitmap.from_ids(
+                                        [1, 2 + i]).to_string())
+        monkeypatch.setattr('figures.metrics._active_user_ids', None)
+        count = get_active_users_for_time_period(site=self.site,
+                                                 start_date=start_date,
+                                                 end_date=end_date)
+        assert count == 4
+
+    def test_get_active_users_for_time_period_missing_bitmap(self):
+        start_date = datetime.date(2019, 9, 1)
+        end_date = datetime.date(2019, 9, 2)
+        SiteDailyMetricsFactory(site=self.site,
+                                date_for=start_date,
+                                active_users_bitmap=UserBitmap.from_ids([1]).to_string())
+        StudentModuleFactory(modified=figures.helpers.as_datetime(start_date))
+        StudentModuleFactory(modified=figures.helpers.as_datetime(end_date))
+        count = get_active_users_for_time_period(site=self.site,
+                                                 start_date=start_date,
+                                                 end_date=end_date)
+        assert count == 2
+
     def test_get_total_site_users_joined_for_time_period(self):
         '''
         TODO: add users who joined before and after the time period, and
@@ -350,6 +515,25 @@ class TestSiteMetricsGettersStandalone(object):
 
         assert count == self.site_daily_metrics[-1].course_count
 
+    @pytest.mark.parametrize('func', [
+        get_total_site_users_for_time_period,
+        get_total_enrollments_for_time_period,
+        get_total_site_courses_for_time_period,
+    ])
+    def test_get_daily_metrics_history(self, func):
+        """The single pass history matches calling the function for each month
+        """
+        expected = get_monthly_history_metric(
+            func=lambda **kwargs: func(**kwargs),
+            site=self.site,
+            date_for=self.data_end_date,
+            months_back=6)
+        actual = get_daily_metrics_history(func=func,
+                                           site=self.site,
+                                           date_for=self.data_end_date,
+                                           months_back=6)
+        assert actual == expected
+
     def test_get_monthly_site_metrics(self):
         '''
         Since we are testing results for individual getters in other test
@@ -564,6 +748,51 @@ class TestCourseMetricsGettersStandalone(object):
             course_id=self.course_overview.id)
         assert actual == expected
 
+    @pytest.mark.parametrize('func', [
+        get_course_enrolled_users_for_time_period,
+        get_course_average_progress_for_time_period,
+        get_course_average_days_to_complete_for_time_period,
+        get_course_num_learners_completed_for_time_period,
+    ])
+    def test_get_daily_metrics_history(self, func):
+        """The single pass history matches calling the function for each month
+        """
+        course_id = str(self.course_overview.id)
+        expected = get_monthly_history_metric(
+            func=lambda **kwargs: func(course_id=course_id, **kwargs),
+            site=self.site,
+            date_for=self.data_end_date,
+            months_back=6)
+        actual = get_daily_metrics_history(func=func,
+                                           site=self.site,
+                                           date_for=self.data_end_date,
+                                           months_back=6,
+                                           course_id=course_id)
+        assert actual == expected
+        assert any(rec['value'] for rec in actual['history'])
+
+    def test_get_month_course_metrics_for_courses(self):
+        """The batched metrics match the per course metrics
+        """
+        other_course = CourseOverviewFactory()
+        modified = datetime.datetime(2018, 2, 10, tzinfo=utc)
+        sm = StudentModuleFactory(course_id=self.course_overview.id,
+                                  modified=modified)
+        StudentModuleFactory(course_id=self.course_overview.id,
+                             student=sm.student,
+                             modified=modified)
+        StudentModuleFactory(course_id=self.course_overview.id, modified=modified)
+        course_ids = [other_course.id, self.course_overview.id]
+        actual = get_month_course_metrics_for_courses(site=self.site,
+                                                      course_ids=course_ids,
+                                                      month_for='2/2018')
+        expected = [get_month_course_metrics(site=self.site,
+                                             course_id=str(course_id),
+                                             month_for='2/2018')
+                    for course_id in course_ids]
+        assert actual == expected
+        assert actual[1]['active_users'] == 2
+
 
 @pytest.mark.skipif(not organizations_support_sites(),
                     reason='Organizations support sites')
@@ -73,3 +73,24 @@ def test_get_site_mau_history_metrics_basic(db, monkeypatch):
         obj = SiteMonthlyMetrics.objects.get(site=our_site, month_for=month_for)
         assert obj.active_user_count == rec['value']
         assert obj.site == our_site
+
+
+@pytest.mark.django_db
+@freeze_time('2020-06-15')
+def test_get_site_mau_history_metrics_skips_current_month_rollup(db):
+    """The daily rollup creates the current month's record. It must not show
+    up in the history twice
+    """
+    site = SiteFactory()
+    for month, count in [(3, 3), (4, 4), (5, 5), (6, 99)]:
+        SiteMonthlyMetricsFactory(site=site,
+                                  month_for=date(2020, month, 1),
+                                  active_user_count=count)
+    SiteDailyMetricsFactory(site=site, date_for=date(2020, 6, 14), mau=6)
+
+    data = get_site_mau_history_metrics(site=site, months_back=2)
+    assert data == dict(current_month=6, history=[
+        dict(period='2020/04', value=4),
+        dict(period='2020/05', value=5),
+        dict(period='2020/06', value=6),
+    ])
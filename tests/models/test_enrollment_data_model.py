@@ -150,3 +150,35 @@ def test_set_enrollment_data_update_existing(site_data):
         user=ce.user,
         course_id=ce.course_id)
     assert EnrollmentData.objects.count() == 1
+
+
+@pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+def test_bulk_set_enrollment_data(site_data, monkeypatch):
+    """Test we create new and update existing records in bulk
+    """
+    site = site_data['site']
+    lcgm = site_data['lcgm'][0]
+    course_id = lcgm.course_id
+    enrollments = [ce for ce in site_data['enrollments'] if str(ce.course_id) == course_id]
+    ce_other = CourseEnrollmentFactory(course_id=enrollments[0].course_id)
+    EnrollmentDataFactory(site=site,
+                          course_id=course_id,
+                          user=lcgm.user,
+                          sections_worked=0)
+    progress = dict(points_possible=10, points_earned=5, sections_worked=1, count=4)
+    monkeypatch.setattr('figures.models.bulk_progress_data',
+                        lambda course_id, user_ids: {user_id: progress for user_id in user_ids})
+
+    results = EnrollmentData.objects.bulk_set_enrollment_data(
+        site=site,
+        course_id=course_id,
+        course_enrollments=enrollments + [ce_other])
+
+    assert len(results) == len(enrollments) + 1
+    assert EnrollmentData.objects.count() == len(enrollments) + 1
+    updated = EnrollmentData.objects.get(user=lcgm.user)
+    assert updated.sections_worked == lcgm.sections_worked
+    assert [created for obj, created in results if obj.user_id == lcgm.user_id] == [False]
+    created = EnrollmentData.objects.get(user=ce_other.user)
+    assert created.sections_possible == 4
+    assert created.progress_percent == 0.25
@@ -7,7 +7,7 @@ import pytest
 from django.contrib.sites.models import Site
 from django.db.models.query import QuerySet
 from figures.helpers import as_date
-from figures.models import LearnerCourseGradeMetrics
+from figures.models import CourseCompletionCount, LearnerCourseGradeMetrics
 
 from tests.factories import (
     CourseEnrollmentFactory,
@@ -95,6 +95,160 @@ def test_latest_lcgm_with_data(db):
     assert obj == newer_lcgm
 
 
+def test_latest_lcgm_for_enrollments(db):
+    """The most recent record for each enrollment is keyed on user id and
+    course id string. Records of other learners on the same dates are ignored
+    """
+    enrollments = [CourseEnrollmentFactory() for _ in range(3)]
+    expected = {}
+    for enrollment in enrollments[:2]:
+        course_id = str(enrollment.course_id)
+        LearnerCourseGradeMetricsFactory(user=enrollment.user,
+                                         course_id=course_id,
+                                         date_for=as_date('2020-02-02'))
+        expected[(enrollment.user.id, course_id)] = LearnerCourseGradeMetricsFactory(
+            user=enrollment.user,
+            course_id=course_id,
+            date_for=as_date('2020-04-01'))
+    LearnerCourseGradeMetricsFactory(user=enrollments[2].user,
+                                     course_id=str(enrollments[0].course_id),
+                                     date_for=as_date('2020-04-01'))
+    actual = LearnerCourseGradeMetrics.objects.latest_lcgm_for_enrollments(enrollments)
+    assert actual == expected
+    assert LearnerCourseGradeMetrics.objects.latest_lcgm_for_enrollments([]) == {}
+
+
+def test_is_latest_moves_to_newest_record(db):
+    """Saving a newer record moves the flag to it. Saving an older record, as a
+    backfill does, leaves the flag on the newer record
+    """
+    user = UserFactory()
+    course_id = str(CourseOverviewFactory().id)
+    first = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                             date_for=as_date('2020-02-02'))
+    assert first.is_latest
+    second = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                              date_for=as_date('2020-04-01'))
+    older = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                             date_for=as_date('2020-01-01'))
+    other_course = LearnerCourseGradeMetricsFactory(user=user,
+                                                    date_for=as_date('2020-01-01'))
+    latest = LearnerCourseGradeMetrics.objects.filter(is_latest=True)
+    assert set(latest) == set([second, other_course])
+    assert not older.is_latest
+    # Updating the latest record keeps the flag
+    second.points_earned = 10
+    second.save()
+    assert set(latest) == set([second, other_course])
+
+
+def test_most_recent_for_course_and_site(db):
+    site = SiteFactory()
+    course_id = str(CourseOverviewFactory().id)
+    expected = []
+    for user in [UserFactory() for _ in range(2)]:
+        LearnerCourseGradeMetricsFactory(site=site, user=user, course_id=course_id,
+                                         date_for=as_date('2020-02-02'))
+        expected.append(LearnerCourseGradeMetricsFactory(
+            site=site, user=user, course_id=course_id, date_for=as_date('2020-04-01')))
+    LearnerCourseGradeMetricsFactory(site=site, date_for=as_date('2020-01-01'))
+    assert set(LearnerCourseGradeMetrics.objects.most_recent_for_course(
+        course_id)) == set(expected)
+    assert set(LearnerCourseGradeMetrics.objects.most_recent_for_site(
+        site, course_ids=[course_id])) == set(expected)
+    assert LearnerCourseGradeMetrics.objects.most_recent_for_site(site).count() == 3
+
+
+def test_set_latest_flags(db):
+    """The flags are rebuilt from the dates after a bulk write
+    """
+    user = UserFactory()
+    course_id = str(CourseOverviewFactory().id)
+    older = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                             date_for=as_date('2020-02-02'))
+    newer = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                             date_for=as_date('2020-04-01'))
+    LearnerCourseGradeMetrics.objects.filter(id=newer.id).update(is_latest=False)
+    LearnerCourseGradeMetrics.objects.filter(id=older.id).update(is_latest=True)
+    assert LearnerCourseGradeMetrics.objects.set_latest_flags(course_id=course_id) == 1
+    assert LearnerCourseGradeMetrics.objects.latest_lcgm(user, course_id) == newer
+    assert LearnerCourseGradeMetrics.objects.filter(is_latest=True).count() == 1
+
+
+def test_completion_date_is_carried_forward(db):
+    """The latest record keeps the first completion date even when progress
+    later drops below complete
+    """
+    user = UserFactory()
+    course_id = str(CourseOverviewFactory().id)
+    started = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                               date_for=as_date('2020-02-01'),
+                                               sections_worked=1, sections_possible=2)
+    completed = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                                 date_for=as_date('2020-03-01'),
+                                                 sections_worked=2, sections_possible=2)
+    # Content was added to the course
+    later = LearnerCourseGradeMetricsFactory(user=user, course_id=course_id,
+                                             date_for=as_date('2020-04-01'),
+                                             sections_worked=2, sections_possible=3)
+    assert not started.is_completed and started.date_completed is None
+    assert completed.is_completed
+    assert not later.is_completed
+    assert later.date_completed == as_date('2020-03-01')
+    later.save()
+    later.refresh_from_db()
+    assert later.date_completed == as_date('2020-03-01')
+
+
+def test_set_completion_flags(db):
+    site = SiteFactory()
+    data = create_sample_completed_lcgm(site, user_count=2, course_count=2)
+    LearnerCourseGradeMetrics.objects.update(is_completed=False, date_completed=None)
+    assert not LearnerCourseGradeMetrics.objects.completed_ids_for_site(site)
+    assert LearnerCourseGradeMetrics.objects.set_completion_flags(site=site) == 4
+    assert LearnerCourseGradeMetrics.objects.filter(is_completed=True).count() == 4
+    assert set(LearnerCourseGradeMetrics.objects.filter(
+        date_completed__isnull=False).values_list('date_completed', 'is_latest')) == set(
+        [(as_date('2020-05-05'), True)])
+    assert LearnerCourseGradeMetrics.objects.completed_ids_for_site(site).count() == len(
+        data['users']) * len(data['course_ids'])
+
+
+def test_course_completion_count(db):
+    site = SiteFactory()
+    data = create_sample_completed_lcgm(site, user_count=3, course_count=2)
+    for course_id in data['course_ids']:
+        obj = CourseCompletionCount.objects.update_count(site=site, course_id=course_id)
+        assert obj.completed_count == 3
+    assert CourseCompletionCount.objects.site_count(site) == 6
+    assert CourseCompletionCount.objects.site_count(SiteFactory()) == 0
+
+
+def test_save_counts_new_completions(db):
+    """Saving a record counts the enrollment once, when it first completes
+    """
+    site = SiteFactory()
+    user = UserFactory()
+    course_id = str(CourseOverviewFactory().id)
+    LearnerCourseGradeMetricsFactory(site=site, user=user, course_id=course_id,
+                                     date_for=as_date('2020-02-01'),
+                                     sections_worked=1, sections_possible=2)
+    assert not CourseCompletionCount.objects.filter(course_id=course_id).exists()
+    completed = LearnerCourseGradeMetricsFactory(site=site, user=user, course_id=course_id,
+                                                 date_for=as_date('2020-03-01'),
+                                                 sections_worked=2, sections_possible=2)
+    LearnerCourseGradeMetricsFactory(site=site, user=user, course_id=course_id,
+                                     date_for=as_date('2020-04-01'),
+                                     sections_worked=2, sections_possible=3)
+    completed.save()
+    LearnerCourseGradeMetricsFactory(site=site, course_id=course_id,
+                                     date_for=as_date('2020-04-01'),
+                                     sections_worked=3, sections_possible=3)
+    assert CourseCompletionCount.objects.get(course_id=course_id).completed_count == 2
+    assert CourseCompletionCount.objects.site_count(site) == len(
+        LearnerCourseGradeMetrics.objects.completed_ids_for_site(site))
+
+
 @pytest.mark.django_db
 def test_latest_lcgm_with_empty_table(db):
     """Make sure the query works when there are no models to find
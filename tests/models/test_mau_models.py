@@ -55,6 +55,24 @@ class TestCourseMauMonthlyMetrics(object):
         assert obj3 == obj2
         assert obj3.mau == data['mau']
 
+    @pytest.mark.parametrize('overwrite, expected_mau', [(False, 1), (True, 42)])
+    def test_bulk_save_metrics(self, overwrite, expected_mau):
+        date_for = date(2019, 10, 29)
+        course_id = str(self.course_overview.id)
+        other_course_id = str(CourseOverviewFactory().id)
+        CourseMauMetrics.save_metrics(site=self.site,
+                                      course_id=course_id,
+                                      date_for=date_for,
+                                      data=dict(mau=1))
+        objs = CourseMauMetrics.bulk_save_metrics(
+            site=self.site,
+            date_for=date_for,
+            mau_by_course={course_id: 42, other_course_id: 7},
+            overwrite=overwrite)
+        mau_by_course = {obj.course_id: obj.mau for obj in objs}
+        assert mau_by_course == {course_id: expected_mau, other_course_id: 7}
+        assert CourseMauMetrics.objects.count() == 2
+
     def test_latest_for_course_month(self):
         date_for = date(2019, 10, 29)
         course_id = str(self.course_overview.id)
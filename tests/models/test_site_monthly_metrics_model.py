@@ -36,3 +36,20 @@ class TestSiteDailyMetrics(object):
         assert metrics and created
         assert metrics.month_for == expected_month_for
         assert metrics.active_user_count == rec['active_user_count']
+
+    @pytest.mark.parametrize('overwrite, expected_count', [(False, 1), (True, 5)])
+    def test_add_months(self, overwrite, expected_count):
+        SiteMonthlyMetrics.add_month(site=self.site, year=2020, month=2,
+                                     active_user_count=1)
+        counts = {date(2020, 3, 1): 7, date(2020, 2, 1): 5, date(2020, 1, 1): 0}
+        results = SiteMonthlyMetrics.add_months(site=self.site,
+                                                active_user_counts=counts,
+                                                overwrite=overwrite)
+        assert [(obj.month_for, created) for obj, created in results] == [
+            (date(2020, 1, 1), True),
+            (date(2020, 2, 1), False),
+            (date(2020, 3, 1), True),
+        ]
+        assert results[1][0].active_user_count == expected_count
+        assert results[2][0].active_user_count == 7
+        assert SiteMonthlyMetrics.objects.filter(site=self.site).count() == 3
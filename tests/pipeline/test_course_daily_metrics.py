@@ -14,12 +14,15 @@ from django.core.exceptions import PermissionDenied, ValidationError
 
 from figures.compat import CourseAccessRole, CourseEnrollment
 from figures.helpers import as_datetime, next_day, prev_day
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
 from figures.models import CourseDailyMetrics, PipelineError
 from figures.pipeline import course_daily_metrics as pipeline_cdm
 import figures.sites
 
 from tests.factories import (
     CourseAccessRoleFactory,
+    CourseDailyMetricsFactory,
     CourseEnrollmentFactory,
     CourseOverviewFactory,
     GeneratedCertificateFactory,
@@ -86,12 +89,18 @@ class TestCourseDailyMetricsPipelineFunctions(object):
     def setup(self, db):
         self.today = datetime.date(2018, 6, 1)
         self.course_overview = CourseOverviewFactory()
+        # Fixed enrollment dates so the certificates below are created before
+        # "today" however far the factory sequence has advanced
+        enrolled = [as_datetime(datetime.date(2018, 1, 1) + datetime.timedelta(days=i))
+                    for i in range(4)]
         if OPENEDX_RELEASE == GINKGO:
             self.course_enrollments = [CourseEnrollmentFactory(
-                course_id=self.course_overview.id) for i in range(4)]
+                course_id=self.course_overview.id,
+                created=created) for created in enrolled]
         else:
             self.course_enrollments = [CourseEnrollmentFactory(
-                course=self.course_overview) for i in range(4)]
+                course=self.course_overview,
+                created=created) for created in enrolled]
 
         if organizations_support_sites():
             self.my_site = SiteFactory(domain='my-site.test')
@@ -150,6 +159,33 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             course_id=str(self.course_overview.id), date_for=self.today)
         assert learners.count() == expected_count
 
+    def test_get_enrollment_counts_exclude_admins(self):
+        other_course = CourseOverviewFactory()
+        # An admin in our course is a learner in the other course, and a
+        # learner holds two admin roles in the other course
+        other_learner = self.course_enrollments[0].user
+        other_admin = self.course_enrollments[3].user
+        for user in [other_learner, other_admin]:
+            CourseEnrollmentFactory(course_id=other_course.id,
+                                    user=user,
+                                    created=as_datetime(prev_day(self.today)))
+        for role in ['staff', 'instructor']:
+            CourseAccessRoleFactory(user=other_admin,
+                                    course_id=other_course.id,
+                                    role=role)
+        expected = {
+            str(self.course_overview.id): pipeline_cdm.get_enrolled_in_exclude_admins(
+                course_id=self.course_overview.id, date_for=self.today).count(),
+            str(other_course.id): 1,
+        }
+        assert expected[str(self.course_overview.id)] == 1
+
+        counts = pipeline_cdm.get_enrollment_counts_exclude_admins(
+            site=None,
+            date_for=self.today,
+            course_ids=[self.course_overview.id, str(other_course.id)])
+        assert counts == expected
+
     def test_get_active_learner_ids_today(self):
         """
 
@@ -218,6 +254,55 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             date_for=self.today)
         assert actual == self.expected_avg_cert_days_to_complete
 
+    def test_get_days_to_complete_since(self):
+        since = self.generated_certificates[0].created_date.date()
+        expected = [days for days, cert in zip(self.cert_days_to_complete,
+                                               self.generated_certificates)
+                    if cert.created_date >= as_datetime(next_day(since))]
+        actual = pipeline_cdm.get_days_to_complete(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            since=since)
+        assert actual == dict(days=expected, errors=[])
+
+    def test_get_days_to_complete_missing_enrollment(self):
+        cert = GeneratedCertificateFactory(
+            course_id=self.course_overview.id,
+            created_date=as_datetime(prev_day(self.today)))
+        actual = pipeline_cdm.get_days_to_complete(
+            course_id=self.course_overview.id,
+            date_for=self.today)
+        assert actual['days'] == self.cert_days_to_complete
+        assert [error['user_id'] for error in actual['errors']] == [cert.user.id]
+
+    def test_get_days_to_complete_totals_adds_to_previous(self):
+        since = self.generated_certificates[0].created_date.date()
+        previous_cdm = CourseDailyMetricsFactory(
+            course_id=str(self.course_overview.id),
+            date_for=since,
+            days_to_complete_total=100,
+            days_to_complete_count=2)
+        new_days = pipeline_cdm.get_days_to_complete(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            since=since)['days']
+        actual = pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            previous_cdm=previous_cdm)
+        assert actual == dict(total=100 + sum(new_days), count=2 + len(new_days))
+
+    def test_get_days_to_complete_totals_without_stored_totals(self):
+        previous_cdm = CourseDailyMetricsFactory(
+            course_id=str(self.course_overview.id),
+            date_for=prev_day(self.today))
+        actual = pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            previous_cdm=previous_cdm)
+        assert actual == dict(total=sum(self.cert_days_to_complete),
+                              count=len(self.cert_days_to_complete))
+
     def test_get_num_learners_completed(self):
         actual = pipeline_cdm.get_num_learners_completed(
             course_id=self.course_overview.id,
@@ -248,6 +333,32 @@ class TestCourseDailyMetricsExtractor(object):
         results = pipeline_cdm.CourseDailyMetricsExtractor().extract(
             course_id, self.date_for)
         assert results
+        # Today has not closed, so its active learners are stored on the next run
+        assert 'active_learners_sketch' not in results
+        assert 'active_learners_bitmap' not in results
+
+        results = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+            course_id, prev_day(self.date_for))
+        assert HyperLogLog.from_string(
+            results['active_learners_sketch']).count() == results['active_learners_today']
+        assert len(UserBitmap.from_string(
+            results['active_learners_bitmap'])) == results['active_learners_today']
+
+    def test_extract_adds_to_previous_days_to_complete(self, monkeypatch):
+        course_id = self.course_enrollments[0].course_id
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        CourseDailyMetricsFactory(course_id=str(course_id),
+                                  date_for=prev_day(self.date_for),
+                                  days_to_complete_total=30,
+                                  days_to_complete_count=4)
+
+        results = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+            course_id, self.date_for)
+        assert results['days_to_complete_total'] == 30
+        assert results['days_to_complete_count'] == 4
+        assert results['average_days_to_complete'] == 7.5
 
     def test_when_bulk_calculate_course_progress_data_fails(self,
                                                             monkeypatch,
@@ -350,3 +461,141 @@ class TestCourseDailyMetricsLoader(object):
     @pytest.mark.skip('Implement me!')
     def test_load_force_update(self):
         pass
+
+
+@pytest.mark.django_db
+class TestSiteCourseDailyMetricsLoader(object):
+    """Checks the site level pipeline against the per course extractor
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        # More than a day in the past, so progress is not calculated
+        self.date_for = datetime.date(2020, 3, 10)
+        self.site = SiteFactory()
+        self.courses = [CourseOverviewFactory() for i in range(3)]
+        self.course_ids = [str(course.id) for course in self.courses]
+        enrolled = as_datetime(datetime.date(2020, 1, 1))
+        self.enrollments = [CourseEnrollmentFactory(course_id=self.courses[0].id,
+                                                    created=enrolled) for i in range(3)]
+        self.enrollments.append(CourseEnrollmentFactory(course_id=self.courses[1].id,
+                                                        created=enrolled))
+        CourseAccessRoleFactory(user=self.enrollments[0].user,
+                                course_id=self.courses[0].id,
+                                role='staff')
+        for ce in self.enrollments[:2] + self.enrollments[3:]:
+            StudentModuleFactory(course_id=ce.course_id,
+                                 student=ce.user,
+                                 modified=as_datetime(self.date_for))
+        for ce, days in zip(self.enrollments[1:3], [10, 21]):
+            GeneratedCertificateFactory(user=ce.user,
+                                        course_id=ce.course_id,
+                                        created_date=ce.created + datetime.timedelta(days=days))
+
+    def test_extract_matches_course_extractor(self):
+        data_by_course = pipeline_cdm.SiteCourseDailyMetricsExtractor().extract(
+            site=self.site, date_for=self.date_for, course_ids=self.course_ids)
+        assert set(data_by_course.keys()) == set(self.course_ids)
+        for course_id in self.course_ids:
+            expected = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+                course_id, self.date_for)
+            actual = data_by_course[course_id]
+            assert UserBitmap.from_string(actual.pop('active_learners_bitmap')) == \
+                UserBitmap.from_string(expected.pop('active_learners_bitmap'))
+            assert actual == expected
+
+        assert data_by_course[self.course_ids[0]]['enrollment_count'] == 2
+        assert data_by_course[self.course_ids[0]]['average_days_to_complete'] == 15.5
+        assert data_by_course[self.course_ids[2]]['active_learners_today'] == 0
+
+    def test_load(self):
+        loader = pipeline_cdm.SiteCourseDailyMetricsLoader(self.site)
+        records = loader.load(date_for=self.date_for, course_ids=self.course_ids)
+        assert len(records) == len(self.course_ids)
+        cdms = CourseDailyMetrics.objects.filter(date_for=self.date_for)
+        assert set(cdms.values_list('course_id', flat=True)) == set(self.course_ids)
+        cdm = cdms.get(course_id=self.course_ids[0])
+        assert (cdm.enrollment_count, cdm.active_learners_today, cdm.num_learners_completed,
+                cdm.average_days_to_complete) == (2, 2, 2, 16)
+        assert cdm.site == self.site and cdm.average_progress is None
+
+        # Existing records are kept unless forced
+        assert loader.load(date_for=self.date_for, course_ids=self.course_ids) == []
+        GeneratedCertificateFactory(user=self.enrollments[3].user,
+                                    course_id=self.courses[1].id,
+                                    created_date=as_datetime(self.date_for))
+        records = loader.load(date_for=self.date_for,
+                              course_ids=self.course_ids,
+                              force_update=True)
+        assert len(records) == len(self.course_ids)
+        assert cdms.count() == len(self.course_ids)
+        assert cdms.get(course_id=self.course_ids[1]).num_learners_completed == 1
+
+    def test_load_adds_to_previous_totals(self):
+        CourseDailyMetricsFactory(site=self.site,
+                                  course_id=self.course_ids[0],
+                                  date_for=prev_day(self.date_for),
+                                  days_to_complete_total=40,
+                                  days_to_complete_count=2)
+        pipeline_cdm.SiteCourseDailyMetricsLoader(self.site).load(
+            date_for=self.date_for, course_ids=self.course_ids)
+        cdm = CourseDailyMetrics.objects.get(course_id=self.course_ids[0],
+                                             date_for=self.date_for)
+        # Both certificates were created before the previous record
+        assert (cdm.days_to_complete_total, cdm.days_to_complete_count) == (40, 2)
+        assert cdm.average_days_to_complete == 20
+
+    def test_load_resets_later_totals(self):
+        """Rewriting a record makes the next record read all the certificates
+        """
+        later = CourseDailyMetricsFactory(site=self.site,
+                                          course_id=self.course_ids[0],
+                                          date_for=next_day(self.date_for),
+                                          days_to_complete_total=40,
+                                          days_to_complete_count=2)
+        pipeline_cdm.SiteCourseDailyMetricsLoader(self.site).load(
+            date_for=self.date_for, course_ids=self.course_ids, force_update=True)
+        later.refresh_from_db()
+        assert (later.days_to_complete_total, later.days_to_complete_count) == (None, None)
+        assert later.average_days_to_complete is not None
+
+        totals = pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_ids[0],
+            date_for=next_day(next_day(self.date_for)),
+            previous_cdm=later)
+        assert totals == dict(total=31, count=2)
+
+    def test_load_closes_previous_day(self):
+        """The previous day's active learners are stored once the day has closed
+        """
+        previous = CourseDailyMetricsFactory(site=self.site,
+                                             course_id=self.course_ids[0],
+                                             date_for=prev_day(self.date_for))
+        other = CourseDailyMetricsFactory(site=self.site,
+                                          course_id=self.course_ids[1],
+                                          date_for=prev_day(self.date_for))
+        late = StudentModuleFactory(course_id=self.courses[0].id,
+                                    student=self.enrollments[2].user,
+                                    modified=as_datetime(prev_day(self.date_for)) +
+                                    datetime.timedelta(hours=20))
+        pipeline_cdm.SiteCourseDailyMetricsLoader(self.site).load(
+            date_for=self.date_for, course_ids=self.course_ids)
+        previous.refresh_from_db()
+        other.refresh_from_db()
+        assert list(UserBitmap.from_string(previous.active_learners_bitmap)) == [
+            late.student_id]
+        assert HyperLogLog.from_string(previous.active_learners_sketch).count() == 1
+        # A course without activity gets an empty bitmap
+        assert other.active_learners_bitmap is not None
+        assert not UserBitmap.from_string(other.active_learners_bitmap)
+        cdm = CourseDailyMetrics.objects.get(course_id=self.course_ids[0],
+                                             date_for=self.date_for)
+        assert len(UserBitmap.from_string(cdm.active_learners_bitmap)) == 2
+
+    def test_load_skips_invalid_course(self, monkeypatch):
+        monkeypatch.setattr(pipeline_cdm, 'get_average_progress',
+                            lambda course_id, date_for: (
+                                1.5 if course_id == self.course_ids[0] else 0.5))
+        records = pipeline_cdm.SiteCourseDailyMetricsLoader(self.site).load(
+            date_for=self.date_for, course_ids=self.course_ids)
+        assert set(cdm.course_id for cdm in records) == set(self.course_ids[1:])
+        assert not CourseDailyMetrics.objects.filter(course_id=self.course_ids[0]).exists()
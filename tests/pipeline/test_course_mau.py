@@ -16,6 +16,7 @@ from figures.pipeline.mau_pipeline import (
     calculate_course_mau,
     save_course_mau,
     collect_course_mau,
+    collect_site_course_mau,
 )
 
 from tests.factories import (
@@ -143,6 +144,27 @@ def test_course_mau_etl(simple_mau_test_data):
     assert obj.mau == len(expected_mau_ids)
 
 
+@pytest.mark.django_db
+def test_collect_site_course_mau(monkeypatch, simple_mau_test_data):
+    our_site = simple_mau_test_data['our_site']
+    our_course = simple_mau_test_data['our_course']
+    our_other_course = simple_mau_test_data['our_other_course']
+    monkeypatch.setattr('figures.pipeline.mau_pipeline.get_course_keys_for_site',
+                        lambda site: [our_course.id, our_other_course.id])
+    objs = collect_site_course_mau(site=our_site,
+                                   month_for=simple_mau_test_data['month_for'])
+    mau_by_course = {obj.course_id: obj.mau for obj in objs}
+    # The factory gives the other course's records random modified dates
+    month_for = simple_mau_test_data['month_for']
+    other_course_mau = len(set(
+        sm.student_id for sm in simple_mau_test_data['our_other_course_sm']
+        if (sm.modified.year, sm.modified.month) == (month_for.year, month_for.month)))
+    assert mau_by_course == {
+        str(our_course.id): len(simple_mau_test_data['expected_mau_ids']),
+        str(our_other_course.id): other_course_mau,
+    }
+
+
 @pytest.mark.django_db
 class TestExtractMauData(object):
     """
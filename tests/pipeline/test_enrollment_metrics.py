@@ -6,13 +6,14 @@ import mock
 import pytest
 
 from django.utils.timezone import utc
-from figures.compat import CourseEnrollment, StudentModule
+from figures.compat import StudentModule
 
 from figures.helpers import is_multisite
-from figures.models import LearnerCourseGradeMetrics
+from figures.models import CourseCompletionCount, LearnerCourseGradeMetrics
 from figures.pipeline.enrollment_metrics import (
     calculate_average_progress,
     bulk_calculate_course_progress_data,
+    _bulk_collect_metrics_for_course,
     collect_metrics_for_enrollment,
     _enrollment_metrics_needs_update,
     _new_enrollment_metrics_record,
@@ -41,37 +42,35 @@ if organizations_support_sites():
 def test_bulk_calculate_course_progress_data_happy_path(db, monkeypatch):
     """Tests 'bulk_calculate_course_progress_data' function
 
-    The function under test iterates over a set of course enrollment records,
-    So we create a couple of records to iterate over and mock the collect
-    function
+    We create two enrollments with StudentModule records. One has an up to
+    date LCGM record and the other needs progress data collected
     """
     course_overview = CourseOverviewFactory()
     course_enrollments = [CourseEnrollmentFactory(
         course_id=course_overview.id) for i in range(2)]
-    mapping = {ce.course_id: LearnerCourseGradeMetricsFactory(
-        course_id=str(ce.course_id),
-        user=ce.user,
-        sections_worked=1,
-        sections_possible=2) for ce in course_enrollments
-    }
-    StudentModuleFactory()
-
-    def mock_metrics(course_enrollment, **_kwargs):
-        return mapping[course_enrollment.course_id]
-
+    for ce in course_enrollments:
+        StudentModuleFactory(student=ce.user, course_id=ce.course_id)
+    LearnerCourseGradeMetricsFactory(course_id=str(course_overview.id),
+                                     user=course_enrollments[0].user,
+                                     date_for=date.today(),
+                                     sections_worked=1,
+                                     sections_possible=2)
+    progress_data = dict(points_possible=10, points_earned=5,
+                         sections_worked=1, count=4)
     monkeypatch.setattr('figures.pipeline.enrollment_metrics.get_site_for_course',
                         lambda val: SiteFactory())
-    monkeypatch.setattr('figures.pipeline.enrollment_metrics.collect_metrics_for_enrollment',
-                        mock_metrics)
+    monkeypatch.setattr('figures.pipeline.enrollment_metrics.bulk_progress_data',
+                        lambda **_kwargs: None)
+    monkeypatch.setattr(
+        'figures.pipeline.enrollment_metrics._collect_progress_data_for_learner',
+        lambda **_kwargs: progress_data)
 
-    monkeypatch.setattr('figures.pipeline.enrollment_metrics.course_enrollments_for_course',
-                        lambda val: CourseEnrollment.objects.all())
-    # monkeypatch.setattr('figures.pipeline.enrollment_metrics.student_modules_for_course_enrollment',
-    #                     mock_get_student_modules)
-    monkeypatch.setattr('figures.pipeline.enrollment_metrics.student_modules_for_course_enrollment',
-                        lambda **_kwargs: StudentModule.objects.all())
     data = bulk_calculate_course_progress_data(course_overview.id)
-    assert data['average_progress'] == 0.5
+    assert data['average_progress'] == 0.38
+    assert LearnerCourseGradeMetrics.objects.filter(
+        user=course_enrollments[1].user).count() == 1
+    assert CourseCompletionCount.objects.get(
+        course_id=str(course_overview.id)).completed_count == 0
 
 
 @pytest.mark.skipif(not is_multisite(),
@@ -116,6 +115,141 @@ def test_bulk_calculate_course_progress_no_enrollments(db, monkeypatch):
     assert data['average_progress'] == 0.0
 
 
+@pytest.mark.django_db
+class TestBulkCollectMetricsForCourse(object):
+    """Tests the `_bulk_collect_metrics_for_course` function
+
+    The function under test applies the same update rules as
+    `collect_metrics_for_enrollment` but for all enrollments in a course with a
+    fixed number of queries
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch):
+        self.site = SiteFactory()
+        self.date_for = date(2020, 3, 2)
+        self.sm_modified = datetime(2020, 3, 1, tzinfo=utc)
+        self.course_overview = CourseOverviewFactory()
+        self.collected = []
+        self.progress_data = dict(points_possible=100,
+                                  points_earned=25,
+                                  sections_worked=4,
+                                  count=5)
+
+        def mock_collect(user_id, course_id):
+            self.collected.append(user_id)
+            return self.progress_data
+
+        monkeypatch.setattr('figures.pipeline.enrollment_metrics.bulk_progress_data',
+                            lambda **_kwargs: None)
+        monkeypatch.setattr(
+            'figures.pipeline.enrollment_metrics._collect_progress_data_for_learner',
+            mock_collect)
+
+    def make_enrollment(self, with_sm=True):
+        ce = CourseEnrollmentFactory(course_id=self.course_overview.id)
+        if with_sm:
+            StudentModuleFactory(student=ce.user,
+                                 course_id=ce.course_id,
+                                 modified=self.sm_modified)
+        return ce
+
+    def make_lcgm(self, ce, date_for):
+        return LearnerCourseGradeMetricsFactory(course_id=str(ce.course_id),
+                                                user=ce.user,
+                                                date_for=date_for)
+
+    def call_it(self):
+        return _bulk_collect_metrics_for_course(site=self.site,
+                                                course_id=self.course_overview.id,
+                                                date_for=self.date_for)
+
+    def test_no_student_modules(self):
+        self.make_enrollment(with_sm=False)
+        assert self.call_it() == []
+        assert not self.collected
+
+    def test_needs_update(self):
+        ce_new = self.make_enrollment()
+        ce_stale = self.make_enrollment()
+        self.make_lcgm(ce_stale, self.sm_modified.date() - relativedelta(days=1))
+        metrics = self.call_it()
+        assert set(self.collected) == set([ce_new.user.id, ce_stale.user.id])
+        assert len(metrics) == 2
+        assert LearnerCourseGradeMetrics.objects.filter(
+            date_for=self.date_for,
+            sections_worked=self.progress_data['sections_worked']).count() == 2
+        # The new records replace the stale record as the latest
+        assert set(LearnerCourseGradeMetrics.objects.filter(is_latest=True).values_list(
+            'user_id', 'date_for')) == set((rec.user_id, rec.date_for) for rec in metrics)
+
+    def test_does_not_need_update(self):
+        ce = self.make_enrollment()
+        lcgm = self.make_lcgm(ce, self.sm_modified.date())
+        metrics = self.call_it()
+        assert metrics == [lcgm]
+        assert not self.collected
+
+    def test_updates_existing_record_for_date_for(self):
+        """An interrupted run can leave an LCGM record for `date_for` that is
+        older than the StudentModule
+        """
+        self.sm_modified = datetime(2020, 3, 3, tzinfo=utc)
+        ce = self.make_enrollment()
+        lcgm = self.make_lcgm(ce, self.date_for)
+        metrics = self.call_it()
+        assert metrics == [lcgm]
+        lcgm.refresh_from_db()
+        assert lcgm.sections_worked == self.progress_data['sections_worked']
+        assert LearnerCourseGradeMetrics.objects.count() == 1
+
+    def test_ignores_student_modules_without_enrollment(self):
+        StudentModuleFactory(course_id=self.course_overview.id,
+                             modified=self.sm_modified)
+        assert self.call_it() == []
+
+    def test_uses_bulk_progress_data(self, monkeypatch):
+        """When the course structure cache can provide progress, we don't
+        collect progress per learner
+        """
+        ce = self.make_enrollment()
+        monkeypatch.setattr(
+            'figures.pipeline.enrollment_metrics.bulk_progress_data',
+            lambda course_id, user_ids: {user_id: self.progress_data for user_id in user_ids})
+        metrics = self.call_it()
+        assert not self.collected
+        assert len(metrics) == 1
+        assert metrics[0].user_id == ce.user.id
+        assert metrics[0].sections_possible == self.progress_data['count']
+
+    def test_query_count_is_constant(self, django_assert_max_num_queries):
+        for _ in range(5):
+            self.make_lcgm(self.make_enrollment(), self.sm_modified.date())
+        with django_assert_max_num_queries(3):
+            metrics = self.call_it()
+        assert len(metrics) == 5
+
+
+@pytest.mark.django_db
+def test_latest_lcgm_for_course(db):
+    """Tests `LearnerCourseGradeMetricsManager.latest_lcgm_for_course`
+    """
+    course_overview = CourseOverviewFactory()
+    ces = [CourseEnrollmentFactory(course_id=course_overview.id) for _ in range(2)]
+    expected = {}
+    for i, ce in enumerate(ces):
+        for days in range(3):
+            lcgm = LearnerCourseGradeMetricsFactory(
+                course_id=str(ce.course_id),
+                user=ce.user,
+                date_for=date(2020, 1, 1) + relativedelta(days=days + i))
+        expected[ce.user.id] = lcgm
+    LearnerCourseGradeMetricsFactory(date_for=date(2020, 6, 1))
+    assert LearnerCourseGradeMetrics.objects.latest_lcgm_for_course(
+        course_overview.id) == expected
+    assert LearnerCourseGradeMetrics.objects.latest_lcgm_for_course(
+        course_overview.id, user_ids=[ces[0].user.id]) == {ces[0].user.id: expected[ces[0].user.id]}
+
+
 @pytest.mark.parametrize('progress_percentages, expected_result', [
     (None, 0.0),
     ([], 0.0),
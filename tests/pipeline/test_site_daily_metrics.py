@@ -20,6 +20,8 @@ from django.utils.timezone import utc
 from figures.compat import StudentModule
 
 from figures.helpers import as_datetime, prev_day, days_from, is_multisite
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
 from figures.models import SiteDailyMetrics
 from figures.pipeline import site_daily_metrics as pipeline_sdm
 import figures.sites
@@ -264,12 +266,12 @@ class TestSiteDailyMetricsExtractor(object):
         monkeypatch.setattr(pipeline_sdm, 'get_student_modules_for_site',
                             mock_student_modules_for_site)
 
-        def mock_site_mau_1g_for_month_as_of_day(site, date_for):
+        def mock_site_mau_count_for_month_as_of_day(site, date_for, todays_user_ids=None):
             return get_user_model().objects.filter(
-                id__in=[user.id for user in self.users]).values('id')
+                id__in=[user.id for user in self.users]).count()
 
-        monkeypatch.setattr(pipeline_sdm, 'site_mau_1g_for_month_as_of_day',
-                            mock_site_mau_1g_for_month_as_of_day)
+        monkeypatch.setattr(pipeline_sdm, 'site_mau_count_for_month_as_of_day',
+                            mock_site_mau_count_for_month_as_of_day)
 
         def mock_get_previous_cumulative_active_user_count(site, date_for):
             return previous_cumulative_active_user_count
@@ -288,6 +290,8 @@ class TestSiteDailyMetricsExtractor(object):
 
         for key, value in six.iteritems(expected_results):
             assert actual[key] == value, 'failed on key: "{}"'.format(key)
+        assert HyperLogLog.from_string(actual['active_users_sketch']).count() == 2
+        assert len(UserBitmap.from_string(actual['active_users_bitmap'])) == 2
 
 
 @pytest.mark.django_db
@@ -4,7 +4,7 @@ This is initial test coverage
 
 """
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from django.utils.timezone import utc
 from freezegun import freeze_time
@@ -12,9 +12,17 @@ import pytest
 
 from figures.compat import RELEASE_LINE, StudentModule
 from figures.models import SiteMonthlyMetrics
-from figures.pipeline.site_monthly_metrics import fill_month, fill_last_month
+from figures.pipeline.site_monthly_metrics import (
+    fill_month,
+    fill_last_month,
+    raw_sql_mau_count,
+    raw_sql_mau_counts_by_month,
+    update_month_rollup,
+    update_rollups_for_date,
+)
 
 from tests.factories import (
+    CourseOverviewFactory,
     SiteFactory,
     StudentModuleFactory,
 )
@@ -106,3 +114,110 @@ def test_fill_last_month_wo_overwrite(monkeypatch, smm_test_data):
     assert obj.active_user_count == len(smm_test_data['last_month_sm'])
     assert obj.site == site
     assert obj.month_for == smm_test_data['last_month'].date()
+
+
+@pytest.mark.django_db
+def test_raw_sql_mau_count():
+    """Counts distinct students in the courses over the half open month range
+    """
+    first_day = datetime(2020, 1, 1, tzinfo=utc)
+    in_month = [StudentModuleFactory(modified=first_day),
+                StudentModuleFactory(modified=datetime(2020, 1, 31, 23, 59, 59, tzinfo=utc))]
+    # Same student and course again in the month
+    StudentModuleFactory(student=in_month[0].student,
+                         course_id=in_month[0].course_id,
+                         modified=datetime(2020, 1, 15, tzinfo=utc))
+    StudentModuleFactory(course_id=in_month[0].course_id,
+                         modified=datetime(2020, 2, 1, tzinfo=utc))
+    StudentModuleFactory(course_id=in_month[0].course_id,
+                         modified=first_day - relativedelta(seconds=1))
+    other_course_sm = StudentModuleFactory(modified=first_day)
+
+    course_ids = [sm.course_id for sm in in_month]
+    assert raw_sql_mau_count(course_ids=course_ids, month_for=first_day) == 2
+    assert raw_sql_mau_count(course_ids=course_ids + [other_course_sm.course_id],
+                             month_for=date(2020, 1, 20)) == 3
+    assert raw_sql_mau_count(course_ids=[], month_for=first_day) == 0
+
+
+@pytest.mark.django_db
+def test_raw_sql_mau_counts_by_month():
+    course_sm = StudentModuleFactory(modified=datetime(2020, 1, 31, 23, 59, tzinfo=utc))
+    course_id = course_sm.course_id
+    StudentModuleFactory(student=course_sm.student,
+                         course_id=course_id,
+                         modified=datetime(2020, 1, 2, tzinfo=utc))
+    [StudentModuleFactory(course_id=course_id,
+                          modified=datetime(2020, 3, 1, tzinfo=utc)) for i in range(2)]
+    StudentModuleFactory(course_id=course_id,
+                         modified=datetime(2020, 4, 1, tzinfo=utc))
+    StudentModuleFactory(modified=datetime(2020, 1, 1, tzinfo=utc))
+
+    counts = raw_sql_mau_counts_by_month(course_ids=[course_id],
+                                         end=datetime(2020, 4, 1, tzinfo=utc))
+    assert counts == {date(2020, 1, 1): 1, date(2020, 3, 1): 2}
+    assert raw_sql_mau_counts_by_month(course_ids=[]) == {}
+
+
+@pytest.mark.django_db
+def test_update_month_rollup(monkeypatch):
+    site = SiteFactory()
+    monkeypatch.setattr('figures.pipeline.site_monthly_metrics.ROLLUP_METRICS',
+                        [(field, lambda **kwargs: 7) for field in
+                         SiteMonthlyMetrics.ROLLUP_FIELDS])
+    monkeypatch.setattr(
+        'figures.pipeline.site_monthly_metrics.site_month_active_user_count',
+        lambda **kwargs: 3)
+    SiteMonthlyMetrics.add_month(site=site, year=2020, month=1, active_user_count=1)
+    assert not SiteMonthlyMetrics.objects.get(site=site).is_rolled_up
+
+    obj, created = update_month_rollup(site=site, month_for=date(2020, 1, 15))
+    assert not created
+    assert obj.is_rolled_up
+    assert obj.month_for == date(2020, 1, 1)
+    assert obj.active_user_count == 3
+    assert all(getattr(obj, field) == 7 for field in SiteMonthlyMetrics.ROLLUP_FIELDS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('prev_modified, expected_months', [
+    (None, [date(2020, 2, 10), date(2020, 1, 1)]),
+    (datetime(2020, 1, 31, tzinfo=utc), [date(2020, 2, 10), date(2020, 1, 1)]),
+    (datetime(2020, 2, 1, 1, tzinfo=utc), [date(2020, 2, 10)]),
+])
+def test_update_rollups_for_date(monkeypatch, prev_modified, expected_months):
+    """The previous month is rolled up again until it has been rolled up after
+    the month closed
+    """
+    site = SiteFactory()
+    if prev_modified:
+        SiteMonthlyMetrics.add_month(site=site, year=2020, month=1, active_user_count=1)
+        SiteMonthlyMetrics.objects.update(modified=prev_modified)
+    rolled_up = []
+
+    def mock_update_month_rollup(site, month_for):
+        rolled_up.append(month_for)
+
+    monkeypatch.setattr('figures.pipeline.site_monthly_metrics.update_month_rollup',
+                        mock_update_month_rollup)
+    update_rollups_for_date(site=site, date_for=date(2020, 2, 10))
+    assert rolled_up == expected_months
+
+
+@pytest.mark.django_db
+def test_rollup_and_fill_month_count_match():
+    """The daily rollup and the monthly fill store the same active user count
+    """
+    site = SiteFactory()
+    course = CourseOverviewFactory()
+    month_for = date(2020, 1, 1)
+    for day in [2, 3, 3]:
+        StudentModuleFactory(course_id=course.id,
+                             modified=datetime(2020, 1, day, tzinfo=utc))
+    StudentModuleFactory(course_id=course.id,
+                         modified=datetime(2020, 2, 1, tzinfo=utc))
+
+    filled, _created = fill_month(site=site, month_for=month_for, overwrite=True)
+    assert filled.active_user_count == 3
+    rolled_up, _created = update_month_rollup(site=site, month_for=month_for)
+    assert rolled_up.active_user_count == filled.active_user_count
@@ -59,6 +59,7 @@ Of secondary importance is testing log output
 from __future__ import absolute_import
 from datetime import date
 import logging
+import time
 import pytest
 from six.moves import range
 from django.contrib.sites.models import Site
@@ -72,7 +73,12 @@ from figures.tasks import (FPD_LOG_PREFIX,
                            populate_single_cdm,
                            populate_single_sdm,
                            populate_daily_metrics_for_site,
-                           populate_daily_metrics)
+                           populate_daily_metrics,
+                           populate_cdms_for_course_ids,
+                           populate_daily_metrics_for_site_distributed,
+                           populate_daily_metrics_distributed,
+                           split_course_ids,
+                           update_enrollment_data)
 from tests.factories import (CourseDailyMetricsFactory,
                              CourseOverviewFactory,
                              SiteDailyMetricsFactory,
@@ -145,10 +151,36 @@ def test_populate_single_sdm(transactional_db, monkeypatch):
     monkeypatch.setattr(
         'figures.pipeline.site_daily_metrics.SiteDailyMetricsLoader.load',
         mock_sdm_load)
+    bumped = []
+    monkeypatch.setattr('figures.tasks.bump_data_generation', bumped.append)
 
     populate_single_sdm(site.id, date_for=date_for)
 
     assert SiteDailyMetrics.objects.count() == 1
+    assert bumped == [site.id]
+
+
+def test_populate_single_sdm_rollup_fails(transactional_db, monkeypatch, caplog):
+    """Failing to update the site monthly rollup does not fail the task
+    """
+    site = SiteFactory()
+
+    def mock_sdm_load(self, site, date_for, **kwargs):
+        return (SiteDailyMetricsFactory(site=site), True, )
+
+    def mock_update_rollups_for_date(site, date_for):
+        raise Exception('fake exception')
+
+    monkeypatch.setattr(
+        'figures.pipeline.site_daily_metrics.SiteDailyMetricsLoader.load',
+        mock_sdm_load)
+    monkeypatch.setattr('figures.tasks.update_rollups_for_date',
+                        mock_update_rollups_for_date)
+
+    populate_single_sdm(site.id, date_for='2019-01-02')
+
+    assert SiteDailyMetrics.objects.count() == 1
+    assert 'update_rollups_for_date' in caplog.text
 
 
 @pytest.mark.parametrize('date_for', [
@@ -179,6 +211,62 @@ def test_populate_daily_metrics_for_site_basic(transactional_db,
     assert set(collected_course_ids) == set(course_ids)
 
 
+def test_populate_daily_metrics_for_site_bulk_cdm(transactional_db,
+                                                  monkeypatch,
+                                                  settings):
+    settings.ENV_TOKENS = {'FIGURES': {'DAILY_METRICS_BULK_CDM': True}}
+    site = SiteFactory()
+    date_for = date.today()
+    loaded = []
+
+    class FakeSiteLoader(object):
+        def __init__(self, site):
+            self.site = site
+
+        def load(self, date_for, force_update, course_ids=None):
+            loaded.append((self.site, date_for, force_update))
+
+    def fake_populate_single_cdm(**_kwargs):
+        raise AssertionError('Courses are loaded by the site loader')
+
+    monkeypatch.setattr('figures.tasks.SiteCourseDailyMetricsLoader', FakeSiteLoader)
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        fake_populate_single_cdm)
+    monkeypatch.setattr('figures.tasks.populate_single_sdm',
+                        lambda site_id, **_kwargs: loaded.append(site_id))
+
+    populate_daily_metrics_for_site(site_id=site.id, date_for=date_for)
+    assert loaded == [(site, date_for, False), site.id]
+
+
+def test_populate_daily_metrics_for_site_bulk_cdm_fails(transactional_db,
+                                                        monkeypatch,
+                                                        settings):
+    """The courses are loaded one at a time if the bulk load fails
+    """
+    settings.ENV_TOKENS = {'FIGURES': {'DAILY_METRICS_BULK_CDM': True}}
+    site = SiteFactory()
+    course_ids = ['course-1', 'course-2']
+    collected = []
+
+    class FailingSiteLoader(object):
+        def __init__(self, site):
+            pass
+
+        def load(self, **_kwargs):
+            raise FakeException('Hey!')
+
+    monkeypatch.setattr('figures.tasks.SiteCourseDailyMetricsLoader', FailingSiteLoader)
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        lambda course_id, **_kwargs: collected.append(course_id))
+    monkeypatch.setattr('figures.tasks.populate_single_sdm',
+                        lambda site_id, **_kwargs: collected.append(site_id))
+
+    populate_daily_metrics_for_site(site_id=site.id, date_for=date.today())
+    assert collected == course_ids + [site.id]
+
+
 @pytest.mark.skipif(OPENEDX_RELEASE == GINKGO,
                     reason='Apparent Django 1.8 incompatibility')
 def test_populate_daily_metrics_for_site_error_on_cdm(transactional_db,
@@ -324,3 +412,205 @@ def test_populate_daily_metrics_multisite(transactional_db, monkeypatch):
         ))
 
         populate_daily_metrics(date_for=date_for)
+
+
+#
+# Distributed daily pipeline
+#
+
+
+@pytest.mark.parametrize('course_ids, max_batches, expected', [
+    ([], 4, []),
+    (['c1', 'c2'], 4, [['c1'], ['c2']]),
+    (['c1', 'c2', 'c3', 'c4', 'c5'], 2, [['c1', 'c3', 'c5'], ['c2', 'c4']]),
+    (['c1', 'c2', 'c3'], 0, [['c1', 'c2', 'c3']]),
+])
+def test_split_course_ids(course_ids, max_batches, expected):
+    assert split_course_ids(course_ids, max_batches) == expected
+
+
+def test_populate_cdms_for_course_ids_retries_failed(transactional_db,
+                                                     monkeypatch,
+                                                     caplog):
+    """Only failed courses are retried and exhausting retries does not raise
+    """
+    site = SiteFactory()
+    calls = []
+
+    def fake_populate_single_cdm(course_id, **_kwargs):
+        calls.append(course_id)
+        if course_id == 'bad-course':
+            raise FakeException('Hey!')
+
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        fake_populate_single_cdm)
+
+    # Eager retries run inline, so the last retry has finished when this returns
+    populate_cdms_for_course_ids.apply(kwargs=dict(
+        site_id=site.id,
+        course_ids=['good-course', 'bad-course'],
+        date_for='2020-12-12'))
+
+    max_retries = populate_cdms_for_course_ids.max_retries
+    assert calls.count('good-course') == 1
+    assert calls.count('bad-course') == max_retries + 1
+    assert 'retries exhausted' in caplog.records[-1].message
+
+
+def test_populate_cdms_for_course_ids_past_deadline(transactional_db,
+                                                    monkeypatch,
+                                                    caplog):
+    """Courses are not started once the site deadline has passed
+    """
+    site = SiteFactory()
+    calls = []
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        lambda course_id, **_kwargs: calls.append(course_id))
+
+    populate_cdms_for_course_ids.apply(kwargs=dict(
+        site_id=site.id,
+        course_ids=['course-1', 'course-2'],
+        date_for='2020-12-12',
+        deadline=time.time() - 1))
+
+    assert not calls
+    assert 'TIMEOUT' in caplog.records[-1].message
+    assert 'course-2' in caplog.records[-1].message
+
+
+def test_populate_cdms_for_course_ids_no_retry_past_deadline(transactional_db,
+                                                             monkeypatch,
+                                                             caplog):
+    """Failed courses are not retried if the retry would start after the deadline
+    """
+    site = SiteFactory()
+    calls = []
+
+    def fake_populate_single_cdm(course_id, **_kwargs):
+        calls.append(course_id)
+        raise FakeException('Hey!')
+
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        fake_populate_single_cdm)
+
+    populate_cdms_for_course_ids.apply(kwargs=dict(
+        site_id=site.id,
+        course_ids=['bad-course'],
+        date_for='2020-12-12',
+        deadline=time.time() + 10))
+
+    assert calls == ['bad-course']
+    assert 'no time left to retry' in caplog.records[-1].message
+
+
+@pytest.mark.parametrize('bulk_fails', [False, True])
+def test_populate_cdms_for_course_ids_bulk_cdm(transactional_db,
+                                               monkeypatch,
+                                               settings,
+                                               bulk_fails):
+    """The batch is bulk loaded, or loaded one course at a time if that fails
+    """
+    settings.ENV_TOKENS = {'FIGURES': {'DAILY_METRICS_BULK_CDM': True}}
+    site = SiteFactory()
+    course_ids = ['course-1', 'course-2']
+    loaded = []
+    collected = []
+
+    class FakeSiteLoader(object):
+        def __init__(self, site):
+            self.site = site
+
+        def load(self, date_for, force_update, course_ids=None):
+            if bulk_fails:
+                raise FakeException('Hey!')
+            loaded.append((self.site, course_ids))
+
+    monkeypatch.setattr('figures.tasks.SiteCourseDailyMetricsLoader', FakeSiteLoader)
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        lambda course_id, **_kwargs: collected.append(course_id))
+
+    populate_cdms_for_course_ids.apply(kwargs=dict(
+        site_id=site.id,
+        course_ids=course_ids,
+        date_for='2020-12-12'))
+
+    if bulk_fails:
+        assert not loaded
+        assert collected == course_ids
+    else:
+        assert loaded == [(site, course_ids)]
+        assert not collected
+
+
+def test_populate_daily_metrics_for_site_distributed(transactional_db,
+                                                     monkeypatch):
+    """The site chord populates every course, then the site metrics
+    """
+    site = SiteFactory()
+    course_ids = ['fake-course-{}'.format(i) for i in range(5)]
+    collected_course_ids = []
+    collected_sdm_sites = []
+
+    def fake_populate_single_cdm(course_id, **_kwargs):
+        collected_course_ids.append(course_id)
+
+    def mock_sdm_load(self, site, date_for, **kwargs):
+        # The site metrics must be collected after all the course metrics
+        assert set(collected_course_ids) == set(course_ids)
+        collected_sdm_sites.append(site)
+        return (SiteDailyMetricsFactory(site=site), True, )
+
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        fake_populate_single_cdm)
+    monkeypatch.setattr(
+        'figures.pipeline.site_daily_metrics.SiteDailyMetricsLoader.load',
+        mock_sdm_load)
+    monkeypatch.setattr('figures.tasks.daily_metrics_max_parallel_course_tasks',
+                        lambda: 2)
+
+    populate_daily_metrics_for_site_distributed(site_id=site.id,
+                                                date_for='2020-12-12')
+    assert sorted(collected_course_ids) == sorted(course_ids)
+    assert collected_sdm_sites == [site]
+
+
+def test_populate_daily_metrics_distributed_sites(transactional_db, monkeypatch):
+    """Each site gets its own site task. Enrollment data only updates for today
+    """
+    sites = [Site.objects.first(), SiteFactory()]
+    site_calls = []
+
+    def fake_site_task(site_id, date_for, force_update, update_enrollments):
+        site_calls.append((site_id, update_enrollments))
+
+    monkeypatch.setattr(populate_daily_metrics_for_site_distributed, 'run',
+                        fake_site_task)
+
+    populate_daily_metrics_distributed(date_for=date.today())
+    assert set(site_calls) == set((site.id, True) for site in sites)
+
+    site_calls[:] = []
+    populate_daily_metrics_distributed(date_for='2019-01-02')
+    assert set(site_calls) == set((site.id, False) for site in sites)
+
+
+@pytest.mark.parametrize('incremental, setting, expected', [
+    (None, False, 'full'),
+    (None, True, 'incremental'),
+    (True, False, 'incremental'),
+    (False, True, 'full'),
+])
+def test_update_enrollment_data_incremental(transactional_db, monkeypatch, settings,
+                                            incremental, setting, expected):
+    """Test `update_enrollment_data` chooses the full or incremental update
+    """
+    site = SiteFactory()
+    settings.ENV_TOKENS = {'FIGURES': {'ENROLLMENT_DATA_INCREMENTAL': setting}}
+    called = []
+    monkeypatch.setattr('figures.tasks.backfill_enrollment_data_for_site',
+                        lambda site: called.append('full') or dict(results=[]))
+    monkeypatch.setattr('figures.tasks.refresh_enrollment_data_for_site',
+                        lambda site: called.append('incremental') or dict(results=[]))
+    update_enrollment_data(site_id=site.id, incremental=incremental)
+    assert called == [expected]
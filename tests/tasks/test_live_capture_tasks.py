@@ -0,0 +1,75 @@
+"""Test figures.tasks enrollment live capture tasks
+"""
+from __future__ import absolute_import
+from datetime import datetime
+import pytest
+
+from django.core.cache import cache
+from django.utils.timezone import utc
+
+from figures.models import EnrollmentData, LearnerCourseGradeMetrics
+from figures.tasks import (FPL_LOG_PREFIX,
+                           schedule_enrollment_update,
+                           update_enrollment_live)
+from tests.factories import (CourseEnrollmentFactory,
+                             LearnerCourseGradeMetricsFactory,
+                             SiteFactory)
+from tests.helpers import OPENEDX_RELEASE, GINKGO
+
+
+@pytest.fixture
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_schedule_enrollment_update_coalesces(clear_cache, monkeypatch, settings):
+    settings.ENV_TOKENS = {'FIGURES': {'ENROLLMENT_DATA_LIVE_CAPTURE_DELAY': 30}}
+    queued = []
+    monkeypatch.setattr('figures.tasks.update_enrollment_live.apply_async',
+                        lambda kwargs, countdown: queued.append((kwargs, countdown)))
+    course_id = 'course-v1:StarFleetAcademy+SFA01+2161'
+    assert schedule_enrollment_update(user_id=1, course_id=course_id)
+    assert not schedule_enrollment_update(user_id=1, course_id=course_id)
+    assert schedule_enrollment_update(user_id=2, course_id=course_id)
+    assert queued == [(dict(user_id=1, course_id=course_id), 30),
+                      (dict(user_id=2, course_id=course_id), 30)]
+
+
+@pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+def test_update_enrollment_live(transactional_db, clear_cache, monkeypatch):
+    """The task saves today's LCGM record and updates EnrollmentData from it
+    """
+    site = SiteFactory()
+    ce = CourseEnrollmentFactory()
+    today = datetime.utcnow().replace(tzinfo=utc).date()
+    lcgm = LearnerCourseGradeMetricsFactory(site=site,
+                                            user=ce.user,
+                                            course_id=str(ce.course_id),
+                                            date_for=today,
+                                            sections_worked=0)
+    progress = dict(points_possible=10, points_earned=5, sections_worked=2, count=4)
+    monkeypatch.setattr('figures.tasks.get_site_for_course', lambda course_id: site)
+    monkeypatch.setattr('figures.pipeline.enrollment_metrics.bulk_progress_data',
+                        lambda course_id, user_ids: {user_ids[0]: progress})
+
+    # Schedule to check the task clears the pending update
+    assert schedule_enrollment_update(user_id=ce.user_id, course_id=ce.course_id)
+
+    lcgm.refresh_from_db()
+    assert lcgm.sections_worked == 2
+    assert LearnerCourseGradeMetrics.objects.count() == 1
+    ed = EnrollmentData.objects.get(site=site, user=ce.user, course_id=str(ce.course_id))
+    assert ed.date_for == today
+    assert ed.progress_percent == 0.5
+    assert schedule_enrollment_update(user_id=ce.user_id, course_id=ce.course_id)
+
+
+def test_update_enrollment_live_no_enrollment(transactional_db, clear_cache,
+                                              monkeypatch, caplog):
+    site = SiteFactory()
+    monkeypatch.setattr('figures.tasks.get_site_for_course', lambda course_id: site)
+    update_enrollment_live(user_id=1, course_id='course-v1:StarFleetAcademy+SFA01+2161')
+    assert caplog.records[-1].message.startswith(FPL_LOG_PREFIX + ':ENROLLMENT:SKIP')
+    assert not EnrollmentData.objects.count()
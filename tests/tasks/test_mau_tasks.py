@@ -5,7 +5,6 @@ These tasks are not currently run in production
 from datetime import date
 from django.contrib.sites.models import Site
 
-from figures.helpers import as_course_key
 from figures.tasks import (populate_course_mau,
                            populate_mau_metrics_for_site,
                            populate_all_mau)
@@ -40,23 +39,19 @@ def test_populate_course_mau(transactional_db, monkeypatch):
 
 def test_populate_mau_metrics_for_site(transactional_db, monkeypatch):
     expected_site = SiteFactory()
-    courses = [CourseOverviewFactory() for i in range(3)]
+    calls = []
 
-    # Shoudl we track call for each course?
-    def mock_populate_course_mau(site_id, course_id, month_for, force_update=False):
-        assert site_id == Site.objects.get(id=site_id).id
-        assert course_id
-
-    def mock_get_course_keys_for_site(site):
+    def mock_collect_site_course_mau(site, month_for, overwrite=False):
         assert site == expected_site
-        return [as_course_key(course.id) for course in courses]
+        assert isinstance(month_for, date)
+        calls.append(month_for)
 
-    monkeypatch.setattr('figures.sites.get_course_keys_for_site',
-                        mock_get_course_keys_for_site)
-    monkeypatch.setattr('figures.tasks.populate_course_mau',
-                        mock_populate_course_mau)
+    monkeypatch.setattr('figures.tasks.collect_site_course_mau',
+                        mock_collect_site_course_mau)
 
     populate_mau_metrics_for_site(site_id=expected_site.id)
+    populate_mau_metrics_for_site(site_id=expected_site.id, month_for='2020-1-1')
+    assert calls[1] == date(2020, 1, 1)
 
 
 def test_populate_all_mau_single_site(transactional_db, monkeypatch):
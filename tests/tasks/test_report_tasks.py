@@ -0,0 +1,43 @@
+"""Tests the background report task
+"""
+
+from __future__ import absolute_import
+import logging
+
+import pytest
+
+from figures.models import ReportJob
+from figures.tasks import FR_LOG_PREFIX, generate_report
+
+from tests.factories import SiteFactory
+
+
+@pytest.fixture
+def report_job(db):
+    return ReportJob.objects.create(site=SiteFactory(),
+                                    report_type=ReportJob.COURSE_METRICS)
+
+
+def test_generate_report(report_job, monkeypatch):
+    built = []
+    monkeypatch.setattr('figures.tasks.build_report', built.append)
+    generate_report(report_job.id)
+    assert built == [report_job]
+
+
+def test_generate_report_fails(report_job, monkeypatch, caplog):
+    def mock_build_report(report_job):
+        raise IOError('storage is full')
+
+    monkeypatch.setattr('figures.tasks.build_report', mock_build_report)
+    generate_report(report_job.id)
+    report_job.refresh_from_db()
+    assert report_job.status == ReportJob.FAILED
+    assert report_job.error_message == 'storage is full'
+    assert caplog.records[-1].levelno == logging.ERROR
+    assert FR_LOG_PREFIX in caplog.records[-1].message
+
+
+def test_generate_report_does_not_exist(db, caplog):
+    generate_report(0)
+    assert 'does not exist' in caplog.records[-1].message
@@ -8,13 +8,26 @@ from dateutil.rrule import rrule, MONTHLY
 from six.moves import range
 from six.moves import zip
 
-from django.db import connection
 from django.utils.timezone import utc
 
-from figures.backfill import backfill_monthly_metrics_for_site
-from figures.models import SiteMonthlyMetrics
+from figures.backfill import (
+    backfill_completions_for_site,
+    backfill_monthly_metrics_for_site,
+    changed_enrollments_for_site,
+    refresh_enrollment_data_for_site,
+    update_enrollment_data_for_site,
+)
+from figures.models import (
+    CourseCompletionCount,
+    EnrollmentData,
+    EnrollmentDataHighWaterMark,
+    LearnerCourseGradeMetrics,
+    SiteMonthlyMetrics,
+)
 from tests.factories import (
+    CourseEnrollmentFactory,
     CourseOverviewFactory,
+    LearnerCourseGradeMetricsFactory,
     OrganizationFactory,
     OrganizationCourseFactory,
     StudentModuleFactory,
@@ -73,23 +86,14 @@ def backfill_test_data(db):
     )
 
 
-def patched__get_fill_month_raw_sql_for_month(site_ids, month_for):
-    """Get SQL statement for fill_month use_raw_sql option... that works with SQLite in test.
-    """
-    if (connection.vendor == 'sqlite'):
-        month = str(month_for.month).zfill(2)
-        year = month_for.year
-        return """\
-        SELECT COUNT(DISTINCT student_id) from courseware_studentmodule
-        where id in {}
-        and strftime('%m', datetime(modified)) = '{}'
-        and strftime('%Y', datetime(modified)) = '{}'
-        """.format(site_ids, month, year)
-
-
 @pytest.mark.freeze_time('2019-09-01 12:00:00')
-@pytest.mark.parametrize('use_raw_sql', (True, False))
-def test_backfill_monthly_metrics_for_site(monkeypatch, backfill_test_data, use_raw_sql):
+@pytest.mark.parametrize('use_raw_sql, single_scan', [
+    (True, False),
+    (False, False),
+    (False, True),
+])
+def test_backfill_monthly_metrics_for_site(monkeypatch, backfill_test_data, use_raw_sql,
+                                           single_scan):
     """Simple coverage and data validation check for the function under test
 
     Example backfilled results
@@ -114,16 +118,13 @@ def test_backfill_monthly_metrics_for_site(monkeypatch, backfill_test_data, use_
     and make sure that `modified` dates are used in the production code and not
     `created` dates
     """
-    # monkeypatch the function which produces the raw sql w/one will work in test
-    monkeypatch.setattr(
-        "figures.pipeline.site_monthly_metrics._get_fill_month_raw_sql_for_month",
-        patched__get_fill_month_raw_sql_for_month
-    )
-
     site = backfill_test_data['site']
     count_check = backfill_test_data['count_check']
     assert not SiteMonthlyMetrics.objects.count()
-    backfilled = backfill_monthly_metrics_for_site(site=site, overwrite=True, use_raw_sql=use_raw_sql)
+    backfilled = backfill_monthly_metrics_for_site(site=site,
+                                                   overwrite=True,
+                                                   use_raw_sql=use_raw_sql,
+                                                   single_scan=single_scan)
     assert len(backfilled) == backfill_test_data['months_back']
     assert len(backfilled) == SiteMonthlyMetrics.objects.count()
     assert len(backfilled) == len(count_check)
@@ -131,3 +132,124 @@ def test_backfill_monthly_metrics_for_site(monkeypatch, backfill_test_data, use_
         assert rec['obj'].active_user_count == check_rec['sm_count']
         assert rec['obj'].month_for.year == check_rec['month'].year
         assert rec['obj'].month_for.month == check_rec['month'].month
+
+
+@pytest.mark.django_db
+class TestIncrementalEnrollmentData(object):
+    """Tests the incremental EnrollmentData refresh functions
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.since = datetime(2020, 6, 1, tzinfo=utc)
+        self.before = self.since - relativedelta(days=1)
+        self.after = self.since + relativedelta(days=1)
+        self.course_overview = CourseOverviewFactory()
+        self.enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id,
+                                                    created=self.before)
+                            for _ in range(4)]
+        if organizations_support_sites():
+            org = OrganizationFactory(sites=[self.site])
+            OrganizationCourseFactory(organization=org,
+                                      course_id=str(self.course_overview.id))
+            for ce in self.enrollments:
+                UserOrganizationMappingFactory(user=ce.user, organization=org)
+        # Unchanged activity
+        StudentModuleFactory(student=self.enrollments[0].user,
+                             course_id=self.course_overview.id,
+                             modified=self.before)
+        # Changed enrollment, activity and progress
+        self.enrollments[1].created = self.after
+        self.enrollments[1].save()
+        StudentModuleFactory(student=self.enrollments[2].user,
+                             course_id=self.course_overview.id,
+                             modified=self.after)
+        LearnerCourseGradeMetricsFactory(site=self.site,
+                                         user=self.enrollments[3].user,
+                                         course_id=str(self.course_overview.id),
+                                         sections_worked=1,
+                                         sections_possible=2)
+        self.changed_user_ids = set(ce.user_id for ce in self.enrollments[1:])
+
+    def test_changed_enrollments_for_site(self):
+        changed = changed_enrollments_for_site(self.site, since=self.since)
+        assert changed == {str(self.course_overview.id): self.changed_user_ids}
+
+    def test_changed_enrollments_ignores_old_lcgm(self):
+        LearnerCourseGradeMetrics.objects.update(modified=self.before)
+        changed = changed_enrollments_for_site(self.site, since=self.since)
+        assert self.enrollments[3].user_id not in changed[str(self.course_overview.id)]
+
+    def test_update_enrollment_data_for_site(self, monkeypatch):
+        monkeypatch.setattr('figures.models.bulk_progress_data',
+                            lambda **_kwargs: None)
+        monkeypatch.setattr(
+            'figures.models.EnrollmentDataManager._progress_data_from_platform',
+            staticmethod(lambda user, course_id: dict(date_for=self.since.date(),
+                                                      is_completed=False,
+                                                      progress_percent=0.0,
+                                                      points_possible=0,
+                                                      points_earned=0,
+                                                      sections_possible=0,
+                                                      sections_worked=0)))
+        results = update_enrollment_data_for_site(self.site, since=self.since)
+        assert not results['errors']
+        assert len(results['results']) == 3
+        assert set(EnrollmentData.objects.values_list(
+            'user_id', flat=True)) == self.changed_user_ids
+        ed = EnrollmentData.objects.get(user=self.enrollments[3].user)
+        assert ed.progress_percent == 0.5
+
+    def test_refresh_without_mark_does_full_sweep(self, monkeypatch):
+        swept = []
+        monkeypatch.setattr('figures.backfill.backfill_enrollment_data_for_site',
+                            lambda site: swept.append(site) or dict(results=[], errors=[]))
+        monkeypatch.setattr('figures.backfill.update_enrollment_data_for_site',
+                            lambda site, since: pytest.fail('should do full sweep'))
+        refresh_enrollment_data_for_site(self.site)
+        assert swept == [self.site]
+        assert EnrollmentDataHighWaterMark.objects.get(site=self.site).refreshed_at
+
+    def test_refresh_with_mark_is_incremental(self, monkeypatch):
+        EnrollmentDataHighWaterMark.objects.create(site=self.site,
+                                                   refreshed_at=self.since)
+        updated = []
+        monkeypatch.setattr('figures.backfill.backfill_enrollment_data_for_site',
+                            lambda site: pytest.fail('should be incremental'))
+        monkeypatch.setattr('figures.backfill.update_enrollment_data_for_site',
+                            lambda site, since: updated.append(since) or dict(results=[],
+                                                                              errors=[]))
+        refresh_enrollment_data_for_site(self.site)
+        assert updated == [self.since]
+        assert EnrollmentDataHighWaterMark.objects.get(
+            site=self.site).refreshed_at > self.since
+
+    @pytest.mark.parametrize('has_mark', [False, True])
+    def test_refresh_with_errors_keeps_mark(self, monkeypatch, has_mark):
+        if has_mark:
+            EnrollmentDataHighWaterMark.objects.create(site=self.site,
+                                                       refreshed_at=self.since)
+        results = dict(results=[], errors=['CourseNotFound for course "bad-course". '])
+        monkeypatch.setattr('figures.backfill.backfill_enrollment_data_for_site',
+                            lambda site: results)
+        monkeypatch.setattr('figures.backfill.update_enrollment_data_for_site',
+                            lambda site, since: results)
+        assert refresh_enrollment_data_for_site(self.site) == results
+        marks = EnrollmentDataHighWaterMark.objects.filter(site=self.site)
+        assert [mark.refreshed_at for mark in marks] == ([self.since] if has_mark else [])
+
+
+@pytest.mark.django_db
+def test_backfill_completions_for_site():
+    site = SiteFactory()
+    course_id = str(CourseOverviewFactory().id)
+    for sections_worked in [1, 2, 2]:
+        LearnerCourseGradeMetricsFactory(site=site,
+                                         course_id=course_id,
+                                         sections_worked=sections_worked,
+                                         sections_possible=2)
+    LearnerCourseGradeMetrics.objects.update(is_completed=False, date_completed=None)
+    results = backfill_completions_for_site(site)
+    assert results['completed'] == 2
+    assert [obj.completed_count for obj in results['course_counts']] == [2]
+    assert CourseCompletionCount.objects.get(site=site, course_id=course_id).completed_count == 2
@@ -0,0 +1,43 @@
+"""Tests the compressed user id bitmap in figures.bitmaps
+"""
+from __future__ import absolute_import
+import pytest
+
+from figures.bitmaps import ARRAY_CONTAINER_MAX, CONTAINER_SIZE, UserBitmap
+
+
+@pytest.mark.parametrize('user_ids', [
+    [],
+    [0],
+    [1, 5, 70000, 3 * CONTAINER_SIZE + 7],
+    list(range(ARRAY_CONTAINER_MAX + 10)),
+    list(range(0, 5 * CONTAINER_SIZE, 3)),
+])
+def test_to_string_round_trip(user_ids):
+    bitmap = UserBitmap.from_ids(user_ids)
+    loaded = UserBitmap.from_string(bitmap.to_string())
+    assert loaded == bitmap
+    assert list(loaded) == sorted(set(user_ids))
+    assert len(loaded) == len(set(user_ids))
+
+
+def test_from_ids_ignores_duplicates():
+    bitmap = UserBitmap.from_ids([3, 3, '3', 8])
+    assert len(bitmap) == 2
+    assert 3 in bitmap
+    assert 4 not in bitmap
+
+
+def test_union_and_intersection():
+    first = UserBitmap.from_ids([1, 2, 3, CONTAINER_SIZE + 1])
+    second = UserBitmap.from_ids([3, 4, CONTAINER_SIZE + 1, 2 * CONTAINER_SIZE])
+    assert list(first | second) == [1, 2, 3, 4, CONTAINER_SIZE + 1, 2 * CONTAINER_SIZE]
+    assert list(first & second) == [3, CONTAINER_SIZE + 1]
+    assert len(first & UserBitmap.from_ids([9])) == 0
+    assert UserBitmap.union_all([first, second, UserBitmap()]) == first | second
+
+
+def test_sparse_bitmap_is_small():
+    bitmap = UserBitmap.from_ids(range(0, 10 * CONTAINER_SIZE, 1000))
+    # Two bytes for each id in array containers, before base64
+    assert len(bitmap.to_string()) < 3 * len(bitmap) + 200
@@ -0,0 +1,137 @@
+"""Tests figures.caching module
+"""
+
+from __future__ import absolute_import
+import pytest
+
+import django.contrib.sites.shortcuts
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from figures.caching import (
+    DATA_GENERATION_KEY,
+    bump_data_generation,
+    get_data_generation,
+)
+from figures.views import SiteDailyMetricsViewSet, SiteMonthlyMetricsViewSet
+
+from tests.factories import (
+    OrganizationFactory,
+    SiteDailyMetricsFactory,
+    SiteFactory,
+    UserFactory,
+)
+from tests.helpers import organizations_support_sites
+
+if organizations_support_sites():
+    from tests.factories import UserOrganizationMappingFactory
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_data_generation():
+    generation = get_data_generation(site_id=1)
+    assert get_data_generation(site_id=1) == generation
+    assert bump_data_generation(site_id=1) == generation + 1
+    assert get_data_generation(site_id=1) == generation + 1
+    assert get_data_generation(site_id=2) is not None
+
+
+def test_bump_data_generation_without_counter():
+    assert bump_data_generation(site_id=1) == cache.get(
+        DATA_GENERATION_KEY.format(site_id=1))
+
+
+@pytest.mark.django_db
+class TestCacheResponse(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch, settings):
+        settings.ENV_TOKENS = {'FIGURES': {'RESPONSE_CACHE_ENABLED': True}}
+        self.site = SiteFactory()
+        self.caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            settings.FEATURES['FIGURES_IS_MULTISITE'] = True
+            org = OrganizationFactory(sites=[self.site])
+            UserOrganizationMappingFactory(user=self.caller,
+                                           organization=org,
+                                           is_amc_admin=True)
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: self.site)
+        self.calls = []
+
+        def mock_history(**kwargs):
+            self.calls.append(kwargs)
+            return dict(current_month=len(self.calls), history=[])
+
+        monkeypatch.setattr('figures.views.metrics.get_monthly_rollup_history_metric',
+                            mock_history)
+
+    def get(self, path='api/site-monthly-metrics/new_users/'):
+        request = APIRequestFactory().get(path)
+        request.META['HTTP_HOST'] = self.site.domain
+        force_authenticate(request, user=self.caller)
+        view = SiteMonthlyMetricsViewSet.as_view({'get': 'new_users'})
+        response = view(request)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data['new_users']['current_month']
+
+    def test_cached_until_bumped(self):
+        assert self.get() == 1
+        assert self.get() == 1
+        bump_data_generation(self.site.id)
+        assert self.get() == 2
+
+    def test_query_params_in_key(self):
+        assert self.get() == 1
+        assert self.get(path='api/site-monthly-metrics/new_users/?months_back=3') == 2
+
+    def test_disabled(self, settings):
+        settings.ENV_TOKENS = {'FIGURES': {}}
+        assert self.get() == 1
+        assert self.get() == 2
+
+
+@pytest.mark.django_db
+class TestDataGenerationMixin(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch):
+        self.site = SiteFactory()
+        self.caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            org = OrganizationFactory(sites=[self.site])
+            UserOrganizationMappingFactory(user=self.caller,
+                                           organization=org,
+                                           is_amc_admin=True)
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: self.site)
+        self.bumped = []
+        monkeypatch.setattr('figures.caching.bump_data_generation',
+                            self.bumped.append)
+
+    def test_write_bumps_generation(self):
+        sdm = SiteDailyMetricsFactory(site=self.site)
+        path = 'api/site-daily-metrics/{}/'.format(sdm.id)
+
+        request = APIRequestFactory().patch(path, dict(mau=6), format='json')
+        force_authenticate(request, user=self.caller)
+        view = SiteDailyMetricsViewSet.as_view({'patch': 'partial_update'})
+        response = view(request, pk=sdm.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert self.bumped == [self.site.id]
+
+        request = APIRequestFactory().delete(path)
+        force_authenticate(request, user=self.caller)
+        view = SiteDailyMetricsViewSet.as_view({'delete': 'destroy'})
+        response = view(request, pk=sdm.id)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.bumped == [self.site.id, self.site.id]
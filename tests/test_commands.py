@@ -50,17 +50,20 @@ class TestBackfillDailyMetrics(object):
     BASE_PATH = 'figures.management.commands.backfill_figures_daily_metrics'
     PLAIN_PATH = BASE_PATH + '.populate_daily_metrics'
     DELAY_PATH = PLAIN_PATH + '.delay'
-    EXP_PATH = BASE_PATH + '.experimental_populate_daily_metrics'
+    DIST_PATH = BASE_PATH + '.populate_daily_metrics_distributed'
 
     def test_backfill_daily_func(self):
-        """Test backfill daily regular and experimental.
+        """Test backfill daily regular and distributed.
         """
         with mock.patch(self.PLAIN_PATH) as mock_populate:
             call_command('backfill_figures_daily_metrics', no_delay=True)
             mock_populate.assert_called()
-        with mock.patch(self.EXP_PATH) as mock_populate_exp:
+        with mock.patch(self.DIST_PATH) as mock_populate_dist:
+            call_command('backfill_figures_daily_metrics', distributed=True, no_delay=True)
+            mock_populate_dist.assert_called()
+        with mock.patch(self.DIST_PATH) as mock_populate_dist:
             call_command('backfill_figures_daily_metrics', experimental=True, no_delay=True)
-            mock_populate_exp.assert_called()
+            mock_populate_dist.assert_called()
 
     def test_backfill_daily_delay(self):
         """Test backfill daily called without no_delay uses Celery task delay.
@@ -183,3 +186,23 @@ class TestBackfillFiguresMetricsCommand(object):
             monthlycmd = 'backfill_figures_monthly_metrics'
             mock_call_cmd.assert_any_call(dailycmd, **subst_call_options)
             mock_call_cmd.assert_any_call(monthlycmd, **subst_call_options)
+
+
+@pytest.mark.django_db
+class TestBackfillCompletionsCommand(object):
+    """Exercise backfill_figures_completions command."""
+
+    BASE_PATH = 'figures.management.commands.backfill_figures_completions'
+    PLAIN_PATH = BASE_PATH + '.backfill_completions'
+    DELAY_PATH = PLAIN_PATH + '.delay'
+
+    def test_no_delay(self):
+        site = SiteFactory()
+        with mock.patch(self.PLAIN_PATH) as mock_backfill:
+            call_command('backfill_figures_completions', site=str(site.id), no_delay=True)
+            mock_backfill.assert_called_once_with(site_id=site.id)
+
+    def test_delay(self):
+        with mock.patch(self.DELAY_PATH) as mock_backfill:
+            call_command('backfill_figures_completions')
+            mock_backfill.assert_called()
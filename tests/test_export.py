@@ -0,0 +1,80 @@
+"""Tests figures.export module
+"""
+
+from __future__ import absolute_import
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from figures.export import (
+    LEARNER_CSV_FIELDS,
+    csv_lines,
+    export_response,
+    flatten,
+    learner_csv_records,
+    queryset_chunks,
+    serialized_records,
+)
+from figures.serializers import LearnerMetricsSerializerV2
+
+from tests.factories import EnrollmentDataFactory, UserFactory
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 10])
+def test_queryset_chunks(chunk_size):
+    users = [UserFactory() for i in range(3)]
+    queryset = get_user_model().objects.order_by('-username')
+    chunks = list(queryset_chunks(queryset, chunk_size))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert [user.id for chunk in chunks for user in chunk] == sorted(
+        user.id for user in users)
+
+
+def test_flatten():
+    assert flatten(dict(a=1, b=dict(c=2, d=dict(e=3)))) == {
+        'a': 1, 'b.c': 2, 'b.d.e': 3}
+
+
+def test_csv_lines():
+    lines = list(csv_lines([dict(a=1, b=None), dict(a='x,y', c=3)], ['a', 'b']))
+    assert lines == ['a,b\r\n', '1,\r\n', '"x,y",\r\n']
+
+
+@pytest.mark.django_db
+class TestLearnerExport(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.learner = UserFactory()
+        self.enrollments = [EnrollmentDataFactory(user=self.learner)
+                            for i in range(2)]
+        self.unenrolled = UserFactory()
+        self.queryset = get_user_model().objects.filter(
+            id__in=[self.learner.id, self.unenrolled.id])
+
+    def test_csv_records(self):
+        records = serialized_records(self.queryset,
+                                     LearnerMetricsSerializerV2,
+                                     chunk_size=1)
+        rows = list(learner_csv_records(records))
+        assert len(rows) == 3
+        assert [row['enrollment.id'] for row in rows[:2]] == [
+            ed.id for ed in self.enrollments]
+        assert rows[2]['id'] == self.unenrolled.id
+        assert 'enrollment.id' not in rows[2]
+        assert set(rows[0].keys()) == set(LEARNER_CSV_FIELDS)
+
+    def test_ndjson_response(self):
+        records = serialized_records(self.queryset, LearnerMetricsSerializerV2)
+        response = export_response(records=records,
+                                   export_format='ndjson',
+                                   filename='learners',
+                                   csv_fields=None)
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert response['Content-Disposition'] == 'attachment; filename="learners.ndjson"'
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        data = [json.loads(line) for line in lines]
+        assert [rec['id'] for rec in data] == [self.learner.id, self.unenrolled.id]
+        assert len(data[0]['enrollmentdata_set']) == 2
@@ -16,12 +16,15 @@ from figures.helpers import (
     as_course_key,
     as_datetime,
     as_date,
+    day_window,
     days_from,
+    month_window,
     next_day,
     prev_day,
     previous_months_iterator,
     first_last_days_for_month,
     import_from_path,
+    window_filter,
     )
 
 from tests.factories import COURSE_ID_STR_TEMPLATE
@@ -219,6 +222,31 @@ def test_first_last_days_for_month():
     assert last_day.day == 29
 
 
+@pytest.mark.parametrize('start_date, end_date, expected', [
+    (datetime.date(2020, 2, 29), None,
+     (datetime.datetime(2020, 2, 29, tzinfo=utc), datetime.datetime(2020, 3, 1, tzinfo=utc))),
+    (datetime.datetime(2020, 12, 1, 15, 30, tzinfo=utc), datetime.date(2020, 12, 31),
+     (datetime.datetime(2020, 12, 1, tzinfo=utc), datetime.datetime(2021, 1, 1, tzinfo=utc))),
+])
+def test_day_window(start_date, end_date, expected):
+    assert day_window(start_date, end_date) == expected
+
+
+@pytest.mark.parametrize('year, month, expected_end', [
+    (2020, 2, datetime.datetime(2020, 3, 1, tzinfo=utc)),
+    (2020, 12, datetime.datetime(2021, 1, 1, tzinfo=utc)),
+])
+def test_month_window(year, month, expected_end):
+    assert month_window(year, month) == (
+        datetime.datetime(year, month, 1, tzinfo=utc), expected_end)
+
+
+def test_window_filter():
+    window = month_window(2020, 2)
+    assert window_filter('modified', window) == dict(modified__gte=window[0],
+                                                     modified__lt=window[1])
+
+
 def test_import_from_path_working():
     utc_tz_path = 'django.utils.timezone:utc'
     imported_utc = import_from_path(utc_tz_path)
@@ -0,0 +1,52 @@
+"""Tests the HyperLogLog sketch in figures.hll
+"""
+from __future__ import absolute_import
+import pytest
+
+from figures.hll import HLL_PRECISION, HyperLogLog
+
+
+@pytest.mark.parametrize('num_values', [0, 1, 100, 5000, 50000])
+def test_count_within_error(num_values):
+    sketch = HyperLogLog.from_values(range(num_values), precision=HLL_PRECISION)
+    # Four standard errors, plus one for the smallest sets
+    allowed = 4 * HyperLogLog.relative_error(HLL_PRECISION) * num_values + 1
+    assert abs(sketch.count() - num_values) <= allowed
+
+
+def test_duplicates_are_not_counted():
+    sketch = HyperLogLog.from_values([1, 2, 3] * 100, precision=HLL_PRECISION)
+    assert sketch.count() == 3
+
+
+def test_merge_counts_union():
+    first = HyperLogLog.from_values(range(0, 3000), precision=HLL_PRECISION)
+    second = HyperLogLog.from_values(range(2000, 5000), precision=HLL_PRECISION)
+    merged = first.merge(second)
+    allowed = 4 * HyperLogLog.relative_error(HLL_PRECISION) * 5000
+    assert abs(merged.count() - 5000) <= allowed
+
+
+def test_merge_precision_mismatch():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=10).merge(HyperLogLog(precision=12))
+
+
+def test_to_string_round_trip():
+    sketch = HyperLogLog.from_values(range(1000), precision=10)
+    loaded = HyperLogLog.from_string(sketch.to_string())
+    assert loaded.precision == 10
+    assert loaded.registers == sketch.registers
+    assert loaded.count() == sketch.count()
+
+
+@pytest.mark.parametrize('precision', [3, 17])
+def test_invalid_precision(precision):
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=precision)
+
+
+@pytest.mark.django_db
+def test_precision_setting(settings):
+    settings.ENV_TOKENS = {'FIGURES': {'HLL_PRECISION': 8}}
+    assert HyperLogLog().num_registers == 256
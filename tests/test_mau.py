@@ -1,6 +1,6 @@
 
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from freezegun import freeze_time
 import pytest
 
@@ -8,19 +8,41 @@ from django.utils.timezone import utc
 from figures.compat import StudentModule
 
 from figures.helpers import as_datetime, as_date
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
+from figures.models import SiteDailyMetrics
+from figures.pipeline.site_daily_metrics import (
+    SiteDailyMetricsLoader,
+    get_site_active_users_for_date,
+)
 from figures.sites import (
     get_student_modules_for_site,
     get_student_modules_for_course_in_site,
 )
 from figures.mau import (
+    get_course_mau_counts,
     get_mau_from_student_modules,
     get_mau_from_site_course,
+    course_active_users,
     mau_1g_for_month_as_of_day,
+    merge_stored_sketches,
+    retrieve_live_site_mau_data,
     site_mau_1g_for_month_as_of_day,
+    site_mau_count_for_month_as_of_day,
     store_mau_metrics,
+    stored_active_users,
+)
+
+from tests.factories import (
+    CourseDailyMetricsFactory,
+    SiteDailyMetricsFactory,
+    SiteFactory,
+    StudentModuleFactory,
 )
+from tests.helpers import organizations_support_sites
 
-from tests.factories import StudentModuleFactory
+if organizations_support_sites():
+    from tests.factories import UserOrganizationMappingFactory
 
 
 def test_get_mau_from_site_course(sm_test_data):
@@ -55,6 +77,20 @@ def test_get_mau_from_sm_for_site(sm_test_data):
     assert set(users) == set(sm_check)
 
 
+def test_get_course_mau_counts(sm_test_data):
+    year_for = sm_test_data['year_for']
+    month_for = sm_test_data['month_for']
+    sm = get_student_modules_for_site(sm_test_data['site'])
+    counts = get_course_mau_counts(student_modules=sm, year=year_for, month=month_for)
+    for course_overview in sm_test_data['course_overviews']:
+        expected = get_mau_from_site_course(site=sm_test_data['site'],
+                                            course_id=str(course_overview.id),
+                                            year=year_for,
+                                            month=month_for).count()
+        assert counts.get(str(course_overview.id), 0) == expected
+    assert sum(counts.values()) == len(sm_test_data['student_modules'])
+
+
 @pytest.mark.django_db
 def test_mau_1g_for_month_as_of_day_first_day_next_month(db):
     """
@@ -155,3 +191,166 @@ def test_store_mau_metrics(monkeypatch, sm_test_data):
                                                     month=mock_today.month)
         # TODO: Fix, rudimentary check, improve
         assert expected_mau
+
+
+def store_site_sketches(site, start_date, end_date, bitmaps=False):
+    day = start_date
+    while day <= end_date:
+        user_ids = list(get_site_active_users_for_date(site, day))
+        SiteDailyMetricsFactory(
+            site=site,
+            date_for=day,
+            active_users_sketch=HyperLogLog.from_values(user_ids).to_string(),
+            active_users_bitmap=UserBitmap.from_ids(user_ids).to_string() if bitmaps else None)
+        day += timedelta(days=1)
+
+
+@pytest.mark.parametrize('day', [1, 10, 11])
+def test_retrieve_live_site_mau_data_approximate(settings, sm_test_data, day):
+    """The stored sketches through yesterday plus today's activity give the MAU
+
+    The `sm_test_data` activity is on the 10th, so it comes from the live
+    StudentModule query on the 10th and from the stored sketches on the 11th
+    """
+    settings.ENV_TOKENS = {'FIGURES': {'MAU_COUNT_MODE': 'approximate'}}
+    site = sm_test_data['site']
+    today = date(sm_test_data['year_for'], sm_test_data['month_for'], day)
+    store_site_sketches(site, today.replace(day=1), today - timedelta(days=1))
+    with freeze_time(today):
+        data = retrieve_live_site_mau_data(site)
+    expected = len(sm_test_data['student_modules']) if day >= 10 else 0
+    assert data['count'] == expected
+    assert data['month_for'] == today
+
+
+def test_retrieve_live_site_mau_data_approximate_fallback(settings, sm_test_data):
+    """Without stored sketches for every day, the MAU is counted exactly
+    """
+    settings.ENV_TOKENS = {'FIGURES': {'MAU_COUNT_MODE': 'approximate'}}
+    site = sm_test_data['site']
+    today = date(sm_test_data['year_for'], sm_test_data['month_for'], 12)
+    store_site_sketches(site, today.replace(day=2), today - timedelta(days=1))
+    with freeze_time(today):
+        data = retrieve_live_site_mau_data(site)
+    assert data['count'] == len(sm_test_data['student_modules'])
+
+
+@pytest.mark.django_db
+def test_merge_stored_sketches_missing_sketch():
+    sdm = SiteDailyMetricsFactory(date_for=date(2020, 1, 1),
+                                  active_users_sketch=HyperLogLog.from_values([1]).to_string())
+    SiteDailyMetricsFactory(site=sdm.site, date_for=date(2020, 1, 2))
+    daily_metrics = SiteDailyMetrics.objects.filter(site=sdm.site)
+    assert merge_stored_sketches(daily_metrics, 'active_users_sketch',
+                                 date(2020, 1, 1), date(2020, 1, 1)).count() == 1
+    assert merge_stored_sketches(daily_metrics, 'active_users_sketch',
+                                 date(2020, 1, 1), date(2020, 1, 2)) is None
+
+
+@pytest.mark.parametrize('day', [1, 10, 11])
+def test_retrieve_live_site_mau_data_bitmaps(monkeypatch, sm_test_data, day):
+    """The exact MAU comes from the stored bitmaps and today's activity without
+    a month long StudentModule query
+    """
+    site = sm_test_data['site']
+    today = date(sm_test_data['year_for'], sm_test_data['month_for'], day)
+    store_site_sketches(site, today.replace(day=1), today - timedelta(days=1),
+                        bitmaps=True)
+    monkeypatch.setattr('figures.mau.get_mau_from_student_modules', None)
+    with freeze_time(today):
+        data = retrieve_live_site_mau_data(site)
+    expected = len(sm_test_data['student_modules']) if day >= 10 else 0
+    assert data['count'] == expected
+
+
+def test_activity_after_pipeline_run_is_counted(monkeypatch, sm_test_data):
+    """Activity after the daily pipeline run is in the month to date MAU
+
+    The run early on the 10th stores the 9th. Activity later on the 10th is
+    stored by the next run, once the 10th has closed. The MAU is counted from
+    the stored bitmaps only
+    """
+    site = sm_test_data['site']
+    day = date(sm_test_data['year_for'], sm_test_data['month_for'], 10)
+    store_site_sketches(site, day.replace(day=1), day - timedelta(days=2), bitmaps=True)
+    monkeypatch.setattr('figures.mau.get_mau_from_student_modules', None)
+    monkeypatch.setattr('figures.mau.site_mau_1g_for_month_as_of_day', None)
+
+    with freeze_time(datetime(day.year, day.month, day.day, 2)):
+        SiteDailyMetricsLoader().load(site=site, date_for=day)
+    late = StudentModuleFactory(
+        course_id=sm_test_data['course_overviews'][0].id,
+        created=datetime(day.year, day.month, day.day, 15).replace(tzinfo=utc),
+        modified=datetime(day.year, day.month, day.day, 15).replace(tzinfo=utc))
+    if organizations_support_sites():
+        UserOrganizationMappingFactory(user=late.student,
+                                       organization=sm_test_data['organization'])
+
+    next_day = day + timedelta(days=1)
+    with freeze_time(datetime(next_day.year, next_day.month, next_day.day, 2)):
+        SiteDailyMetricsLoader().load(site=site, date_for=next_day)
+    with freeze_time(datetime(next_day.year, next_day.month, next_day.day, 3)):
+        data = retrieve_live_site_mau_data(site)
+
+    sdm = SiteDailyMetrics.objects.get(site=site, date_for=day)
+    assert late.student_id in UserBitmap.from_string(sdm.active_users_bitmap)
+    expected = len(sm_test_data['student_modules']) + 1
+    assert sdm.mau == expected
+    assert data['count'] == expected
+
+
+def test_open_day_is_closed_on_next_run(sm_test_data):
+    """A record stored before its day closed gets its active users on the next run
+    """
+    site = sm_test_data['site']
+    day = date(sm_test_data['year_for'], sm_test_data['month_for'], 10)
+    sdm = SiteDailyMetricsFactory(site=site, date_for=day)
+    assert sdm.active_users_bitmap is None
+    with freeze_time(datetime(day.year, day.month, day.day + 2, 2)):
+        SiteDailyMetricsLoader().load(site=site, date_for=day + timedelta(days=1))
+    sdm.refresh_from_db()
+    active_users = UserBitmap.from_string(sdm.active_users_bitmap)
+    assert set(active_users) == set(
+        sm.student_id for sm in sm_test_data['student_modules'])
+    assert HyperLogLog.from_string(sdm.active_users_sketch).count() == len(active_users)
+
+
+@pytest.mark.django_db
+def test_stored_active_users_empty_day():
+    """A day without activity is stored, not missing
+    """
+    sdm = SiteDailyMetricsFactory(date_for=date(2020, 1, 1),
+                                  active_users_bitmap=UserBitmap.from_ids([1]).to_string())
+    SiteDailyMetricsFactory(site=sdm.site, date_for=date(2020, 1, 2),
+                            active_users_bitmap=UserBitmap.from_ids([]).to_string())
+    active_users = stored_active_users(SiteDailyMetrics.objects.filter(site=sdm.site),
+                                       'active_users_bitmap',
+                                       date(2020, 1, 1), date(2020, 1, 2))
+    assert list(active_users) == [1]
+
+
+def test_site_mau_count_for_month_as_of_day(sm_test_data):
+    site = sm_test_data['site']
+    date_for = date(sm_test_data['year_for'], sm_test_data['month_for'], 12)
+    expected = site_mau_1g_for_month_as_of_day(site, date_for).count()
+    assert site_mau_count_for_month_as_of_day(site, date_for) == expected
+    store_site_sketches(site, date_for.replace(day=1), date_for - timedelta(days=1),
+                        bitmaps=True)
+    assert site_mau_count_for_month_as_of_day(site, date_for) == expected
+
+
+@pytest.mark.django_db
+def test_course_active_users_overlap():
+    site = SiteFactory()
+    for course_id, days in [('course-v1:a+b+c', [[1, 2], [3]]),
+                            ('course-v1:a+b+d', [[2], [3, 4]])]:
+        for day, user_ids in enumerate(days, start=1):
+            CourseDailyMetricsFactory(
+                site=site, course_id=course_id, date_for=date(2020, 1, day),
+                active_learners_bitmap=UserBitmap.from_ids(user_ids).to_string())
+    first = course_active_users(site, 'course-v1:a+b+c', date(2020, 1, 1), date(2020, 1, 2))
+    second = course_active_users(site, 'course-v1:a+b+d', date(2020, 1, 1), date(2020, 1, 2))
+    assert list(first) == [1, 2, 3]
+    assert list(first & second) == [2, 3]
+    assert course_active_users(site, 'course-v1:a+b+c',
+                               date(2020, 1, 1), date(2020, 1, 3)) is None
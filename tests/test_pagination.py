@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from figures.pagination import (
+    FiguresCursorPagination,
     FiguresLimitOffsetPagination,
     FiguresKiloPagination,
 )
@@ -13,3 +14,9 @@ class TestFiguresLimitOffsetPagination(object):
 class TestFigureKiloPagination(object):
     def test_default_pagination_limit(self):
         assert FiguresKiloPagination.default_limit == 1000
+
+
+class TestFiguresCursorPagination(object):
+    def test_default_ordering(self):
+        assert FiguresCursorPagination.ordering == 'id'
+        assert FiguresCursorPagination.page_size == 20
@@ -0,0 +1,235 @@
+"""Tests figures.progress module
+
+The course structure cache tests rely on the Juniper mocks for the
+`PersistentSubsectionGrade` model and subsection grade locations
+"""
+
+from __future__ import absolute_import
+from datetime import datetime, timedelta
+import pytest
+
+from django.core.cache import cache
+from django.utils.timezone import utc
+
+from figures.compat import PersistentSubsectionGrade
+from figures.progress import (
+    CourseStructure,
+    EnrollmentProgress,
+    bulk_progress_data,
+    get_course_structure,
+    hidden_subsections,
+    invalidate_course_structure,
+)
+from figures.signals import handle_course_published
+
+from tests.factories import (
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    UserFactory,
+)
+
+
+requires_persisted_grades = pytest.mark.skipif(
+    PersistentSubsectionGrade is None,
+    reason='PersistentSubsectionGrade is not mocked for this release')
+
+
+class MockSection(object):
+    class Total(object):
+        def __init__(self, earned, possible):
+            self.earned = earned
+            self.possible = possible
+
+    def __init__(self, location, earned, possible):
+        self.location = location
+        self.all_total = self.Total(earned, possible)
+
+
+class MockCourseGrade(object):
+    def __init__(self, sections):
+        self.chapter_grades = [dict(sections=sections)]
+
+
+class MockBlock(object):
+    def __init__(self, location=None, children=None, **fields):
+        self.location = location
+        self.children = children or []
+        self.__dict__.update(fields)
+
+    def get_children(self):
+        return self.children
+
+
+def make_structure():
+    return CourseStructure(course_id='course-v1:a+b+c',
+                           subsections=[('key-1', 1.0), ('key-2', 3.0)])
+
+
+def test_course_structure_from_course_grade():
+    course_grade = MockCourseGrade(sections=[
+        MockSection('key-1', earned=0, possible=1.0),
+        MockSection('ungraded', earned=0, possible=0.0),
+        MockSection('key-2', earned=0, possible=3.0),
+    ])
+    structure = CourseStructure.from_course_grade('course-v1:a+b+c', course_grade)
+    assert list(structure.subsections.keys()) == ['key-1', 'key-2']
+    assert structure.sections_possible == 2
+    assert structure.points_possible == 4.0
+
+
+def test_course_structure_from_course_grade_without_locations():
+    course_grade = MockCourseGrade(sections=[
+        MockSection(None, earned=0, possible=1.0)])
+    assert CourseStructure.from_course_grade('course-v1:a+b+c', course_grade) is None
+
+
+def test_course_structure_from_course_grade_hidden():
+    course_grade = MockCourseGrade(sections=[
+        MockSection('key-1', earned=0, possible=1.0),
+        MockSection('key-2', earned=0, possible=3.0),
+    ])
+    structure = CourseStructure.from_course_grade('course-v1:a+b+c', course_grade,
+                                                  hidden={'key-2'})
+    assert list(structure.subsections.keys()) == ['key-1']
+    assert structure.points_possible == 1.0
+
+
+def test_hidden_subsections():
+    future = datetime.utcnow().replace(tzinfo=utc) + timedelta(days=1)
+    past = datetime.utcnow().replace(tzinfo=utc) - timedelta(days=1)
+    course = MockBlock(children=[
+        MockBlock(start=past, children=[
+            MockBlock('key-1', start=past),
+            MockBlock('key-2', visible_to_staff_only=True),
+            MockBlock('key-3', start=future),
+        ]),
+        MockBlock(visible_to_staff_only=True, children=[MockBlock('key-4')]),
+        MockBlock(start=future, children=[MockBlock('key-5', start=past)]),
+    ])
+    assert hidden_subsections(course) == {'key-2', 'key-3', 'key-4', 'key-5'}
+
+
+def test_course_structure_progress():
+    structure = make_structure()
+    progress = structure.progress([('key-1', 0.0), ('key-2', 2.0), ('other', 5.0)])
+    assert progress == dict(points_possible=4.0,
+                            points_earned=2.0,
+                            sections_worked=1,
+                            count=2)
+
+
+@pytest.mark.django_db
+class TestCourseStructureCache(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch, settings):
+        cache.clear()
+        settings.ENV_TOKENS = {'FIGURES': {'PROGRESS_FROM_PERSISTED_GRADES': True}}
+        self.course_overview = CourseOverviewFactory()
+        self.learner = UserFactory()
+        self.staff_user = UserFactory(is_staff=True)
+        self.built = []
+        self.built_as = []
+
+        self.course = MockBlock(children=[
+            MockBlock(children=[MockBlock('key-1'), MockBlock('key-2')])])
+
+        def mock_course_grade(learner, course):
+            self.built.append(course.id)
+            self.built_as.append(learner)
+            return MockCourseGrade(sections=[
+                MockSection('key-1', earned=0, possible=1.0),
+                MockSection('key-2', earned=0, possible=3.0)])
+
+        def mock_course(course_id):
+            self.course.id = course_id
+            return self.course
+
+        monkeypatch.setattr('figures.progress.course_from_course_id', mock_course)
+        monkeypatch.setattr('figures.progress.course_grade', mock_course_grade)
+        yield
+        cache.clear()
+
+    def test_builds_once(self):
+        first = get_course_structure(self.course_overview.id)
+        second = get_course_structure(self.course_overview.id)
+        assert len(self.built) == 1
+        assert first.subsections == second.subsections
+
+    def test_builds_as_staff_user(self):
+        get_course_structure(self.course_overview.id)
+        assert self.built_as == [self.staff_user]
+
+    def test_leaves_out_hidden_content(self):
+        """Staff see content hidden from learners. It is not in the structure
+        """
+        self.course.get_children()[0].get_children()[1].visible_to_staff_only = True
+        structure = get_course_structure(self.course_overview.id)
+        assert list(structure.subsections.keys()) == ['key-1']
+        assert structure.sections_possible == 1
+
+    def test_no_staff_user(self):
+        self.staff_user.delete()
+        assert get_course_structure(self.course_overview.id) is None
+        assert not self.built
+
+    @pytest.mark.parametrize('invalidate', [
+        invalidate_course_structure,
+        lambda course_key: handle_course_published(sender=None, course_key=course_key),
+    ])
+    def test_invalidate(self, invalidate):
+        get_course_structure(self.course_overview.id)
+        invalidate(self.course_overview.id)
+        get_course_structure(self.course_overview.id)
+        assert len(self.built) == 2
+
+    @requires_persisted_grades
+    def test_bulk_progress_data(self):
+        learners = [self.learner, UserFactory()]
+        PersistentSubsectionGrade.objects.create(user_id=learners[0].id,
+                                                 course_id=self.course_overview.id,
+                                                 usage_key='key-2',
+                                                 earned_all=2.0,
+                                                 possible_all=3.0,
+                                                 earned_graded=2.0,
+                                                 possible_graded=3.0)
+        data = bulk_progress_data(course_id=self.course_overview.id,
+                                  user_ids=[learner.id for learner in learners])
+        assert len(self.built) == 1
+        assert data[learners[0].id]['sections_worked'] == 1
+        assert data[learners[0].id]['points_earned'] == 2.0
+        assert data[learners[1].id]['sections_worked'] == 0
+        assert data[learners[1].id]['count'] == 2
+        assert self.built_as == [self.staff_user]
+
+    @requires_persisted_grades
+    @pytest.mark.parametrize('figures_settings', [
+        {}, {'PROGRESS_FROM_PERSISTED_GRADES': False}])
+    def test_bulk_progress_data_disabled(self, settings, figures_settings):
+        settings.ENV_TOKENS = {'FIGURES': figures_settings}
+        assert bulk_progress_data(course_id=self.course_overview.id,
+                                  user_ids=[self.learner.id]) is None
+        assert not self.built
+
+    def test_bulk_progress_data_no_users(self):
+        assert bulk_progress_data(course_id=self.course_overview.id, user_ids=[]) is None
+
+
+@requires_persisted_grades
+@pytest.mark.django_db
+def test_enrollment_progress_uses_course_structure(settings):
+    """Uses the mock course grade locations to build the structure
+    """
+    cache.clear()
+    settings.ENV_TOKENS = {'FIGURES': {'PROGRESS_FROM_PERSISTED_GRADES': True}}
+    UserFactory(is_staff=True)
+    ce = CourseEnrollmentFactory()
+    ep = EnrollmentProgress(user=ce.user, course_id=ce.course_id)
+    assert ep._course_grade is None
+    assert ep.progress['sections_possible'] == 2
+    assert ep.progress['sections_worked'] == 0
+    assert not ep.is_completed()
+    # The course grade is loaded when the sections are needed
+    assert len(list(ep.sections(only_graded=True))) == 2
+    assert ep._course_grade is not None
+    cache.clear()
@@ -0,0 +1,98 @@
+"""Tests figures.reports and figures.storage modules
+"""
+
+from __future__ import absolute_import
+import gzip
+import json
+import os
+
+import pytest
+
+from figures.models import ReportJob
+from figures.reports import build_report
+from figures.storage import report_download_url, report_storage
+
+from tests.factories import (
+    CourseDailyMetricsFactory,
+    EnrollmentDataFactory,
+    LearnerCourseGradeMetricsFactory,
+    SiteFactory,
+)
+
+
+def read_report(report_job):
+    with report_storage().open(report_job.file_name) as report_file:
+        return gzip.GzipFile(fileobj=report_file).read().decode('utf-8').splitlines()
+
+
+@pytest.mark.django_db
+class TestBuildReport(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings, tmpdir):
+        settings.MEDIA_ROOT = str(tmpdir)
+        settings.ENV_TOKENS = {'FIGURES': {
+            'REPORT_STORAGE': 'django.core.files.storage.FileSystemStorage',
+            'EXPORT_CHUNK_SIZE': 2,
+        }}
+        self.site = SiteFactory()
+        self.other_site = SiteFactory()
+
+    def make_job(self, report_type, file_format=ReportJob.CSV_GZIP, params=None):
+        return ReportJob.objects.create(site=self.site,
+                                        report_type=report_type,
+                                        file_format=file_format,
+                                        params=params or {})
+
+    def test_enrollment_metrics_csv(self):
+        lcgms = [LearnerCourseGradeMetricsFactory(site=self.site) for i in range(3)]
+        LearnerCourseGradeMetricsFactory(site=self.other_site)
+        report_job = build_report(self.make_job(ReportJob.ENROLLMENT_METRICS))
+        report_job.refresh_from_db()
+        assert report_job.status == ReportJob.COMPLETE
+        assert report_job.records_total == report_job.records_done == 3
+        assert report_job.progress == 1.0
+        assert report_job.file_name.startswith(
+            'figures/reports/{}/enrollment-metrics-'.format(self.site.id))
+        assert os.path.exists(report_storage().path(report_job.file_name))
+        lines = read_report(report_job)
+        assert lines[0].split(',')[:2] == ['id', 'user.id']
+        assert [int(line.split(',')[0]) for line in lines[1:]] == [
+            lcgm.id for lcgm in lcgms]
+
+    def test_enrollment_metrics_params(self):
+        lcgms = [LearnerCourseGradeMetricsFactory(site=self.site) for i in range(3)]
+        report_job = build_report(self.make_job(
+            ReportJob.ENROLLMENT_METRICS,
+            file_format=ReportJob.NDJSON_GZIP,
+            params=dict(course_ids=lcgms[2].course_id)))
+        data = [json.loads(line) for line in read_report(report_job)]
+        assert [rec['id'] for rec in data] == [lcgms[2].id]
+        assert report_job.records_total == 1
+
+    def test_learner_metrics(self):
+        enrollments = [EnrollmentDataFactory(site=self.site) for i in range(3)]
+        report_job = build_report(self.make_job(
+            ReportJob.LEARNER_METRICS,
+            params=dict(course_ids=[enrollments[0].course_id,
+                                    enrollments[1].course_id])))
+        lines = read_report(report_job)
+        assert len(lines) == 3
+        assert [int(line.split(',')[0]) for line in lines[1:]] == [
+            ed.user_id for ed in enrollments[:2]]
+
+    def test_course_metrics(self):
+        cdms = [CourseDailyMetricsFactory(site=self.site) for i in range(2)]
+        CourseDailyMetricsFactory(site=self.other_site)
+        report_job = build_report(self.make_job(ReportJob.COURSE_METRICS,
+                                                file_format=ReportJob.NDJSON_GZIP))
+        data = [json.loads(line) for line in read_report(report_job)]
+        assert [rec['course_id'] for rec in data] == [cdm.course_id for cdm in cdms]
+
+    def test_download_url(self):
+        report_job = self.make_job(ReportJob.COURSE_METRICS)
+        assert report_download_url(report_job) is None
+        report_job = build_report(report_job)
+        # The authenticated API endpoint, not the storage location
+        assert report_download_url(report_job) == (
+            '/api/reports/{}/download/'.format(report_job.id))
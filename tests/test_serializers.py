@@ -34,6 +34,7 @@ from figures.serializers import (
     GeneralUserDataSerializer,
     LearnerCourseDetailsSerializer,
     LearnerDetailsSerializer,
+    LearnerMetricsSerializer,
     SerializeableCountryField,
     SiteDailyMetricsSerializer,
     SiteMauMetricsSerializer,
@@ -209,7 +210,11 @@ class TestCourseDailyMetricsSerializer(object):
     def setup(self, db):
         self.model = CourseDailyMetrics
         self.date_fields = set(['date_for', 'created', 'modified',])
-        self.expected_results_keys = set([o.name for o in self.model._meta.fields])
+        self.expected_results_keys = set([o.name for o in self.model._meta.fields
+                                          if o.name not in ('active_learners_sketch',
+                                                            'active_learners_bitmap',
+                                                            'days_to_complete_total',
+                                                            'days_to_complete_count')])
         field_names = (o.name for o in self.model._meta.fields
             if o.name not in self.date_fields )
         self.metrics = CourseDailyMetricsFactory()
@@ -273,7 +278,9 @@ class TestSiteDailyMetricsSerializer(object):
         '''
         self.site = Site.objects.first()
         self.date_fields = set(['date_for', 'created', 'modified',])
-        self.expected_results_keys = set([o.name for o in SiteDailyMetrics._meta.fields])
+        self.expected_results_keys = set([o.name for o in SiteDailyMetrics._meta.fields
+                                          if o.name not in ('active_users_sketch',
+                                                            'active_users_bitmap')])
         self.site_daily_metrics = SiteDailyMetricsFactory()
         self.serializer = SiteDailyMetricsSerializer(
             instance=self.site_daily_metrics)
@@ -532,6 +539,64 @@ class TestLearnerCourseDetailsSerializer(object):
         assert data == expected_data
 
 
+def fail_latest_lcgm(*args, **kwargs):
+    raise AssertionError('latest_lcgm should not be called for prefetched rows')
+
+
+@pytest.mark.django_db
+class TestPrefetchedProgressData(object):
+    """Tests the list serializers that retrieve the certificates and latest
+    LCGM records for all the rows at once
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+        self.user = UserFactory()
+        self.enrollments = [CourseEnrollmentFactory(user=self.user) for _ in range(3)]
+        self.latest = {}
+        for enrollment in self.enrollments[:2]:
+            course_id = str(enrollment.course_id)
+            LearnerCourseGradeMetricsFactory(user=self.user,
+                                             course_id=course_id,
+                                             date_for=datetime.date(2020, 1, 1),
+                                             points_earned=1)
+            self.latest[course_id] = LearnerCourseGradeMetricsFactory(
+                user=self.user,
+                course_id=course_id,
+                date_for=datetime.date(2020, 2, 1),
+                points_earned=10)
+        GeneratedCertificateFactory(user=self.user,
+                                    course_id=self.enrollments[0].course_id,
+                                    created_date=datetime.datetime(2020, 2, 1, tzinfo=utc))
+
+    def test_learner_course_details(self, monkeypatch):
+        expected = [LearnerCourseDetailsSerializer(enrollment).data
+                    for enrollment in self.enrollments]
+        monkeypatch.setattr(
+            'figures.models.LearnerCourseGradeMetricsManager.latest_lcgm',
+            fail_latest_lcgm)
+        data = LearnerCourseDetailsSerializer(self.enrollments, many=True).data
+        assert data == expected
+        assert data[0]['progress_data']['course_completed']
+        assert not data[1]['progress_data']['course_completed']
+        assert data[1]['progress_data']['course_progress_details']['points_earned'] == 10
+
+    def test_learner_metrics(self, monkeypatch):
+        monkeypatch.setattr(
+            'figures.models.LearnerCourseGradeMetricsManager.latest_lcgm',
+            fail_latest_lcgm)
+        context = dict(site=self.site,
+                       course_keys=[enrollment.course_id for enrollment in self.enrollments])
+        data = LearnerMetricsSerializer([self.user], many=True, context=context).data
+        enrollments = {rec['course_id']: rec for rec in data[0]['enrollments']}
+        assert len(enrollments) == 3
+        for course_id, lcgm in self.latest.items():
+            assert enrollments[course_id]['progress_details']['points_earned'] == 10
+            assert enrollments[course_id]['progress_percent'] == float(
+                Decimal(lcgm.progress_percent).quantize(Decimal('.00')))
+        assert enrollments[str(self.enrollments[2].course_id)]['progress_details'] is None
+
+
 @pytest.mark.django_db
 class TestLearnerDetailsSerializer(object):
     '''Tests the LearnerDetailSerializer serializer class
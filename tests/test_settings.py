@@ -90,6 +90,25 @@ class TestUpdateSettings(object):
         assert settings.ENV_TOKENS['FIGURES'] == figures_env_tokens
 
 
+@pytest.mark.parametrize('figures_env_tokens, expected_task', [
+    ({}, 'figures.tasks.populate_daily_metrics'),
+    ({'DAILY_METRICS_DISTRIBUTED': False}, 'figures.tasks.populate_daily_metrics'),
+    ({'DAILY_METRICS_DISTRIBUTED': True},
+     'figures.tasks.populate_daily_metrics_distributed'),
+])
+def test_daily_metrics_distributed_setting(figures_env_tokens, expected_task):
+    settings = mock.Mock(
+        WEBPACK_LOADER={},
+        CELERYBEAT_SCHEDULE={},
+        FEATURES={},
+        ENV_TOKENS={'FIGURES': figures_env_tokens},
+        CELERY_IMPORTS=[],
+    )
+    plugin_settings(settings)
+    schedule = settings.CELERYBEAT_SCHEDULE['figures-populate-daily-metrics']
+    assert schedule['task'] == expected_task
+
+
 class TestDailyMauPipelineSettings(object):
     """Tests MAU pipeline settings
 
@@ -0,0 +1,40 @@
+"""Tests figures.signals module
+"""
+from __future__ import absolute_import
+import pytest
+
+from figures.signals import (
+    handle_course_grade_changed,
+    handle_enrollment_status_change,
+)
+from tests.factories import UserFactory
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    calls = []
+    monkeypatch.setattr('figures.signals.schedule_enrollment_update',
+                        lambda user_id, course_id: calls.append((user_id, course_id)))
+    return calls
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('enabled', [True, False])
+def test_live_capture_receivers(scheduled, settings, enabled):
+    settings.ENV_TOKENS = {'FIGURES': {'ENROLLMENT_DATA_LIVE_CAPTURE': enabled}}
+    user = UserFactory()
+    course_id = 'course-v1:StarFleetAcademy+SFA01+2161'
+    handle_enrollment_status_change(sender=None, event='enroll', user=user, course_id=course_id)
+    handle_course_grade_changed(sender=None, user=user, course_grade=None, course_key=course_id)
+    if enabled:
+        assert scheduled == [(user.id, course_id), (user.id, course_id)]
+    else:
+        assert not scheduled
+
+
+@pytest.mark.django_db
+def test_live_capture_receivers_missing_args(scheduled, settings):
+    settings.ENV_TOKENS = {'FIGURES': {'ENROLLMENT_DATA_LIVE_CAPTURE': True}}
+    handle_enrollment_status_change(sender=None, event='enroll', user=None, course_id=None)
+    handle_course_grade_changed(sender=None, user=None, course_key=None)
+    assert not scheduled
@@ -57,7 +57,11 @@ class TestCourseDailyMetricsView(BaseViewTest):
         self.first_day = parse('2018-01-01')
         self.last_day = parse('2018-03-31')
         self.date_fields = set(['date_for', 'created', 'modified', ])
-        self.expected_results_keys = set([o.name for o in CourseDailyMetrics._meta.fields])
+        self.expected_results_keys = set([o.name for o in CourseDailyMetrics._meta.fields
+                                          if o.name not in ('active_learners_sketch',
+                                                            'active_learners_bitmap',
+                                                            'days_to_complete_total',
+                                                            'days_to_complete_count')])
         field_names = (o.name for o in CourseDailyMetrics._meta.fields
                        if o.name not in self.date_fields)
 
@@ -147,7 +147,7 @@ class TestCourseMonthlyMetricsViewSet(BaseViewTest):
 
     def test_list_method(self, monkeypatch, course_test_data):
         """
-        We need to add pagination to the list method and add that to the test
+        The list method returns a page of course metrics
         """
         site = course_test_data['site']
         users = course_test_data['users']
@@ -168,6 +168,9 @@ class TestCourseMonthlyMetricsViewSet(BaseViewTest):
         view = self.view_class.as_view({'get': 'list'})
         response = view(request)
         assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 1
+        assert response.data['results'][0]['course_id'] == str(course_overview.id)
+        assert response.data['results'][0]['course_enrollments'] == 0
 
     def test_retrieve_method(self, monkeypatch, course_test_data):
         site = course_test_data['site']
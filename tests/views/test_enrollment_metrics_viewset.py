@@ -3,6 +3,7 @@
 
 from __future__ import absolute_import
 from decimal import Decimal
+import json
 import mock
 import pytest
 
@@ -10,7 +11,7 @@ import django.contrib.sites.shortcuts
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate
 
-from figures.models import LearnerCourseGradeMetrics
+from figures.models import CourseCompletionCount, LearnerCourseGradeMetrics
 from figures.views import EnrollmentMetricsViewSet
 
 from tests.factories import (
@@ -160,6 +161,29 @@ class TestEnrollmentMetricsViewSet(BaseViewTest):
         obj = LearnerCourseGradeMetrics.objects.get(id=results[0]['id'])
         self.check_serialized_data(results[0], obj)
 
+    def test_list_method_cursor_pagination(self, monkeypatch, settings,
+                                           enrollment_test_data):
+        settings.ALLOWED_HOSTS = ['*']
+        site = enrollment_test_data['site']
+        users = enrollment_test_data['users']
+        caller = self.make_caller(site, users)
+        lcgm = [LearnerCourseGradeMetricsFactory(site=site) for i in range(5)]
+
+        request_path = self.base_request_path + '?pagination=cursor&page_size=2&count=true'
+        result_ids = []
+        while request_path:
+            response = self.make_request(request_path=request_path,
+                                         monkeypatch=monkeypatch,
+                                         site=site,
+                                         caller=caller,
+                                         action='list')
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data['count'] == len(lcgm)
+            assert len(response.data['results']) <= 2
+            result_ids += [obj['id'] for obj in response.data['results']]
+            request_path = response.data['next']
+        assert result_ids == sorted([obj.id for obj in lcgm])
+
     def test_list_method_filter_method_course_ids(self, monkeypatch, enrollment_test_data):
         site = enrollment_test_data['site']
         users = enrollment_test_data['users']
@@ -332,6 +356,9 @@ class TestEnrollmentMetricsViewSet(BaseViewTest):
         results_values = [list(elem.values()) for elem in results]
         expected_values = [[obj.course_id, obj.user_id] for obj in completed_lcgm]
         assert set(map(tuple, results_values)) == set(map(tuple, expected_values))
+        # The count is read from the course completion counts
+        assert response.data['count'] == CourseCompletionCount.objects.site_count(site)
+        assert response.data['count'] == len(results)
 
     def test_completed_method(self, monkeypatch, enrollment_test_data):
         site = enrollment_test_data['site']
@@ -386,3 +413,50 @@ class TestEnrollmentMetricsViewSet(BaseViewTest):
             assert response.status_code == status.HTTP_200_OK
             assert not is_response_paginated(response.data)
             assert not paginate_check.called
+
+    def test_export_csv(self, monkeypatch, enrollment_test_data):
+        site = enrollment_test_data['site']
+        users = enrollment_test_data['users']
+        caller = self.make_caller(site, users)
+        LearnerCourseGradeMetricsFactory(site=SiteFactory())
+        lcgm = [LearnerCourseGradeMetricsFactory(site=site) for i in range(3)]
+        response = self.make_request(request_path=self.base_request_path + 'export/',
+                                     monkeypatch=monkeypatch,
+                                     site=site,
+                                     caller=caller,
+                                     action='export')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/csv'
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        assert lines[0].split(',')[:3] == ['id', 'user.id', 'user.username']
+        assert [int(line.split(',')[0]) for line in lines[1:]] == [obj.id for obj in lcgm]
+
+    def test_export_ndjson(self, monkeypatch, settings, enrollment_test_data):
+        settings.ENV_TOKENS = {'FIGURES': {'EXPORT_CHUNK_SIZE': 2}}
+        site = enrollment_test_data['site']
+        users = enrollment_test_data['users']
+        caller = self.make_caller(site, users)
+        lcgm = [LearnerCourseGradeMetricsFactory(site=site) for i in range(3)]
+        request_path = '{}export/?export_format=ndjson&course_ids={}'.format(
+            self.base_request_path, lcgm[1].course_id)
+        response = self.make_request(request_path=request_path,
+                                     monkeypatch=monkeypatch,
+                                     site=site,
+                                     caller=caller,
+                                     action='export')
+        assert response.status_code == status.HTTP_200_OK
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        data = [json.loads(line) for line in lines]
+        assert [rec['id'] for rec in data] == [lcgm[1].id]
+        self.check_serialized_data(data[0], lcgm[1])
+
+    def test_export_invalid_format(self, monkeypatch, enrollment_test_data):
+        site = enrollment_test_data['site']
+        caller = self.make_caller(site, enrollment_test_data['users'])
+        response = self.make_request(
+            request_path=self.base_request_path + 'export/?export_format=xml',
+            monkeypatch=monkeypatch,
+            site=site,
+            caller=caller,
+            action='export')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
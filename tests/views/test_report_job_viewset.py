@@ -0,0 +1,138 @@
+"""Tests the ReportJobViewSet
+"""
+
+from __future__ import absolute_import
+import pytest
+
+import django.contrib.sites.shortcuts
+from django.core.files.base import ContentFile
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from figures.models import ReportJob
+from figures.storage import report_storage
+from figures.views import ReportJobViewSet
+
+from tests.factories import (
+    OrganizationFactory,
+    SiteFactory,
+    UserFactory,
+)
+from tests.helpers import organizations_support_sites
+
+if organizations_support_sites():
+    from tests.factories import UserOrganizationMappingFactory
+
+
+@pytest.mark.django_db
+class TestReportJobViewSet(object):
+    request_path = 'api/reports/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch, settings):
+        self.site = SiteFactory()
+        self.caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            settings.FEATURES['FIGURES_IS_MULTISITE'] = True
+            org = OrganizationFactory(sites=[self.site])
+            UserOrganizationMappingFactory(user=self.caller,
+                                           organization=org,
+                                           is_amc_admin=True)
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: self.site)
+        self.queued = []
+        monkeypatch.setattr('figures.tasks.generate_report.delay',
+                            self.queued.append)
+
+    def call(self, request, action, **kwargs):
+        request.META['HTTP_HOST'] = self.site.domain
+        force_authenticate(request, user=self.caller)
+        view = ReportJobViewSet.as_view({request.method.lower(): action})
+        return view(request, **kwargs)
+
+    def test_create(self):
+        request = APIRequestFactory().post(
+            self.request_path,
+            dict(report_type='learner-metrics', params=dict(course_ids=['a+b+c'])),
+            format='json')
+        response = self.call(request, 'create')
+        assert response.status_code == status.HTTP_201_CREATED
+        report_job = ReportJob.objects.get(id=response.data['id'])
+        assert self.queued == [report_job.id]
+        assert report_job.site == self.site
+        assert report_job.requested_by == self.caller
+        assert report_job.file_format == ReportJob.CSV_GZIP
+        assert report_job.params == dict(course_ids=['a+b+c'])
+        assert response.data['status'] == ReportJob.PENDING
+        assert response.data['progress'] == 0.0
+        assert response.data['download_url'] is None
+
+    def test_create_invalid_report_type(self):
+        request = APIRequestFactory().post(self.request_path,
+                                           dict(report_type='grades'),
+                                           format='json')
+        response = self.call(request, 'create')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not self.queued
+
+    def test_retrieve(self, settings):
+        settings.ALLOWED_HOSTS = [self.site.domain]
+        report_job = ReportJob.objects.create(site=self.site,
+                                              report_type=ReportJob.COURSE_METRICS,
+                                              status=ReportJob.COMPLETE,
+                                              records_done=4,
+                                              records_total=4,
+                                              file_name='figures/reports/report.csv.gz')
+        request = APIRequestFactory().get('{}{}/'.format(self.request_path, report_job.id))
+        response = self.call(request, 'retrieve', pk=report_job.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['progress'] == 1.0
+        assert response.data['download_url'] == (
+            'http://{}/api/reports/{}/download/'.format(self.site.domain, report_job.id))
+
+    def make_report_file(self, site, settings, tmpdir):
+        settings.MEDIA_ROOT = str(tmpdir)
+        settings.ENV_TOKENS = {'FIGURES': {
+            'REPORT_STORAGE': 'django.core.files.storage.FileSystemStorage',
+        }}
+        file_name = report_storage().save('figures/reports/report.csv.gz',
+                                          ContentFile(b'report data'))
+        return ReportJob.objects.create(site=site,
+                                        report_type=ReportJob.COURSE_METRICS,
+                                        status=ReportJob.COMPLETE,
+                                        file_name=file_name)
+
+    def test_download(self, settings, tmpdir):
+        report_job = self.make_report_file(self.site, settings, tmpdir)
+        request = APIRequestFactory().get('{}{}/download/'.format(self.request_path,
+                                                                  report_job.id))
+        response = self.call(request, 'download', pk=report_job.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == b'report data'
+        assert response['Content-Disposition'] == 'attachment; filename="report.csv.gz"'
+
+    def test_download_other_site_report(self, settings, tmpdir):
+        report_job = self.make_report_file(SiteFactory(), settings, tmpdir)
+        request = APIRequestFactory().get('{}{}/download/'.format(self.request_path,
+                                                                  report_job.id))
+        response = self.call(request, 'download', pk=report_job.id)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_download_not_ready(self):
+        report_job = ReportJob.objects.create(site=self.site,
+                                              report_type=ReportJob.COURSE_METRICS)
+        request = APIRequestFactory().get('{}{}/download/'.format(self.request_path,
+                                                                  report_job.id))
+        response = self.call(request, 'download', pk=report_job.id)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_site_reports(self):
+        report_job = ReportJob.objects.create(site=self.site,
+                                              report_type=ReportJob.COURSE_METRICS)
+        ReportJob.objects.create(site=SiteFactory(),
+                                 report_type=ReportJob.COURSE_METRICS)
+        request = APIRequestFactory().get(self.request_path)
+        response = self.call(request, 'list')
+        assert response.status_code == status.HTTP_200_OK
+        assert [rec['id'] for rec in response.data['results']] == [report_job.id]
@@ -60,7 +60,9 @@ class TestSiteDailyMetricsView(BaseViewTest):
         self.first_day = parse('2018-01-01')
         self.last_day = parse('2018-03-31')
         self.date_fields = set(['date_for', 'created', 'modified', ])
-        self.expected_results_keys = set([o.name for o in SiteDailyMetrics._meta.fields])
+        self.expected_results_keys = set([o.name for o in SiteDailyMetrics._meta.fields
+                                          if o.name not in ('active_users_sketch',
+                                                            'active_users_bitmap')])
         field_names = (o.name for o in SiteDailyMetrics._meta.fields
                        if o.name not in self.date_fields)
 
@@ -283,6 +283,46 @@ class TestSiteMonthlyMetricsViewSet(BaseViewTest):
 
         assert response.data['active_users'] == expected_response
 
+    @pytest.mark.parametrize('query, expected', [
+        ('', 6),
+        ('?months_back=12', 12),
+        ('?months_back=100', 24),
+    ])
+    def test_months_back(self, monkeypatch, user_reg_test_data, query, expected):
+        site = user_reg_test_data['site']
+        caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            map_users_to_org_site(caller=caller, site=site, users=[])
+
+        request = APIRequestFactory().get(self.request_path + query)
+        request.META['HTTP_HOST'] = site.domain
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: site)
+        force_authenticate(request, user=caller)
+        view = self.view_class.as_view({'get': 'new_users'})
+        response = view(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['new_users']['history']) == expected
+
+    @pytest.mark.parametrize('months_back', ['0', 'six'])
+    def test_invalid_months_back(self, monkeypatch, user_reg_test_data, months_back):
+        site = user_reg_test_data['site']
+        caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            map_users_to_org_site(caller=caller, site=site, users=[])
+
+        request = APIRequestFactory().get(
+            self.request_path + '?months_back=' + months_back)
+        request.META['HTTP_HOST'] = site.domain
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: site)
+        force_authenticate(request, user=caller)
+        view = self.view_class.as_view({'get': 'new_users'})
+        response = view(request)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     @pytest.mark.skip(reason='test this after other module tests pass')
     def test_run_request(self, monkeypatch, user_reg_test_data):
         self.run_request(endpoint='registered_users',